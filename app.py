@@ -6,39 +6,26 @@ Responsável por criar, configurar e montar a aplicação Flask,
 registrando todas as extensões e blueprints (rotas).
 """
 import os
-import pytz
 from flask import Flask
 from flask_migrate import Migrate
 from flask_login import current_user
-from sqlalchemy import desc
 from dotenv import load_dotenv
 
 
 # Importa as extensões e os modelos
 from extensions import db, login_manager
-from models import User, Notification
+from models import User
+from services.notifications import get_unread_count, RecentNotifications
+from services.worked_hours import format_hours
+from services.localtime import format_datetime_local
+from services.images import photo_url
+from services.uploads import UploadRequest
+from services import rollups  # noqa: F401 (registra os eventos que mantêm os agregados de custo)
 
 # --- Configurações Iniciais ---
-FUSO_HORARIO_SP = pytz.timezone('America/Sao_Paulo')
 load_dotenv()
 
 
-# --- Filtros e Funções Auxiliares da Aplicação ---
-
-def format_datetime_local(utc_datetime, fmt=None):
-    """
-    Filtro Jinja para converter uma data UTC para o fuso horário de São Paulo.
-    """
-    if not utc_datetime:
-        return ""
-    if utc_datetime.tzinfo is None:
-        utc_datetime = pytz.utc.localize(utc_datetime)
-    local_datetime = utc_datetime.astimezone(FUSO_HORARIO_SP)
-    if fmt:
-        return local_datetime.strftime(fmt)
-    return local_datetime.strftime('%d/%m/%Y às %H:%M')
-
-
 # Em app.py
 
 def register_blueprints(app):
@@ -52,6 +39,7 @@ def register_blueprints(app):
     from routes.stock import stock_bp
     from routes.notifications import notifications_bp
     from routes.qrcode import qrcode_bp
+    from routes.exports import exports_bp
     from routes.schedule import schedule_bp 
     
     app.register_blueprint(core_bp)
@@ -62,6 +50,7 @@ def register_blueprints(app):
     app.register_blueprint(stock_bp)
     app.register_blueprint(notifications_bp)
     app.register_blueprint(qrcode_bp)
+    app.register_blueprint(exports_bp)
     
 
     # --- Módulos Opcionais ---
@@ -102,6 +91,86 @@ def register_commands(app):
             db.create_all()
             click.echo("Banco de dados inicializado com sucesso.")
 
+    @app.cli.command("process-notifications")
+    @click.option('--once', is_flag=True, help="Processa a fila pendente e encerra.")
+    @click.option('--batch-size', default=500, show_default=True, help="Eventos processados por transação.")
+    @click.option('--interval', default=2.0, show_default=True, help="Segundos de espera quando a fila está vazia.")
+    def process_notifications_command(once, batch_size, interval):
+        """Expande a fila (outbox) de eventos em notificações, em lotes."""
+        import time
+        from services.notifications import process_outbox
+
+        with app.app_context():
+            while True:
+                processed = process_outbox(batch_size)
+                if processed:
+                    click.echo(f"{processed} evento(s) de notificação processado(s).")
+                if processed < batch_size:
+                    if once:
+                        break
+                    time.sleep(interval)
+
+    @app.cli.command("rebuild-rollups")
+    def rebuild_rollups_command():
+        """Recalcula do zero os agregados mensais de custo das manutenções."""
+        from services.rollups import rebuild_rollups
+
+        with app.app_context():
+            count = rebuild_rollups()
+            click.echo(f"Agregados de custo recalculados: {count} linha(s).")
+
+    @app.cli.command("snapshot-stock")
+    @click.option('--date', 'day', type=click.DateTime(formats=['%Y-%m-%d']), default=None,
+                  help="Dia da fotografia (AAAA-MM-DD, padrão: ontem em UTC; hoje ou datas futuras são recusados).")
+    def snapshot_stock_command(day):
+        """Grava o saldo de fechamento de todos os itens de estoque em um dia já encerrado (agendar diariamente)."""
+        from services.stock_ledger import take_snapshot
+
+        with app.app_context():
+            try:
+                count = take_snapshot(day.date() if day else None)
+            except ValueError as e:
+                raise click.BadParameter(str(e), param_hint='--date')
+            click.echo(f"Fotografia do estoque gravada: {count} item(ns).")
+
+    @app.cli.command("plan-preventive")
+    @click.option('--days', default=14, show_default=True, help="Planeja os equipamentos que vencem nos próximos N dias.")
+    @click.option('--minutes', default=60, show_default=True, help="Tempo reservado por equipamento.")
+    @click.option('--dry-run', is_flag=True, help="Mostra o resultado sem gravar os agendamentos.")
+    def plan_preventive_command(days, minutes, dry_run):
+        """Cria os agendamentos das manutenções preventivas que estão para vencer (agendar toda noite)."""
+        from services.planner import plan_preventive
+
+        with app.app_context():
+            plan = plan_preventive(days=days, minutes=minutes, dry_run=dry_run)
+            action = "seriam criados" if dry_run else "criado(s)"
+            click.echo(f"{len(plan.appointments)} agendamento(s) {action} em {plan.visits} visita(s).")
+            if plan.unscheduled:
+                codes = ', '.join(plan.unscheduled[:20]) + (' ...' if len(plan.unscheduled) > 20 else '')
+                click.echo(f"Sem horário livre para {len(plan.unscheduled)} equipamento(s): {codes}")
+
+    @app.cli.command("process-images")
+    @click.option('--once', is_flag=True, help="Processa as fotos pendentes e encerra.")
+    @click.option('--workers', default=2, show_default=True, help="Processos que tratam as fotos em paralelo.")
+    @click.option('--interval', default=2.0, show_default=True, help="Segundos de espera quando a fila está vazia.")
+    def process_images_command(once, workers, interval):
+        """Gera miniaturas e recomprime as fotos das manutenções, em um pool de processos."""
+        from services.images import serve_image_jobs
+
+        with app.app_context():
+            serve_image_jobs(workers=workers, interval=interval, once=once, log=click.echo)
+
+    @app.cli.command("process-exports")
+    @click.option('--once', is_flag=True, help="Processa a fila pendente e encerra.")
+    @click.option('--workers', default=2, show_default=True, help="Processos que geram os arquivos em paralelo.")
+    @click.option('--interval', default=2.0, show_default=True, help="Segundos de espera quando a fila está vazia.")
+    def process_exports_command(once, workers, interval):
+        """Gera as exportações de relatórios enfileiradas, em um pool de processos."""
+        from services.export_jobs import serve_export_jobs
+
+        with app.app_context():
+            serve_export_jobs(workers=workers, interval=interval, once=once, log=click.echo)
+
 
 # --- Função de Criação da Aplicação (App Factory) ---
 
@@ -134,8 +203,20 @@ def create_app():
     basedir = os.path.abspath(os.path.dirname(__file__))
     app.config['UPLOAD_FOLDER'] = os.path.join(basedir, 'uploads')
     os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
+    # Quem envia os bytes dos uploads: '' (o próprio Flask), 'x-sendfile' (Apache/lighttpd) ou 'x-accel' (nginx)
+    app.config['UPLOAD_SENDFILE'] = os.environ.get('UPLOAD_SENDFILE', '')
+    app.config['UPLOAD_ACCEL_PREFIX'] = os.environ.get('UPLOAD_ACCEL_PREFIX', '/_protected_uploads/')
+    # Limites dos envios, conferidos enquanto o corpo é lido (services/uploads.py)
+    app.config['MAX_CONTENT_LENGTH'] = int(os.environ.get('MAX_CONTENT_LENGTH', 32 * 1024 * 1024))
+    app.config['UPLOAD_MAX_FILE_SIZE'] = int(os.environ.get('UPLOAD_MAX_FILE_SIZE', 10 * 1024 * 1024))
+    app.config['UPLOAD_MAX_FILES'] = 3
+    app.request_class = UploadRequest
+    # Arquivos gerados pelas exportações em segundo plano (compartilhado entre web e worker)
+    app.config['EXPORT_FOLDER'] = os.environ.get('EXPORT_FOLDER', os.path.join(basedir, 'exports'))
 
     app.jinja_env.filters['localdatetime'] = format_datetime_local
+    app.jinja_env.filters['hours'] = format_hours
+    app.jinja_env.globals['photo_url'] = photo_url
 
     # --- 2. INICIALIZAÇÃO DAS EXTENSÕES ---
     db.init_app(app)
@@ -154,8 +235,9 @@ def create_app():
     @app.context_processor
     def inject_notifications():
         if current_user.is_authenticated:
-            unread_count = current_user.notifications.filter_by(is_read=False).count()
-            recent_notifs = current_user.notifications.order_by(desc(Notification.timestamp)).limit(5).all()
+            # Contador em cache; a lista recente só é consultada se o template usá-la
+            unread_count = get_unread_count(current_user.id)
+            recent_notifs = RecentNotifications(current_user.id)
             return dict(
                 unread_notifications_count=unread_count,
                 recent_notifications=recent_notifs
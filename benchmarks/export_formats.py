@@ -0,0 +1,105 @@
+"""
+benchmarks/export_formats.py
+
+Compara vazão e pico de memória da exportação do relatório de manutenções
+nos formatos XLSX, CSV e Parquet, usando o motor de services/exports.py.
+
+Uso:
+    python benchmarks/export_formats.py [quantidade_de_registros]
+
+O banco é um SQLite temporário populado com dados sintéticos; o banco
+configurado em DATABASE_URL não é tocado.
+"""
+import os
+import sys
+import random
+import tempfile
+import time
+import tracemalloc
+from datetime import date, timedelta
+
+_db_file = tempfile.NamedTemporaryFile(suffix='.db', delete=False)
+os.environ['DATABASE_URL'] = 'sqlite:///' + _db_file.name
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from sqlalchemy import insert  # noqa: E402
+from werkzeug.datastructures import MultiDict  # noqa: E402
+
+from app import create_app  # noqa: E402
+from extensions import db  # noqa: E402
+from models import User, Client, Equipment, MaintenanceHistory  # noqa: E402
+from services.exports import build_xlsx, write_csv, write_parquet  # noqa: E402
+from services.report_exports import maintenance_export  # noqa: E402
+
+EQUIPMENTS = 2000
+
+
+def seed(n_records):
+    today = date.today()
+    rnd = random.Random(42)
+    db.session.execute(insert(User), [{'id': 1, 'username': 'tec', 'password_hash': 'x', 'name': 'Técnico',
+                                       'email': 'tec@example.com', 'cpf': '1', 'role': 'technician',
+                                       'is_active': True}])
+    db.session.execute(insert(Client), [{'id': 1, 'name': 'Cliente', 'is_archived': False}])
+    db.session.execute(insert(Equipment), [
+        {'id': i, 'code': f'EQ{i:06d}', 'model': 'Split 12000 BTUs', 'location': 'Sala de reuniões',
+         'next_maintenance_date': today, 'user_id': 1, 'client_id': 1, 'is_archived': False}
+        for i in range(1, EQUIPMENTS + 1)
+    ])
+    for offset in range(0, n_records, 10000):
+        db.session.execute(insert(MaintenanceHistory), [
+            {'maintenance_date': today - timedelta(days=rnd.randint(0, 1500)),
+             'category': 'Manutenção Preventiva', 'description': 'Limpeza de filtros e verificação de gás.',
+             'equipment_id': rnd.randint(1, EQUIPMENTS), 'technician_id': 1, 'cost': rnd.uniform(50, 900)}
+            for _ in range(min(10000, n_records - offset))
+        ])
+    db.session.commit()
+
+
+def maintenance_sheet():
+    """Mesma exportação usada por equipment.export_maintenance."""
+    sheets, _ = maintenance_export(MultiDict())
+    return sheets[0]
+
+
+def measure(label, build, n_records):
+    tracemalloc.start()
+    started = time.perf_counter()
+    size = build()
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f'{label:<8} {elapsed:8.2f} s  {n_records / elapsed:12,.0f} linhas/s  '
+          f'pico {peak / 1024 / 1024:8.1f} MiB  arquivo {size / 1024 / 1024:8.1f} MiB')
+
+
+def _file_size(writer):
+    def build():
+        with tempfile.TemporaryFile() as spool:
+            writer(maintenance_sheet(), spool)
+            return spool.tell()
+    return build
+
+
+def _xlsx_size():
+    with build_xlsx([maintenance_sheet()]) as spool:
+        spool.seek(0, os.SEEK_END)
+        return spool.tell()
+
+
+def run(n_records):
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+        print(f'Populando {n_records} registros de manutenção...')
+        seed(n_records)
+        measure('xlsx', _xlsx_size, n_records)
+        measure('csv', _file_size(write_csv), n_records)
+        measure('parquet', _file_size(write_parquet), n_records)
+
+
+if __name__ == '__main__':
+    try:
+        run(int(sys.argv[1]) if len(sys.argv) > 1 else 200000)
+    finally:
+        os.remove(_db_file.name)
@@ -0,0 +1,132 @@
+"""
+benchmarks/period_filters.py
+
+Compara os filtros de mês com extract('year'/'month', coluna) e com o
+intervalo semiaberto [início, fim) de services/periods.py, mostrando o plano
+de execução (EXPLAIN) e o tempo de cada consulta.
+
+Uso:
+    python benchmarks/period_filters.py [quantidade_de_registros]
+
+Por padrão usa um SQLite temporário. Para medir no PostgreSQL, informe um
+banco descartável em BENCH_DATABASE_URL (as tabelas são criadas e removidas):
+    BENCH_DATABASE_URL=postgresql://localhost/bench python benchmarks/period_filters.py
+"""
+import os
+import sys
+import random
+import tempfile
+import time
+from datetime import date, timedelta
+
+_db_file = None
+if os.environ.get('BENCH_DATABASE_URL'):
+    os.environ['DATABASE_URL'] = os.environ['BENCH_DATABASE_URL']
+else:
+    _db_file = tempfile.NamedTemporaryFile(suffix='.db', delete=False)
+    os.environ['DATABASE_URL'] = 'sqlite:///' + _db_file.name
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from sqlalchemy import select, func, insert, extract, text  # noqa: E402
+
+from app import create_app  # noqa: E402
+from extensions import db  # noqa: E402
+from models import User, Client, Equipment, MaintenanceHistory, Expense, TimeClock  # noqa: E402
+from services.periods import month_period  # noqa: E402
+
+TECHNICIANS = 20
+EQUIPMENTS = 2000
+DAYS = 1500
+
+
+def seed(n_records):
+    today = date.today()
+    rnd = random.Random(42)
+    db.session.execute(insert(User), [
+        {'id': i, 'username': f'user{i}', 'password_hash': 'x', 'name': f'User {i}',
+         'email': f'user{i}@example.com', 'cpf': f'{i:011d}', 'role': 'technician', 'is_active': True}
+        for i in range(1, TECHNICIANS + 1)
+    ])
+    db.session.execute(insert(Client), [{'id': 1, 'name': 'Cliente', 'is_archived': False}])
+    db.session.execute(insert(Equipment), [
+        {'id': i, 'code': f'EQ{i:06d}', 'model': 'Split', 'location': 'Sala', 'next_maintenance_date': today,
+         'user_id': rnd.randint(1, TECHNICIANS), 'client_id': 1, 'is_archived': False}
+        for i in range(1, EQUIPMENTS + 1)
+    ])
+    db.session.execute(insert(MaintenanceHistory), [
+        {'maintenance_date': today - timedelta(days=rnd.randint(0, DAYS)), 'category': 'Manutenção Preventiva',
+         'description': '-', 'equipment_id': rnd.randint(1, EQUIPMENTS),
+         'technician_id': rnd.randint(1, TECHNICIANS), 'cost': rnd.uniform(50, 500)}
+        for _ in range(n_records)
+    ])
+    db.session.execute(insert(Expense), [
+        {'date': today - timedelta(days=rnd.randint(0, DAYS)), 'category': 'Lanche', 'value': 10,
+         'user_id': rnd.randint(1, TECHNICIANS)}
+        for _ in range(n_records)
+    ])
+    db.session.execute(insert(TimeClock), [
+        {'date': today - timedelta(days=d), 'user_id': u}
+        for d in range(DAYS) for u in range(1, TECHNICIANS + 1)
+    ])
+    db.session.commit()
+
+
+def queries(year, month):
+    """Pares (extract, intervalo) das consultas das telas de relatório e do dashboard."""
+    period = month_period(year, month)
+
+    def by_extract(stmt, column):
+        return stmt.where(extract('year', column) == year, extract('month', column) == month)
+
+    cases = {
+        'ponto do mês (todos)': (select(TimeClock.id), TimeClock.date),
+        'ponto do mês (técnico)': (select(TimeClock.id).where(TimeClock.user_id == 3), TimeClock.date),
+        'KPIs de manutenção': (select(func.count(MaintenanceHistory.id), func.sum(MaintenanceHistory.cost)),
+                               MaintenanceHistory.maintenance_date),
+        'despesas do mês': (select(func.sum(Expense.value)), Expense.date),
+    }
+    return {
+        label: (by_extract(stmt, column), period.apply(stmt, column))
+        for label, (stmt, column) in cases.items()
+    }
+
+
+def explain_and_time(label, stmt):
+    sql = str(stmt.compile(db.engine, compile_kwargs={'literal_binds': True}))
+    prefix = 'EXPLAIN QUERY PLAN ' if db.engine.dialect.name == 'sqlite' else 'EXPLAIN '
+    plan = db.session.execute(text(prefix + sql)).fetchall()
+    started = time.perf_counter()
+    for _ in range(20):
+        db.session.execute(stmt).fetchall()
+    elapsed_ms = (time.perf_counter() - started) / 20 * 1000
+    print(f'  {label:<12} {elapsed_ms:8.3f} ms')
+    for row in plan:
+        print(f'      {row[-1]}')
+
+
+def run(n_records):
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+        try:
+            print(f'[{db.engine.dialect.name}] Populando {n_records} manutenções e despesas...')
+            seed(n_records)
+            db.session.execute(text('ANALYZE'))
+            db.session.commit()
+
+            target = date.today().replace(day=1) - timedelta(days=200)
+            for label, (extract_stmt, range_stmt) in queries(target.year, target.month).items():
+                print(f'\n=== {label} ===')
+                explain_and_time('extract()', extract_stmt)
+                explain_and_time('[início, fim)', range_stmt)
+        finally:
+            db.session.rollback()
+            db.drop_all()
+
+
+if __name__ == '__main__':
+    try:
+        run(int(sys.argv[1]) if len(sys.argv) > 1 else 200000)
+    finally:
+        if _db_file:
+            os.remove(_db_file.name)
@@ -0,0 +1,162 @@
+"""
+benchmarks/query_plans.py
+
+Mostra os planos de execução (EXPLAIN) e o tempo das consultas mais
+frequentes das rotas, antes e depois da criação dos índices compostos.
+
+Uso:
+    python benchmarks/query_plans.py [quantidade_de_equipamentos]
+
+O banco é um SQLite temporário populado com dados sintéticos; o banco
+configurado em DATABASE_URL não é tocado.
+"""
+import os
+import sys
+import random
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+
+_db_file = tempfile.NamedTemporaryFile(suffix='.db', delete=False)
+os.environ['DATABASE_URL'] = 'sqlite:///' + _db_file.name
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from sqlalchemy import select, func, insert, text  # noqa: E402
+
+from app import create_app  # noqa: E402
+from extensions import db  # noqa: E402
+from models import (User, Client, Equipment, MaintenanceHistory, Notification, Expense,  # noqa: E402
+                    TimeClock, StockItem, MaintenancePartUsed, Task, TaskAssignment)
+
+TECHNICIANS = 20
+CLIENTS = 200
+HISTORY_PER_EQUIPMENT = 4
+
+
+def seed(n_equipments):
+    """Popula o banco com inserts em lote."""
+    today = date.today()
+    rnd = random.Random(42)
+    db.session.execute(insert(User), [
+        {'id': i, 'username': f'user{i}', 'password_hash': 'x', 'name': f'User {i}',
+         'email': f'user{i}@example.com', 'cpf': f'{i:011d}', 'role': 'admin' if i == 1 else 'technician',
+         'is_active': True}
+        for i in range(1, TECHNICIANS + 1)
+    ])
+    db.session.execute(insert(Client), [
+        {'id': i, 'name': f'Cliente {i}', 'is_archived': False} for i in range(1, CLIENTS + 1)
+    ])
+    db.session.execute(insert(Equipment), [
+        {'id': i, 'code': f'EQ{i:06d}', 'model': 'Split', 'location': 'Sala',
+         'next_maintenance_date': today + timedelta(days=rnd.randint(-120, 240)),
+         'user_id': rnd.randint(1, TECHNICIANS), 'client_id': rnd.randint(1, CLIENTS),
+         'is_archived': rnd.random() < 0.1}
+        for i in range(1, n_equipments + 1)
+    ])
+    n_history = n_equipments * HISTORY_PER_EQUIPMENT
+    db.session.execute(insert(MaintenanceHistory), [
+        {'id': i, 'maintenance_date': today - timedelta(days=rnd.randint(0, 720)),
+         'category': rnd.choice(['Manutenção Preventiva', 'Manutenção Corretiva']), 'description': '-',
+         'equipment_id': rnd.randint(1, n_equipments), 'technician_id': rnd.randint(1, TECHNICIANS),
+         'cost': rnd.uniform(50, 500)}
+        for i in range(1, n_history + 1)
+    ])
+    db.session.execute(insert(StockItem), [
+        {'id': i, 'name': f'Item {i}', 'category': 'Geral', 'quantity': 100} for i in range(1, 51)
+    ])
+    db.session.execute(insert(MaintenancePartUsed), [
+        {'maintenance_history_id': rnd.randint(1, n_history), 'stock_item_id': rnd.randint(1, 50),
+         'quantity_used': 1}
+        for _ in range(n_history // 2)
+    ])
+    db.session.execute(insert(Notification), [
+        {'user_id': rnd.randint(1, TECHNICIANS), 'message': 'msg', 'is_read': rnd.random() < 0.8,
+         'timestamp': datetime.utcnow() - timedelta(minutes=rnd.randint(0, 500000))}
+        for _ in range(n_equipments * 2)
+    ])
+    db.session.execute(insert(Expense), [
+        {'date': today - timedelta(days=rnd.randint(0, 720)), 'category': 'Lanche', 'value': 10,
+         'user_id': rnd.randint(1, TECHNICIANS)}
+        for _ in range(n_equipments)
+    ])
+    db.session.execute(insert(TimeClock), [
+        {'date': today - timedelta(days=d), 'user_id': u}
+        for d in range(720) for u in range(1, TECHNICIANS + 1)
+    ])
+    db.session.execute(insert(Task), [{'id': 1, 'title': 'T', 'creator_id': 1}])
+    db.session.execute(insert(TaskAssignment), [
+        {'task_id': 1, 'user_id': u, 'status': 'Não iniciado'} for u in range(1, TECHNICIANS + 1)
+    ])
+    db.session.commit()
+
+
+def representative_queries():
+    """Consultas no formato usado pelas rotas (dashboard, históricos, relatórios, notificações)."""
+    today = date.today()
+    month_start = today.replace(day=1)
+    return {
+        'dashboard (admin)': select(Equipment.id).where(Equipment.is_archived.is_(False))
+            .order_by(Equipment.next_maintenance_date).limit(10),
+        'dashboard (técnico)': select(Equipment.id).where(Equipment.user_id == 2, Equipment.is_archived.is_(False))
+            .order_by(Equipment.next_maintenance_date).limit(10),
+        'dashboard (cliente)': select(func.count(Equipment.id)).where(Equipment.client_id == 7,
+                                                                      Equipment.is_archived.is_(False)),
+        'histórico do equipamento': select(MaintenanceHistory.id).where(MaintenanceHistory.equipment_id == 10)
+            .order_by(MaintenanceHistory.maintenance_date.desc()),
+        'KPIs do mês': select(func.count(MaintenanceHistory.id)).where(
+            MaintenanceHistory.maintenance_date >= month_start, MaintenanceHistory.maintenance_date < today + timedelta(days=1)),
+        'notificações não lidas': select(func.count(Notification.id)).where(Notification.user_id == 3,
+                                                                            Notification.is_read.is_(False)),
+        'notificações recentes': select(Notification.id).where(Notification.user_id == 3)
+            .order_by(Notification.timestamp.desc()).limit(5),
+        'despesas da semana': select(func.sum(Expense.value)).where(
+            Expense.user_id == 4, Expense.date >= today - timedelta(days=6), Expense.date <= today),
+        'ponto do dia': select(TimeClock.id).where(TimeClock.user_id == 5, TimeClock.date == today),
+        'peças por item': select(MaintenancePartUsed.id).where(MaintenancePartUsed.stock_item_id == 3),
+        'tarefas do técnico': select(TaskAssignment.id).where(TaskAssignment.user_id == 6),
+    }
+
+
+def explain_and_time(label, stmt):
+    sql = str(stmt.compile(db.engine, compile_kwargs={'literal_binds': True}))
+    prefix = 'EXPLAIN QUERY PLAN ' if db.engine.dialect.name == 'sqlite' else 'EXPLAIN '
+    plan = db.session.execute(text(prefix + sql)).fetchall()
+    started = time.perf_counter()
+    for _ in range(20):
+        db.session.execute(stmt).fetchall()
+    elapsed_ms = (time.perf_counter() - started) / 20 * 1000
+    print(f'  {label:<28} {elapsed_ms:8.3f} ms')
+    for row in plan:
+        print(f'      {row[-1]}')
+
+
+def run(n_equipments):
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+        print(f'Populando {n_equipments} equipamentos...')
+        seed(n_equipments)
+
+        # Índices que já existiam antes desta migração não entram na comparação
+        indexes = [index for table in db.metadata.sorted_tables for index in table.indexes
+                   if table.name not in ('appointment', 'scheduling_link')]
+        for index in indexes:
+            index.drop(db.engine)
+        db.session.execute(text('ANALYZE'))
+        print('\n=== ANTES (sem os índices compostos) ===')
+        for label, stmt in representative_queries().items():
+            explain_and_time(label, stmt)
+
+        for index in indexes:
+            index.create(db.engine)
+        db.session.execute(text('ANALYZE'))
+        print('\n=== DEPOIS (com os índices compostos) ===')
+        for label, stmt in representative_queries().items():
+            explain_and_time(label, stmt)
+
+
+if __name__ == '__main__':
+    try:
+        run(int(sys.argv[1]) if len(sys.argv) > 1 else 20000)
+    finally:
+        os.remove(_db_file.name)
@@ -0,0 +1,136 @@
+"""
+benchmarks/stock_concurrency.py
+
+Vários processos baixando as mesmas peças ao mesmo tempo, como técnicos
+fechando manutenções em workers diferentes do gunicorn. Compara a baixa
+atômica de services/stock_ledger.py com a leitura-verificação-escrita em
+Python usada antes, e confere se alguma unidade foi vendida duas vezes.
+
+Uso:
+    python benchmarks/stock_concurrency.py [processos] [estoque_inicial]
+
+Por padrão usa um SQLite temporário. Para medir no PostgreSQL, informe um
+banco descartável em BENCH_DATABASE_URL (as tabelas são criadas e removidas):
+    BENCH_DATABASE_URL=postgresql://localhost/bench python benchmarks/stock_concurrency.py
+"""
+import os
+import sys
+import tempfile
+import time
+import multiprocessing
+
+_db_file = None
+if os.environ.get('_STOCK_BENCH_CHILD'):
+    pass  # processo filho: usa o DATABASE_URL herdado do pai
+elif os.environ.get('BENCH_DATABASE_URL'):
+    os.environ['DATABASE_URL'] = os.environ['BENCH_DATABASE_URL']
+else:
+    _db_file = tempfile.NamedTemporaryFile(suffix='.db', delete=False)
+    os.environ['DATABASE_URL'] = 'sqlite:///' + _db_file.name
+os.environ['_STOCK_BENCH_CHILD'] = '1'
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from sqlalchemy import func, insert, select  # noqa: E402
+from sqlalchemy.exc import OperationalError  # noqa: E402
+
+from app import create_app  # noqa: E402
+from extensions import db  # noqa: E402
+from models import StockItem, StockLedgerEntry  # noqa: E402
+from services.stock_ledger import InsufficientStock, move_stock_batch  # noqa: E402
+
+ITEMS = (1, 2)  # cada "manutenção" usa uma unidade de cada item
+
+
+def _consume_atomic():
+    move_stock_batch({item_id: -1 for item_id in ITEMS}, 'maintenance')
+
+
+def _consume_naive():
+    for item_id in ITEMS:
+        item = db.session.get(StockItem, item_id)
+        if item.quantity < 1:
+            raise InsufficientStock(item.name)
+        time.sleep(0.001)  # a janela entre a leitura e a escrita, como numa requisição real
+        item.quantity -= 1
+
+
+def worker(mode, start_event, results):
+    app = create_app()
+    consume = _consume_atomic if mode == 'atomic' else _consume_naive
+    done = 0
+    with app.app_context():
+        start_event.wait()
+        while True:
+            try:
+                consume()
+                db.session.commit()
+                done += 1
+            except InsufficientStock:
+                db.session.rollback()
+                break
+            except OperationalError:
+                # SQLite: banco travado por outro escritor; tenta de novo
+                db.session.rollback()
+                time.sleep(0.005)
+    results.put(done)
+
+
+def run_mode(app, mode, processes, initial):
+    with app.app_context():
+        db.session.execute(StockItem.__table__.update().values(quantity=initial))
+        db.session.execute(StockLedgerEntry.__table__.delete())
+        db.session.commit()
+
+    ctx = multiprocessing.get_context('spawn')
+    start_event, results = ctx.Event(), ctx.Queue()
+    procs = [ctx.Process(target=worker, args=(mode, start_event, results)) for _ in range(processes)]
+    for p in procs:
+        p.start()
+    time.sleep(2)  # espera os processos subirem a aplicação
+    started = time.perf_counter()
+    start_event.set()
+    consumed = sum(results.get() for _ in procs)
+    for p in procs:
+        p.join()
+    elapsed = time.perf_counter() - started
+
+    with app.app_context():
+        final = dict(db.session.execute(select(StockItem.id, StockItem.quantity)).all())
+        ledger = dict(db.session.execute(
+            select(StockLedgerEntry.stock_item_id, func.sum(StockLedgerEntry.delta))
+            .group_by(StockLedgerEntry.stock_item_id)
+        ).all())
+    # Unidades entregues sem sair do saldo (baixas perdidas ou estoque negativo)
+    oversold = max(consumed - (initial - final[item_id]) for item_id in ITEMS)
+    print(f'  {mode:<8} {consumed:5d} baixas confirmadas em {elapsed:6.2f}s | '
+          f'saldo final {final} | livro {ledger or "-"} | '
+          f'{"VENDEU A MAIS: " + str(oversold) if oversold > 0 else "ok"}')
+    return oversold
+
+
+def run(processes, initial):
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+        db.session.execute(insert(StockItem), [
+            {'id': item_id, 'name': f'Peça {item_id}', 'category': 'Geral', 'quantity': initial,
+             'low_stock_threshold': 0, 'requires_tracking': True}
+            for item_id in ITEMS
+        ])
+        db.session.commit()
+        print(f'[{db.engine.dialect.name}] {processes} processos disputando {initial} unidades de cada peça')
+    try:
+        run_mode(app, 'naive', processes, initial)
+        if run_mode(app, 'atomic', processes, initial) > 0:
+            sys.exit(1)
+    finally:
+        with app.app_context():
+            db.drop_all()
+
+
+if __name__ == '__main__':
+    try:
+        run(int(sys.argv[1]) if len(sys.argv) > 1 else 8, int(sys.argv[2]) if len(sys.argv) > 2 else 200)
+    finally:
+        if _db_file:
+            os.remove(_db_file.name)
@@ -0,0 +1,48 @@
+"""Add composite indexes for hot filter columns
+
+Revision ID: 3f1c9a7d2b64
+Revises: b600ac14b51d
+Create Date: 2026-10-17 09:12:41.518203
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3f1c9a7d2b64'
+down_revision = 'b600ac14b51d'
+branch_labels = None
+depends_on = None
+
+
+# (tabela, nome do índice, colunas) - espelham os filtros usados pelas rotas
+INDEXES = [
+    ('equipment', 'ix_equipment_archived_next_date', ['is_archived', 'next_maintenance_date']),
+    ('equipment', 'ix_equipment_user_archived_next_date', ['user_id', 'is_archived', 'next_maintenance_date']),
+    ('equipment', 'ix_equipment_client_archived_next_date', ['client_id', 'is_archived', 'next_maintenance_date']),
+    ('maintenance_history', 'ix_maintenance_history_equipment_date', ['equipment_id', 'maintenance_date']),
+    ('maintenance_history', 'ix_maintenance_history_date', ['maintenance_date']),
+    ('notification', 'ix_notification_user_read', ['user_id', 'is_read']),
+    ('notification', 'ix_notification_user_timestamp', ['user_id', 'timestamp']),
+    ('expense', 'ix_expense_user_date', ['user_id', 'date']),
+    ('expense', 'ix_expense_date', ['date']),
+    ('time_clock', 'ix_time_clock_user_date', ['user_id', 'date']),
+    ('time_clock', 'ix_time_clock_date', ['date']),
+    ('maintenance_part_used', 'ix_maintenance_part_used_stock_item_id', ['stock_item_id']),
+    ('maintenance_part_used', 'ix_maintenance_part_used_history_id', ['maintenance_history_id']),
+    ('task_assignment', 'ix_task_assignment_user_id', ['user_id']),
+    ('task_assignment', 'ix_task_assignment_task_id', ['task_id']),
+]
+
+
+def upgrade():
+    for table, name, columns in INDEXES:
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.create_index(name, columns, unique=False)
+
+
+def downgrade():
+    for table, name, columns in reversed(INDEXES):
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.drop_index(name)
@@ -0,0 +1,33 @@
+"""Add notification outbox
+
+Revision ID: 8a4e2d91c5f7
+Revises: 3f1c9a7d2b64
+Create Date: 2026-10-17 10:03:55.204117
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8a4e2d91c5f7'
+down_revision = '3f1c9a7d2b64'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('notification_outbox',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('target', sa.String(length=20), nullable=False),
+    sa.Column('recipient_ids', sa.JSON(), nullable=True),
+    sa.Column('excluded_user_id', sa.Integer(), nullable=True),
+    sa.Column('message', sa.String(length=255), nullable=False),
+    sa.Column('url', sa.String(length=255), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+
+
+def downgrade():
+    op.drop_table('notification_outbox')
@@ -0,0 +1,29 @@
+"""Add processing status to maintenance images
+
+Revision ID: a7c2e9f4b6d3
+Revises: e5b7c3a9d1f2
+Create Date: 2026-10-17 16:48:31.402957
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a7c2e9f4b6d3'
+down_revision = 'e5b7c3a9d1f2'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # As fotos já existentes entram como pendentes e são processadas por 'flask process-images'
+    with op.batch_alter_table('maintenance_image', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('status', sa.String(length=20), server_default='pending', nullable=False))
+        batch_op.create_index('ix_maintenance_image_status', ['status'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('maintenance_image', schema=None) as batch_op:
+        batch_op.drop_index('ix_maintenance_image_status')
+        batch_op.drop_column('status')
@@ -0,0 +1,33 @@
+"""Index appointment end time and track appointment updates
+
+Revision ID: b8d4f2a6c1e3
+Revises: a7c2e9f4b6d3
+Create Date: 2026-10-17 18:12:05.218734
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b8d4f2a6c1e3'
+down_revision = 'a7c2e9f4b6d3'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('appointment', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('updated_at', sa.DateTime(), nullable=True))
+        batch_op.create_index('ix_appointment_end_datetime', ['end_datetime'], unique=False)
+
+    op.execute(sa.text('UPDATE appointment SET updated_at = CURRENT_TIMESTAMP'))
+
+    with op.batch_alter_table('appointment', schema=None) as batch_op:
+        batch_op.alter_column('updated_at', existing_type=sa.DateTime(), nullable=False)
+
+
+def downgrade():
+    with op.batch_alter_table('appointment', schema=None) as batch_op:
+        batch_op.drop_index('ix_appointment_end_datetime')
+        batch_op.drop_column('updated_at')
@@ -0,0 +1,48 @@
+"""Add export job queue
+
+Revision ID: c4d9e7a1b3f0
+Revises: 8a4e2d91c5f7
+Create Date: 2026-10-17 11:42:18.530914
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c4d9e7a1b3f0'
+down_revision = '8a4e2d91c5f7'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('export_job',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('kind', sa.String(length=50), nullable=False),
+    sa.Column('params', sa.JSON(), nullable=True),
+    sa.Column('format', sa.String(length=10), nullable=False),
+    sa.Column('status', sa.String(length=20), nullable=False),
+    sa.Column('rows_exported', sa.Integer(), nullable=False),
+    sa.Column('error', sa.Text(), nullable=True),
+    sa.Column('file_path', sa.String(length=500), nullable=True),
+    sa.Column('download_name', sa.String(length=255), nullable=True),
+    sa.Column('mimetype', sa.String(length=100), nullable=True),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.Column('started_at', sa.DateTime(), nullable=True),
+    sa.Column('finished_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('export_job', schema=None) as batch_op:
+        batch_op.create_index('ix_export_job_status_created_at', ['status', 'created_at'], unique=False)
+        batch_op.create_index('ix_export_job_user_id_created_at', ['user_id', 'created_at'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('export_job', schema=None) as batch_op:
+        batch_op.drop_index('ix_export_job_user_id_created_at')
+        batch_op.drop_index('ix_export_job_status_created_at')
+
+    op.drop_table('export_job')
@@ -0,0 +1,32 @@
+"""Add denormalized unread notification counter to user
+
+Revision ID: c7e3a1f9d5b2
+Revises: b8d4f2a6c1e3
+Create Date: 2026-10-17 20:05:42.731906
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c7e3a1f9d5b2'
+down_revision = 'b8d4f2a6c1e3'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('unread_notifications', sa.Integer(), server_default='0', nullable=False))
+
+    op.execute(sa.text(
+        'UPDATE "user" SET unread_notifications = ('
+        'SELECT COUNT(*) FROM notification '
+        'WHERE notification.user_id = "user".id AND notification.is_read = false)'
+    ))
+
+
+def downgrade():
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.drop_column('unread_notifications')
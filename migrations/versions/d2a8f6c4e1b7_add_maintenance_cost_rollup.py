@@ -0,0 +1,63 @@
+"""Add maintenance cost rollup
+
+Revision ID: d2a8f6c4e1b7
+Revises: c4d9e7a1b3f0
+Create Date: 2026-10-17 13:05:41.772310
+
+"""
+from datetime import date
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd2a8f6c4e1b7'
+down_revision = 'c4d9e7a1b3f0'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    rollup = op.create_table('maintenance_cost_rollup',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('client_id', sa.Integer(), nullable=False),
+    sa.Column('equipment_id', sa.Integer(), nullable=False),
+    sa.Column('month', sa.Date(), nullable=False),
+    sa.Column('total_cost', sa.Float(), nullable=False),
+    sa.Column('maintenance_count', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['client_id'], ['client.id'], ),
+    sa.ForeignKeyConstraint(['equipment_id'], ['equipment.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('client_id', 'equipment_id', 'month', name='uq_maintenance_cost_rollup_key')
+    )
+    with op.batch_alter_table('maintenance_cost_rollup', schema=None) as batch_op:
+        batch_op.create_index('ix_maintenance_cost_rollup_month', ['month'], unique=False)
+        batch_op.create_index('ix_maintenance_cost_rollup_equipment_month', ['equipment_id', 'month'], unique=False)
+
+    # Popula os agregados com o histórico existente
+    history = sa.table('maintenance_history', sa.column('id', sa.Integer), sa.column('equipment_id', sa.Integer),
+                       sa.column('maintenance_date', sa.Date), sa.column('cost', sa.Float))
+    equipment = sa.table('equipment', sa.column('id', sa.Integer), sa.column('client_id', sa.Integer))
+    year = sa.extract('year', history.c.maintenance_date)
+    month = sa.extract('month', history.c.maintenance_date)
+    rows = op.get_bind().execute(
+        sa.select(equipment.c.client_id, history.c.equipment_id, year, month,
+                  sa.func.coalesce(sa.func.sum(history.c.cost), 0.0), sa.func.count(history.c.id))
+        .select_from(history.join(equipment, history.c.equipment_id == equipment.c.id))
+        .group_by(equipment.c.client_id, history.c.equipment_id, year, month)
+    ).all()
+    if rows:
+        op.bulk_insert(rollup, [
+            {'client_id': client_id, 'equipment_id': equipment_id, 'month': date(int(y), int(m), 1),
+             'total_cost': float(total_cost), 'maintenance_count': count}
+            for client_id, equipment_id, y, m, total_cost, count in rows
+        ])
+
+
+def downgrade():
+    with op.batch_alter_table('maintenance_cost_rollup', schema=None) as batch_op:
+        batch_op.drop_index('ix_maintenance_cost_rollup_equipment_month')
+        batch_op.drop_index('ix_maintenance_cost_rollup_month')
+
+    op.drop_table('maintenance_cost_rollup')
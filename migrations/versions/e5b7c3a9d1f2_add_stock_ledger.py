@@ -0,0 +1,70 @@
+"""Add stock ledger and snapshots
+
+Revision ID: e5b7c3a9d1f2
+Revises: d2a8f6c4e1b7
+Create Date: 2026-10-17 15:20:09.114862
+
+"""
+from datetime import datetime
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e5b7c3a9d1f2'
+down_revision = 'd2a8f6c4e1b7'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    ledger = op.create_table('stock_ledger_entry',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('stock_item_id', sa.Integer(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.Column('delta', sa.Integer(), nullable=False),
+    sa.Column('balance_after', sa.Integer(), nullable=False),
+    sa.Column('reason', sa.String(length=30), nullable=False),
+    sa.Column('maintenance_history_id', sa.Integer(), nullable=True),
+    sa.Column('user_id', sa.Integer(), nullable=True),
+    sa.Column('note', sa.String(length=255), nullable=True),
+    sa.ForeignKeyConstraint(['stock_item_id'], ['stock_item.id'], ),
+    sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('stock_ledger_entry', schema=None) as batch_op:
+        batch_op.create_index('ix_stock_ledger_entry_item_created', ['stock_item_id', 'created_at'], unique=False)
+        batch_op.create_index('ix_stock_ledger_entry_created', ['created_at'], unique=False)
+
+    op.create_table('stock_snapshot',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('snapshot_date', sa.Date(), nullable=False),
+    sa.Column('stock_item_id', sa.Integer(), nullable=False),
+    sa.Column('quantity', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['stock_item_id'], ['stock_item.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('snapshot_date', 'stock_item_id', name='uq_stock_snapshot_date_item')
+    )
+
+    # Abre o livro com o saldo atual de cada item (o histórico anterior não existe)
+    stock_item = sa.table('stock_item', sa.column('id', sa.Integer), sa.column('quantity', sa.Integer))
+    rows = op.get_bind().execute(
+        sa.select(stock_item.c.id, stock_item.c.quantity).where(stock_item.c.quantity != 0)
+    ).all()
+    now = datetime.utcnow()
+    if rows:
+        op.bulk_insert(ledger, [
+            {'stock_item_id': item_id, 'created_at': now, 'delta': quantity, 'balance_after': quantity,
+             'reason': 'initial', 'note': 'Saldo na abertura do livro de estoque'}
+            for item_id, quantity in rows
+        ])
+
+
+def downgrade():
+    op.drop_table('stock_snapshot')
+    with op.batch_alter_table('stock_ledger_entry', schema=None) as batch_op:
+        batch_op.drop_index('ix_stock_ledger_entry_created')
+        batch_op.drop_index('ix_stock_ledger_entry_item_created')
+
+    op.drop_table('stock_ledger_entry')
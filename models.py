@@ -1,5 +1,4 @@
 # models.py
-from flask import g
 from datetime import datetime, timedelta, date # CORREÇÃO: 'date' foi adicionado aqui
 from flask import current_app
 from flask_login import UserMixin
@@ -30,6 +29,8 @@ class User(UserMixin, db.Model):
     cpf = db.Column(db.String(14), unique=True, nullable=False) # Armazenado como string para manter a formatação
     role = db.Column(db.String(20), nullable=False, default='technician')
     is_active = db.Column(db.Boolean, default=False, nullable=False)
+    # Notificações não lidas; mantido na mesma transação que as grava e lê (services/notifications.py)
+    unread_notifications = db.Column(db.Integer, nullable=False, default=0, server_default='0')
     equipments = db.relationship('Equipment', backref='operator', lazy=True)
     maintenance_records = db.relationship('MaintenanceHistory', backref='technician', lazy=True)
     created_tasks = db.relationship('Task', back_populates='creator', foreign_keys='Task.creator_id')
@@ -64,6 +65,12 @@ class Client(db.Model):
     
 class Equipment(db.Model):
     """Modelo para os equipamentos."""
+    __table_args__ = (
+        db.Index('ix_equipment_archived_next_date', 'is_archived', 'next_maintenance_date'),
+        db.Index('ix_equipment_user_archived_next_date', 'user_id', 'is_archived', 'next_maintenance_date'),
+        db.Index('ix_equipment_client_archived_next_date', 'client_id', 'is_archived', 'next_maintenance_date'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     code = db.Column(db.String(50), nullable=False, unique=True)
     model = db.Column(db.String(150), nullable=False)
@@ -80,18 +87,16 @@ class Equipment(db.Model):
 
     @property
     def status(self):
-        # Verifica se já buscamos o valor nesta requisição
-        if 'warning_days' not in g:
-            # Se não, busca no DB e armazena em 'g' (cache da requisição)
-            setting = db.session.get(Setting, 'maintenance_warning_days')
-            g.warning_days = int(setting.value) if setting else 15
+        # O valor é buscado uma vez por requisição e armazenado em 'g'
+        from services.status import get_warning_days
+        warning_days = get_warning_days()
         
         today = datetime.now().date()
         
         if self.next_maintenance_date < today:
             return "Vencido"
         # Usa o valor que buscamos do banco de dados (ou o padrão)
-        elif self.next_maintenance_date <= today + timedelta(days=g.warning_days):
+        elif self.next_maintenance_date <= today + timedelta(days=warning_days):
             return "Próximo do vencimento"
         else:
             return "Em dia"
@@ -106,6 +111,11 @@ class Equipment(db.Model):
 
 class MaintenanceHistory(db.Model):
     """Modelo para o histórico de manutenções."""
+    __table_args__ = (
+        db.Index('ix_maintenance_history_equipment_date', 'equipment_id', 'maintenance_date'),
+        db.Index('ix_maintenance_history_date', 'maintenance_date'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     maintenance_date = db.Column(db.Date, nullable=False, default=datetime.utcnow)
     category = db.Column(db.String(50), nullable=False)
@@ -122,11 +132,39 @@ class MaintenanceHistory(db.Model):
     def __repr__(self):
         return f'<MaintenanceHistory {self.id} for Equipment {self.equipment_id}>'
 
+
+class MaintenanceCostRollup(db.Model):
+    """
+    Agregado mensal de custos das manutenções por cliente e equipamento.
+    Mantido de forma incremental por services/rollups.py a cada flush de
+    MaintenanceHistory; 'flask rebuild-rollups' o recalcula do zero.
+    """
+    __tablename__ = 'maintenance_cost_rollup'
+    __table_args__ = (
+        db.UniqueConstraint('client_id', 'equipment_id', 'month', name='uq_maintenance_cost_rollup_key'),
+        db.Index('ix_maintenance_cost_rollup_month', 'month'),
+        db.Index('ix_maintenance_cost_rollup_equipment_month', 'equipment_id', 'month'),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    client_id = db.Column(db.Integer, db.ForeignKey('client.id'), nullable=False)
+    equipment_id = db.Column(db.Integer, db.ForeignKey('equipment.id'), nullable=False)
+    month = db.Column(db.Date, nullable=False)  # primeiro dia do mês
+    total_cost = db.Column(db.Float, nullable=False, default=0.0)
+    maintenance_count = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f'<MaintenanceCostRollup {self.equipment_id} {self.month:%Y-%m}>'
+
 class MaintenanceImage(db.Model):
     """Modelo para armazenar as imagens de uma manutenção."""
+    __table_args__ = (
+        db.Index('ix_maintenance_image_status', 'status'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     filename = db.Column(db.String(100), nullable=False)
     maintenance_history_id = db.Column(db.Integer, db.ForeignKey('maintenance_history.id'), nullable=False)
+    # Miniaturas e recompressão (services/images.py): pending, ready, failed
+    status = db.Column(db.String(20), nullable=False, default='pending', server_default='pending')
 
     def __repr__(self):
         return f'<MaintenanceImage {self.filename}>'
@@ -147,6 +185,11 @@ class Task(db.Model):
 
 class TaskAssignment(db.Model):
     """Modelo que liga uma Tarefa a um Técnico e controla o status."""
+    __table_args__ = (
+        db.Index('ix_task_assignment_user_id', 'user_id'),
+        db.Index('ix_task_assignment_task_id', 'task_id'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     task_id = db.Column(db.Integer, db.ForeignKey('task.id'), nullable=False)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
@@ -161,6 +204,11 @@ class TaskAssignment(db.Model):
 
 class Notification(db.Model):
     """Modelo para as notificações no sistema."""
+    __table_args__ = (
+        db.Index('ix_notification_user_read', 'user_id', 'is_read'),
+        db.Index('ix_notification_user_timestamp', 'user_id', 'timestamp'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     message = db.Column(db.String(255), nullable=False)
@@ -172,6 +220,57 @@ class Notification(db.Model):
 
     def __repr__(self):
         return f'<Notification {self.id} for User {self.user_id}>'
+
+
+class NotificationOutbox(db.Model):
+    """
+    Fila (outbox) de eventos de notificação. As rotas apenas gravam um evento
+    aqui; o comando 'flask process-notifications' expande cada evento em
+    registros de Notification, fora do ciclo da requisição.
+    """
+    __tablename__ = 'notification_outbox'
+    id = db.Column(db.Integer, primary_key=True)
+    target = db.Column(db.String(20), nullable=False)  # 'admins' ou 'users'
+    recipient_ids = db.Column(db.JSON, nullable=True)  # usado quando target == 'users'
+    excluded_user_id = db.Column(db.Integer, nullable=True)
+    message = db.Column(db.String(255), nullable=False)
+    url = db.Column(db.String(255), nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+    def __repr__(self):
+        return f'<NotificationOutbox {self.id} -> {self.target}>'
+
+
+class ExportJob(db.Model):
+    """
+    Exportação de relatório executada em segundo plano pelo comando
+    'flask process-exports'. Guarda os filtros pedidos, o andamento e o
+    caminho do arquivo gerado, que fica disponível para download.
+    """
+    __tablename__ = 'export_job'
+    __table_args__ = (
+        db.Index('ix_export_job_status_created_at', 'status', 'created_at'),
+        db.Index('ix_export_job_user_id_created_at', 'user_id', 'created_at'),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(50), nullable=False)  # chave em services.report_exports.REPORT_EXPORTS
+    params = db.Column(db.JSON, nullable=True)  # filtros da URL no momento do pedido
+    format = db.Column(db.String(10), nullable=False, default='xlsx')
+    status = db.Column(db.String(20), nullable=False, default='pending')  # pending, running, done, failed
+    rows_exported = db.Column(db.Integer, nullable=False, default=0)
+    error = db.Column(db.Text, nullable=True)
+    file_path = db.Column(db.String(500), nullable=True)
+    download_name = db.Column(db.String(255), nullable=True)
+    mimetype = db.Column(db.String(100), nullable=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    started_at = db.Column(db.DateTime, nullable=True)
+    finished_at = db.Column(db.DateTime, nullable=True)
+
+    user = db.relationship('User')
+
+    def __repr__(self):
+        return f'<ExportJob {self.id} {self.kind} ({self.status})>'
     
     
     
@@ -196,6 +295,11 @@ class Lead(db.Model):
 
 class Expense(db.Model):
     """Modelo para armazenar as despesas diárias dos técnicos."""
+    __table_args__ = (
+        db.Index('ix_expense_user_date', 'user_id', 'date'),
+        db.Index('ix_expense_date', 'date'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     date = db.Column(db.Date, nullable=False, default=datetime.utcnow)
     category = db.Column(db.String(50), nullable=False)
@@ -211,6 +315,11 @@ class Expense(db.Model):
     
 class TimeClock(db.Model):
     """Modelo para armazenar os registros de ponto dos técnicos."""
+    __table_args__ = (
+        db.Index('ix_time_clock_user_date', 'user_id', 'date'),
+        db.Index('ix_time_clock_date', 'date'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     date = db.Column(db.Date, nullable=False, default=date.today)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
@@ -222,18 +331,6 @@ class TimeClock(db.Model):
 
     technician = db.relationship('User', backref=db.backref('time_clocks', lazy=True))
 
-    @property
-    def total_hours(self):
-        """Calcula o total de horas trabalhadas no dia."""
-        total_seconds = 0
-        if self.morning_check_in and self.morning_check_out:
-            total_seconds += (self.morning_check_out - self.morning_check_in).total_seconds()
-        if self.afternoon_check_in and self.afternoon_check_out:
-            total_seconds += (self.afternoon_check_out - self.afternoon_check_in).total_seconds()
-        
-        hours = total_seconds / 3600
-        return f"{hours:.2f}".replace('.', ',') if hours > 0 else "0,00"
-
     def __repr__(self):
         return f'<TimeClock {self.id} for User {self.user_id} on {self.date}>'
     
@@ -257,9 +354,54 @@ class StockItem(db.Model):
     def __repr__(self):
         return f'<StockItem {self.name}>'
 
+class StockLedgerEntry(db.Model):
+    """
+    Livro de estoque: uma linha imutável por alteração de quantidade de um item,
+    com a variação e o saldo resultante. Gravado por services/stock_ledger.py.
+    """
+    __tablename__ = 'stock_ledger_entry'
+    __table_args__ = (
+        db.Index('ix_stock_ledger_entry_item_created', 'stock_item_id', 'created_at'),
+        db.Index('ix_stock_ledger_entry_created', 'created_at'),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    stock_item_id = db.Column(db.Integer, db.ForeignKey('stock_item.id'), nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    delta = db.Column(db.Integer, nullable=False)
+    balance_after = db.Column(db.Integer, nullable=False)
+    reason = db.Column(db.String(30), nullable=False)  # chaves de LEDGER_REASONS
+    # Sem chave estrangeira: a linha continua no livro mesmo se a manutenção for excluída
+    maintenance_history_id = db.Column(db.Integer, nullable=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=True)
+    note = db.Column(db.String(255), nullable=True)
+
+    item = db.relationship('StockItem')
+    user = db.relationship('User')
+
+    def __repr__(self):
+        return f'<StockLedgerEntry {self.stock_item_id} {self.delta:+d}>'
+
+class StockSnapshot(db.Model):
+    """Saldo de fechamento de cada item em uma data, gravado por 'flask snapshot-stock'."""
+    __tablename__ = 'stock_snapshot'
+    __table_args__ = (
+        db.UniqueConstraint('snapshot_date', 'stock_item_id', name='uq_stock_snapshot_date_item'),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    snapshot_date = db.Column(db.Date, nullable=False)
+    stock_item_id = db.Column(db.Integer, db.ForeignKey('stock_item.id'), nullable=False)
+    quantity = db.Column(db.Integer, nullable=False)
+
+    def __repr__(self):
+        return f'<StockSnapshot {self.stock_item_id} {self.snapshot_date}>'
+
 class MaintenancePartUsed(db.Model):
     """Tabela que registra quais peças e em que quantidade foram usadas em uma manutenção."""
     __tablename__ = 'maintenance_part_used'
+    __table_args__ = (
+        db.Index('ix_maintenance_part_used_stock_item_id', 'stock_item_id'),
+        db.Index('ix_maintenance_part_used_history_id', 'maintenance_history_id'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     maintenance_history_id = db.Column(db.Integer, db.ForeignKey('maintenance_history.id'), nullable=False)
     stock_item_id = db.Column(db.Integer, db.ForeignKey('stock_item.id'), nullable=False)
@@ -282,7 +424,7 @@ class Appointment(db.Model):
 
     title = db.Column(db.String(200), nullable=False)
     start_datetime = db.Column(db.DateTime, nullable=False, index=True)
-    end_datetime = db.Column(db.DateTime, nullable=False)
+    end_datetime = db.Column(db.DateTime, nullable=False, index=True)
     
     # Status do agendamento.
     # Ex: 'SCHEDULED', 'COMPLETED', 'CANCELLED'
@@ -295,6 +437,9 @@ class Appointment(db.Model):
     client_id = db.Column(db.Integer, db.ForeignKey('client.id'), nullable=True)   # O cliente/unidade
     equipment_id = db.Column(db.Integer, db.ForeignKey('equipment.id'), nullable=True) # O ativo/equipamento
 
+    # Última alteração; compõe o ETag da janela do calendário (services/schedule.py)
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow)
+
     # Relationships para facilitar o acesso aos objetos
     technician = db.relationship('User', backref='appointments')
     client = db.relationship('Client', backref='appointments')
@@ -8,15 +8,15 @@ utilizando um Flask Blueprint.
 import re
 from flask import (Blueprint, render_template, request, redirect, url_for, flash, abort)
 from flask_login import login_required, current_user
-from models import Client, User, Notification, SchedulingLink # Adicione SchedulingLink
+from models import Client, SchedulingLink # Adicione SchedulingLink
 
 
 # Importa os modelos e a instância do banco de dados das extensões
-from models import Client, User, Notification
+from models import Client
 from extensions import db
 
 # Importa o decorator de permissão do arquivo de utilitários
-from .utils import admin_required
+from .utils import admin_required, notify_admins
 
 
 # Criação do Blueprint para as rotas de clientes
@@ -87,11 +87,7 @@ def edit_client(client_id):
         db.session.commit()
         
         msg = f"O cliente '{client.name}' foi atualizado por {current_user.username}."
-        admins = User.query.filter_by(role='admin').all()
-        for admin in admins:
-            if admin.id != current_user.id:
-                notif = Notification(user_id=admin.id, message=msg, url=url_for('clients.client_list'))
-                db.session.add(notif)
+        notify_admins(msg, url_for('clients.client_list'), excluded_user_id=current_user.id)
         db.session.commit()
         
         flash('Cliente atualizado com sucesso!', 'success')
@@ -5,14 +5,15 @@ Rotas centrais da aplicação, como dashboard, landing page e configurações.
 """
 from flask import (Blueprint, render_template, request, redirect, url_for, flash)
 from flask_login import login_required, current_user
-from math import ceil
 
 from datetime import datetime
-from sqlalchemy import extract, func
+from sqlalchemy.orm import joinedload
 
-from models import Equipment, Setting, Client, MaintenanceHistory, Expense
+from models import Equipment, Setting, Client
 from extensions import db
 from .utils import admin_required
+from services.status import status_counts, status_condition
+from services.kpis import get_monthly_kpis
 
 core_bp = Blueprint('core', __name__, template_folder='templates')
 
@@ -49,52 +50,31 @@ def dashboard():
     if client_id:
         base_query = base_query.filter_by(client_id=client_id)
 
-    all_user_equipments = base_query.order_by(Equipment.next_maintenance_date).all()
-    stats = {
-        'total': len(all_user_equipments),
-        'em_dia': len([e for e in all_user_equipments if e.status == 'Em dia']),
-        'proximo': len([e for e in all_user_equipments if e.status == 'Próximo do vencimento']),
-        'vencido': len([e for e in all_user_equipments if e.status == 'Vencido'])
-    }
-    # ... (O resto da sua lógica de filtragem e paginação continua aqui) ...
-    # ... (Copiado para ser breve, mantenha sua lógica original) ...
-    equipments_to_display = all_user_equipments # Simplicidade para o exemplo
-    items = equipments_to_display[0:per_page]
-    class Pagination:
-        def __init__(self, items, page, per_page, total):
-            self.items, self.page, self.per_page, self.total = items, page, per_page, total
-            self.pages = 1
-    equipments = Pagination(items, 1, per_page, len(items))
-
-
-    # --- NOVO: Cálculo dos Indicadores Mensais (KPIs) ---
-    today = datetime.utcnow()
-    current_month = today.month
-    current_year = today.year
-    
-    # Base de query para o mês atual
-    maintenance_this_month_query = MaintenanceHistory.query.filter(
-        extract('year', MaintenanceHistory.maintenance_date) == current_year,
-        extract('month', MaintenanceHistory.maintenance_date) == current_month
-    )
-    
-    expenses_this_month_query = Expense.query.filter(
-        extract('year', Expense.date) == current_year,
-        extract('month', Expense.date) == current_month
-    )
+    # Totais por status calculados em uma única consulta agregada
+    stats = status_counts(base_query)
+
+    # O filtro de status vira um intervalo de datas em next_maintenance_date
+    list_query = base_query
+    status_predicate = status_condition(status_filter)
+    if status_predicate is not None:
+        list_query = list_query.filter(status_predicate)
+    else:
+        status_filter = None
+
+    # Paginação no banco: apenas a página atual é carregada. O total já é
+    # conhecido pelos contadores acima, então o COUNT extra é dispensado.
+    equipments = list_query.options(joinedload(Equipment.client)).order_by(
+        Equipment.next_maintenance_date, Equipment.id
+    ).paginate(page=page, per_page=per_page, error_out=False, count=False)
+    equipments.total = stats[status_filter] if status_filter else stats['total']
 
-    # Dicionário com os KPIs calculados
-    monthly_kpis = {
-        'maintenances_count': maintenance_this_month_query.count(),
-        
-        'revenue': maintenance_this_month_query.with_entities(func.sum(MaintenanceHistory.cost)).scalar() or 0,
-        
-        'expenses': expenses_this_month_query.with_entities(func.sum(Expense.value)).scalar() or 0,
-        
-        'preventive_count': maintenance_this_month_query.filter(MaintenanceHistory.category == 'Manutenção Preventiva').count(),
-        
-        'corrective_count': maintenance_this_month_query.filter(MaintenanceHistory.category == 'Manutenção Corretiva').count()
-    }
+
+    # --- Indicadores Mensais (KPIs), calculados em uma consulta e cacheados ---
+    # Apenas administradores visualizam o bloco de indicadores.
+    monthly_kpis = None
+    if current_user.role == 'admin':
+        today = datetime.utcnow()
+        monthly_kpis = get_monthly_kpis(today.year, today.month)
 
     clients = Client.query.filter_by(is_archived=False).order_by(Client.name).all()
 
@@ -4,35 +4,31 @@ routes/equipment.py
 Gerenciamento completo de equipamentos, histórico de manutenção, uploads e relatórios.
 """
 
-import os
-import io
-import uuid
-import pandas as pd
+from collections import defaultdict
 from datetime import datetime, date
-from werkzeug.utils import secure_filename
 from sqlalchemy import desc
-from sqlalchemy.orm import joinedload
-from flask import (Blueprint, render_template, request, redirect, url_for, flash, abort, send_file, current_app)
+from sqlalchemy.orm import joinedload, selectinload
+from flask import (Blueprint, render_template, request, redirect, url_for, flash, abort, current_app)
 from flask_login import login_required, current_user
 
 # Importações do projeto
-from models import (Equipment, Client, User, Notification, MaintenanceHistory,
-                    StockItem, MaintenancePartUsed, MaintenanceImage)
+from models import (Equipment, Client, User, MaintenanceHistory,
+                    StockItem, MaintenanceImage)
 from extensions import db
-from .utils import admin_required, notify_admins, FUSO_HORARIO_SP
+from .utils import admin_required, notify_admins
+from services.exports import export_response, parse_export_format
+from services.report_exports import maintenance_export
+from services.notifications import notify_users
+from services.images import remove_image_files, variants_folder
+from services.uploads import UPLOAD_ERRORS, send_upload, store_upload
+from services.maintenance_parts import parse_parts, load_items, parts_cost, sync_parts
 
 # --- Configurações do Blueprint ---
 equipment_bp = Blueprint('equipment', __name__, template_folder='templates')
 
 # --- Constantes e Funções Auxiliares do Módulo ---
-ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif'}
 MAINTENANCE_CATEGORIES = ['Instalação', 'Manutenção Preventiva', 'Manutenção Corretiva', 'Manutenção Proativa']
 
-def allowed_file(filename):
-    """Verifica se a extensão do arquivo é permitida."""
-    return '.' in filename and \
-           filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
-
 # --- ROTAS DE GERENCIAMENTO DE EQUIPAMENTOS ---
 
 @equipment_bp.route('/equipments')
@@ -91,8 +87,7 @@ def new_equipment():
             notify_admins(msg, url, excluded_user_id=current_user.id)
 
             if int(assigned_user_id) != current_user.id:
-                notif_technician = Notification(user_id=int(assigned_user_id), message=f"O equipamento '{equipment.code}' foi atribuído a você.", url=url)
-                db.session.add(notif_technician)
+                notify_users([assigned_user_id], f"O equipamento '{equipment.code}' foi atribuído a você.", url)
             db.session.commit()
 
             flash('Equipamento cadastrado com sucesso!', 'success')
@@ -146,8 +141,7 @@ def edit_equipment(equipment_id):
             
             if int(assigned_user_id) != current_user.id:
                 tech_msg = f"O equipamento '{equipment.code}' foi atualizado e está sob sua responsabilidade."
-                notif_technician = Notification(user_id=int(assigned_user_id), message=tech_msg, url=url)
-                db.session.add(notif_technician)
+                notify_users([assigned_user_id], tech_msg, url)
             db.session.commit()
             
             flash('Equipamento atualizado com sucesso!', 'success')
@@ -200,7 +194,9 @@ def equipment_history(equipment_id):
         abort(404)
     if current_user.role != 'admin' and equipment.user_id != current_user.id:
         abort(403)
-    history_records = equipment.maintenance_history.order_by(desc(MaintenanceHistory.maintenance_date)).all()
+    history_records = equipment.maintenance_history.options(selectinload(MaintenanceHistory.images)).order_by(
+        desc(MaintenanceHistory.maintenance_date)
+    ).all()
     return render_template('equipment_history.html', equipment=equipment, history_records=history_records)
 
 
@@ -218,20 +214,8 @@ def new_maintenance_history(equipment_id):
             cost_str = request.form.get('cost')
             labor_cost = float(cost_str.replace(',', '.')) if cost_str else 0.0
 
-            part_ids = request.form.getlist('part_ids')
-            part_quantities = request.form.getlist('part_quantities')
-            total_parts_cost = 0.0
-            parts_to_process = []
-
-            for part_id, qty_str in zip(part_ids, part_quantities):
-                if part_id and qty_str:
-                    item = db.session.get(StockItem, int(part_id))
-                    quantity_used = int(qty_str)
-                    if not item or item.quantity < quantity_used:
-                        raise ValueError(f'Estoque insuficiente para "{item.name}".')
-                    if item.unit_cost:
-                        total_parts_cost += float(item.unit_cost) * quantity_used
-                    parts_to_process.append({'item': item, 'quantity': quantity_used})
+            parts = parse_parts(request.form)
+            total_parts_cost = parts_cost(parts, load_items(list(parts)))
 
             history_entry = MaintenanceHistory(
                 maintenance_date=maintenance_date,
@@ -244,23 +228,13 @@ def new_maintenance_history(equipment_id):
             db.session.add(history_entry)
             db.session.flush()
 
-            for part_data in parts_to_process:
-                part_data['item'].quantity -= part_data['quantity']
-                part_used_entry = MaintenancePartUsed(
-                    maintenance_history_id=history_entry.id,
-                    stock_item_id=part_data['item'].id,
-                    quantity_used=part_data['quantity']
-                )
-                db.session.add(part_used_entry)
-
-            photos = request.files.getlist('photos')
-            if len(photos) > 3: raise ValueError("Você pode enviar no máximo 3 fotos.")
-            for photo in photos:
-                if photo and allowed_file(photo.filename):
-                    ext = photo.filename.rsplit('.', 1)[1].lower()
-                    filename = secure_filename(f"{uuid.uuid4()}.{ext}")
-                    photo.save(os.path.join(current_app.config['UPLOAD_FOLDER'], filename))
-                    db.session.add(MaintenanceImage(filename=filename, maintenance_history_id=history_entry.id))
+            # Baixa atômica de todas as peças; se faltar alguma, nada é baixado
+            sync_parts(history_entry.id, parts, user_id=current_user.id, old_parts={})
+
+            # Quantidade, tamanho e formato já foram conferidos durante a leitura do corpo
+            for photo in request.files.getlist('photos'):
+                if photo:
+                    db.session.add(MaintenanceImage(filename=store_upload(photo), maintenance_history_id=history_entry.id))
 
             equipment.last_maintenance_date = maintenance_date
             url = url_for('equipment.equipment_history', equipment_id=equipment.id)
@@ -270,6 +244,9 @@ def new_maintenance_history(equipment_id):
             flash('Registro de manutenção e baixa de estoque realizados com sucesso!', 'success')
             return redirect(url_for('equipment.equipment_history', equipment_id=equipment_id))
 
+        except UPLOAD_ERRORS as e:
+            db.session.rollback()
+            flash(e.description, 'danger')
         except (ValueError, TypeError) as e:
             db.session.rollback()
             flash(f'Erro nos dados: {e}. Verifique os valores.', 'danger')
@@ -297,52 +274,34 @@ def edit_maintenance(history_id):
 
     if request.method == 'POST':
         try:
-            for part_used in history_record.parts_used:
-                part_used.item.quantity += part_used.quantity_used
-            MaintenancePartUsed.query.filter_by(maintenance_history_id=history_id).delete()
-
             maintenance_date = datetime.strptime(request.form.get('maintenance_date'), '%Y-%m-%d').date()
             labor_cost = float(request.form.get('cost', '0').replace(',', '.'))
             
-            part_ids = request.form.getlist('part_ids')
-            part_quantities = request.form.getlist('part_quantities')
-            new_parts_cost = 0.0
-            parts_to_process = []
-
-            for part_id, qty_str in zip(part_ids, part_quantities):
-                if part_id and qty_str:
-                    item = db.session.get(StockItem, int(part_id))
-                    quantity_used = int(qty_str)
-                    if not item or item.quantity < quantity_used:
-                        raise ValueError(f'Estoque insuficiente para "{item.name}".')
-                    if item.unit_cost:
-                        new_parts_cost += float(item.unit_cost) * quantity_used
-                    parts_to_process.append({'item': item, 'quantity': quantity_used})
+            parts = parse_parts(request.form)
+            new_parts_cost = parts_cost(parts, load_items(list(parts)))
 
             history_record.maintenance_date = maintenance_date
             history_record.category = request.form.get('category')
             history_record.description = request.form.get('description')
             history_record.cost = float(labor_cost) + new_parts_cost
 
-            for part_data in parts_to_process:
-                part_data['item'].quantity -= part_data['quantity']
-                new_part_used = MaintenancePartUsed(maintenance_history_id=history_id, stock_item_id=part_data['item'].id, quantity_used=part_data['quantity'])
-                db.session.add(new_part_used)
+            # Só a diferença entre as peças gravadas e as novas movimenta o estoque
+            sync_parts(history_id, parts, user_id=current_user.id)
             
-            photos = request.files.getlist('photos')
-            if len(photos) + len(history_record.images) > 3:
-                raise ValueError("O total de fotos não pode exceder 3.")
+            photos = [photo for photo in request.files.getlist('photos') if photo]
+            max_files = current_app.config['UPLOAD_MAX_FILES']
+            if len(photos) + len(history_record.images) > max_files:
+                raise ValueError(f"O total de fotos não pode exceder {max_files}.")
             for photo in photos:
-                if photo and allowed_file(photo.filename):
-                    ext = photo.filename.rsplit('.', 1)[1].lower()
-                    filename = secure_filename(f"{uuid.uuid4()}.{ext}")
-                    photo.save(os.path.join(current_app.config['UPLOAD_FOLDER'], filename))
-                    db.session.add(MaintenanceImage(filename=filename, maintenance_history_id=history_record.id))
+                db.session.add(MaintenanceImage(filename=store_upload(photo), maintenance_history_id=history_record.id))
 
             db.session.commit()
             flash('Registro de manutenção atualizado com sucesso!', 'success')
             return redirect(url_for('equipment.equipment_history', equipment_id=history_record.equipment_id))
 
+        except UPLOAD_ERRORS as e:
+            db.session.rollback()
+            flash(e.description, 'danger')
         except (ValueError, TypeError) as e:
             db.session.rollback()
             flash(f'Erro nos dados: {e}.', 'danger')
@@ -371,21 +330,19 @@ def delete_maintenance(history_id):
     
     equipment_id = history_record.equipment_id
     try:
-        for part_used in history_record.parts_used:
-            part_used.item.quantity += part_used.quantity_used
-        
-        for image in history_record.images:
-            try:
-                os.remove(os.path.join(current_app.config['UPLOAD_FOLDER'], image.filename))
-            except OSError:
-                pass # Ignora se o arquivo não existir
-        
+        sync_parts(history_id, {}, user_id=current_user.id)
+
+        filenames = {image.filename for image in history_record.images}
         db.session.delete(history_record)
         db.session.commit()
         flash('Registro de manutenção deletado e estoque restaurado.', 'success')
     except Exception as e:
         db.session.rollback()
         flash(f'Erro ao deletar registro: {e}', 'danger')
+    else:
+        # Só depois do commit; arquivos compartilhados com outras fotos (uploads repetidos) são mantidos
+        for filename in filenames:
+            remove_image_files(filename)
         
     return redirect(url_for('equipment.equipment_history', equipment_id=equipment_id))
 
@@ -402,27 +359,34 @@ def delete_maintenance_photo(image_id):
     if current_user.role != 'admin' and history_record.technician_id != current_user.id:
         abort(403)
         
+    filename = image.filename
     try:
-        os.remove(os.path.join(current_app.config['UPLOAD_FOLDER'], image.filename))
         db.session.delete(image)
         db.session.commit()
         flash('Foto removida com sucesso.', 'success')
-    except OSError:
-        flash('Erro ao remover o arquivo da foto, mas o registro foi limpo.', 'warning')
     except Exception as e:
         db.session.rollback()
         flash(f'Erro ao remover foto: {e}', 'danger')
+    else:
+        remove_image_files(filename)
         
     return redirect(url_for('equipment.edit_maintenance', history_id=history_record.id))
 
 
 # --- ROTA PARA SERVIR IMAGENS ---
 
-@equipment_bp.route('/uploads/<filename>')
+@equipment_bp.route('/uploads/<path:filename>')
 @login_required
 def uploaded_file(filename):
-    """Serve os arquivos de imagem que foram enviados."""
-    return send_file(os.path.join(current_app.config['UPLOAD_FOLDER'], filename))
+    """Serve os arquivos de imagem que foram enviados (cache imutável, ETag e Range)."""
+    return send_upload(current_app.config['UPLOAD_FOLDER'], filename)
+
+
+@equipment_bp.route('/uploads/variants/<path:filename>')
+@login_required
+def uploaded_variant(filename):
+    """Serve as miniaturas e versões reduzidas geradas por 'flask process-images'."""
+    return send_upload(variants_folder(), filename)
 
 
 # --- RELATÓRIO GERAL E EXPORTAÇÃO ---
@@ -432,13 +396,30 @@ def uploaded_file(filename):
 @admin_required
 def full_history():
     """Exibe o relatório completo de histórico de todas as manutenções."""
+    page = request.args.get('page', 1, type=int)
+    per_page = 20
+
+    # Pagina apenas os equipamentos que possuem ao menos um registro
     equipments = Equipment.query.options(
         joinedload(Equipment.client)
-    ).order_by(Equipment.code).all()
-    for eq in equipments:
-        eq.loaded_history = eq.maintenance_history.options(
-            joinedload(MaintenanceHistory.technician)
-        ).order_by(desc(MaintenanceHistory.maintenance_date)).all()
+    ).filter(Equipment.maintenance_history.any()).order_by(Equipment.code).paginate(
+        page=page, per_page=per_page, error_out=False
+    )
+
+    # Todos os registros da página em uma única consulta, agrupados em memória
+    history_by_equipment = defaultdict(list)
+    equipment_ids = [eq.id for eq in equipments.items]
+    if equipment_ids:
+        records = MaintenanceHistory.query.options(
+            joinedload(MaintenanceHistory.technician), selectinload(MaintenanceHistory.images)
+        ).filter(MaintenanceHistory.equipment_id.in_(equipment_ids)).order_by(
+            desc(MaintenanceHistory.maintenance_date), desc(MaintenanceHistory.id)
+        ).all()
+        for record in records:
+            history_by_equipment[record.equipment_id].append(record)
+    for eq in equipments.items:
+        eq.loaded_history = history_by_equipment[eq.id]
+
     return render_template('full_history.html', equipments=equipments)
 
 
@@ -446,38 +427,11 @@ def full_history():
 @login_required
 @admin_required
 def export_maintenance():
-    """Gera um arquivo Excel com o relatório completo de manutenções."""
+    """Gera o relatório completo de manutenções (XLSX, CSV ou Parquet via ?format=)."""
     try:
-        equipments = Equipment.query.options(joinedload(Equipment.client)).order_by(Equipment.code).all()
-        data_for_df = []
-        for eq in equipments:
-            history_records = eq.maintenance_history.options(joinedload(MaintenanceHistory.technician)).all()
-            for history in history_records:
-                data_for_df.append({
-                    'Data': history.maintenance_date.strftime('%d/%m/%Y'),
-                    'Equipamento (Código)': eq.code,
-                    'Equipamento (Modelo)': eq.model,
-                    'Cliente': eq.client.name,
-                    'Local': eq.location,
-                    'Categoria': history.category,
-                    'Técnico': history.technician.username,
-                    'Custo (R$)': float(history.cost) if history.cost else 0.0,
-                    'Descrição': history.description
-                })
-
-        df = pd.DataFrame(data_for_df)
-        output = io.BytesIO()
-        with pd.ExcelWriter(output, engine='openpyxl') as writer:
-            df.to_excel(writer, index=False, sheet_name='Manutencoes')
-        output.seek(0)
-
-        timestamp = datetime.now(FUSO_HORARIO_SP).strftime("%Y-%m-%d")
-        return send_file(
-            output,
-            as_attachment=True,
-            download_name=f'relatorio_manutencoes_{timestamp}.xlsx',
-            mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-        )
+        fmt = parse_export_format(request.args.get('format'))
+        sheets, basename = maintenance_export(request.args)
+        return export_response(sheets, basename, fmt)
     except Exception as e:
-        flash(f"Erro ao gerar o relatório Excel: {e}", "danger")
+        flash(f"Erro ao gerar o relatório: {e}", "danger")
         return redirect(url_for('equipment.full_history'))
\ No newline at end of file
@@ -12,6 +12,7 @@ from sqlalchemy import func
 # Importações do projeto
 from models import Expense
 from extensions import db
+from services.periods import week_period
 
 # --- Configurações do Blueprint ---
 expenses_bp = Blueprint('expenses', __name__, template_folder='templates')
@@ -68,15 +69,12 @@ def manage_expenses():
     previous_day = selected_date - timedelta(days=1)
     next_day = selected_date + timedelta(days=1)
 
-    start_of_week = selected_date - timedelta(days=(selected_date.weekday() + 1) % 7)
-    end_of_week = start_of_week + timedelta(days=6)
+    week = week_period(selected_date)
 
     daily_expenses = Expense.query.filter_by(user_id=current_user.id, date=selected_date).order_by(Expense.id.desc()).all()
 
-    weekly_total_query = db.session.query(func.sum(Expense.value)).filter(
-        Expense.user_id == current_user.id,
-        Expense.date >= start_of_week,
-        Expense.date <= end_of_week
+    weekly_total_query = week.apply(
+        db.session.query(func.sum(Expense.value)).filter(Expense.user_id == current_user.id), Expense.date
     ).scalar()
     weekly_total = weekly_total_query or 0.0
 
@@ -85,8 +83,8 @@ def manage_expenses():
                            categories=EXPENSE_CATEGORIES,
                            selected_date=selected_date,
                            weekly_total=weekly_total,
-                           start_of_week=start_of_week,
-                           end_of_week=end_of_week,
+                           start_of_week=week.start,
+                           end_of_week=week.last_day,
                            previous_day=previous_day,
                            next_day=next_day)
 
@@ -0,0 +1,88 @@
+"""
+routes/exports.py
+
+Exportações de relatórios em segundo plano: enfileiramento, acompanhamento
+(página e endpoint JSON para polling) e download do arquivo gerado.
+O processamento é feito pelo comando 'flask process-exports'.
+"""
+import os
+from flask import (Blueprint, render_template, request, redirect, url_for, flash, jsonify, send_file)
+from flask_login import login_required, current_user
+from sqlalchemy import desc
+
+# Importações do projeto
+from models import ExportJob
+from .utils import admin_required
+from services.export_jobs import JOB_DONE, enqueue_export, job_file_path
+from services.report_exports import REPORT_EXPORTS
+
+# --- Configurações do Blueprint ---
+exports_bp = Blueprint('exports', __name__, template_folder='templates')
+
+# --- Constantes do Módulo ---
+RECENT_JOBS_LIMIT = 30
+
+
+def _get_own_job(job_id):
+    return ExportJob.query.filter_by(id=job_id, user_id=current_user.id).first_or_404()
+
+
+def _job_payload(job):
+    return {
+        'id': job.id,
+        'status': job.status,
+        'rows_exported': job.rows_exported,
+        'error': job.error,
+        'download_url': url_for('exports.download_export_job', job_id=job.id) if job.status == JOB_DONE else None,
+    }
+
+
+@exports_bp.route('/export/jobs/<kind>', methods=['POST'])
+@login_required
+@admin_required
+def enqueue_export_job(kind):
+    """Enfileira a exportação com os filtros da URL (os mesmos do download direto)."""
+    params = request.args.to_dict()
+    fmt = params.pop('format', None)
+    try:
+        enqueue_export(kind, params, fmt, current_user.id)
+    except ValueError as e:
+        flash(str(e), 'danger')
+        return redirect(request.referrer or url_for('exports.export_jobs'))
+
+    flash('Exportação adicionada à fila. O arquivo ficará disponível nesta página.', 'success')
+    return redirect(url_for('exports.export_jobs'))
+
+
+@exports_bp.route('/export/jobs')
+@login_required
+@admin_required
+def export_jobs():
+    """Lista as exportações em segundo plano do usuário."""
+    jobs = ExportJob.query.filter_by(user_id=current_user.id).order_by(
+        desc(ExportJob.created_at), desc(ExportJob.id)
+    ).limit(RECENT_JOBS_LIMIT).all()
+    return render_template('export_jobs.html', jobs=jobs, report_exports=REPORT_EXPORTS)
+
+
+@exports_bp.route('/export/jobs/<int:job_id>/status')
+@login_required
+@admin_required
+def export_job_status(job_id):
+    """Status da exportação em JSON, consultado periodicamente pela página."""
+    return jsonify(_job_payload(_get_own_job(job_id)))
+
+
+@exports_bp.route('/export/jobs/<int:job_id>/download')
+@login_required
+@admin_required
+def download_export_job(job_id):
+    """Envia o arquivo de uma exportação concluída."""
+    job = _get_own_job(job_id)
+    path = job_file_path(job)
+    if job.status != JOB_DONE or not path or not os.path.exists(path):
+        flash('O arquivo desta exportação não está disponível.', 'warning')
+        return redirect(url_for('exports.export_jobs'))
+    # Jobs antigos gravaram o charset no mimetype; o Werkzeug o acrescenta de novo
+    mimetype = job.mimetype.split(';')[0].strip() if job.mimetype else None
+    return send_file(path, mimetype=mimetype, as_attachment=True, download_name=job.download_name)
@@ -10,11 +10,14 @@ from urllib.parse import quote
 
 from flask import (Blueprint, render_template, request, redirect, url_for, flash)
 from flask_login import login_required, current_user
+from sqlalchemy.orm import joinedload
 
 # Importações do projeto
 from models import Notification, Setting, Equipment
 from extensions import db
 from .utils import admin_required
+from services.status import status_condition
+from services.notifications import mark_read
 
 # --- Configurações do Blueprint ---
 notifications_bp = Blueprint('notifications', __name__, template_folder='templates')
@@ -28,7 +31,7 @@ def read_notification(notification_id):
     
     # Garante que o usuário só pode ler as próprias notificações
     if notification and notification.user_id == current_user.id:
-        notification.is_read = True
+        mark_read(notification)
         db.session.commit()
 
     # Se a notificação tiver uma URL, redireciona para ela. Senão, para o painel principal.
@@ -49,10 +52,10 @@ def whatsapp_notifications():
         )
         message_template = template_setting.value if template_setting else default_template
         
-        all_active_equipments = Equipment.query.filter_by(is_archived=False).all()
-        
-        # Filtra na aplicação os equipamentos que estão próximos do vencimento
-        due_equipments = [eq for eq in all_active_equipments if eq.status == 'Próximo do vencimento']
+        # Filtra no banco os equipamentos que estão próximos do vencimento
+        due_equipments = Equipment.query.options(joinedload(Equipment.client)).filter_by(
+            is_archived=False
+        ).filter(status_condition('proximo')).order_by(Equipment.next_maintenance_date).all()
         
         notifications_list = []
 
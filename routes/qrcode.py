@@ -8,10 +8,17 @@ import qrcode
 
 from flask import (Blueprint, render_template, url_for, abort, send_file)
 from flask_login import login_required
+from sqlalchemy.orm import selectinload
 
 # Importações do projeto
-from models import Equipment
+from models import Equipment, MaintenanceHistory, MaintenanceImage
+from extensions import db
 from .utils import admin_required
+from services.images import IMAGE_READY, IMAGE_VARIANTS, VARIANT_FORMATS, variant_filename, variants_folder
+from services.uploads import send_upload
+
+# --- Constantes do Módulo ---
+PUBLIC_PHOTO_MAX_AGE = 24 * 3600  # curto: arquivar o equipamento deve tirar as fotos do ar
 
 # --- Configurações do Blueprint ---
 qrcode_bp = Blueprint('qrcode', __name__, template_folder='templates')
@@ -30,10 +37,30 @@ def public_summary(code):
         return render_template('public_summary_not_found.html'), 404
 
     # Carrega o histórico de manutenção para exibição
-    history_records = equipment.maintenance_history.all()
+    history_records = equipment.maintenance_history.options(selectinload(MaintenanceHistory.images)).all()
     return render_template('public_summary.html', equipment=equipment, history_records=history_records)
 
 
+@qrcode_bp.route('/public/equipment/<code>/photos/<int:image_id>/<variant>.<fmt>')
+def public_photo(code, image_id, variant, fmt):
+    """
+    Foto de uma manutenção na página pública. Só serve as variantes já
+    processadas (sem metadados EXIF) de equipamentos ativos; o original nunca.
+    """
+    if variant not in IMAGE_VARIANTS or fmt not in VARIANT_FORMATS:
+        abort(404)
+    image = db.session.execute(
+        db.select(MaintenanceImage).join(MaintenanceHistory).join(Equipment).where(
+            MaintenanceImage.id == image_id, MaintenanceImage.status == IMAGE_READY,
+            Equipment.code == code, Equipment.is_archived.is_(False)
+        )
+    ).scalar()
+    if not image:
+        abort(404)
+    return send_upload(variants_folder(), variant_filename(image.filename, variant, fmt),
+                       max_age=PUBLIC_PHOTO_MAX_AGE, public=True)
+
+
 @qrcode_bp.route('/equipment/<code>/qrcode')
 @login_required
 @admin_required
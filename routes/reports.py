@@ -4,19 +4,23 @@ routes/reports.py
 Módulo central para todos os relatórios e exportações de dados do sistema.
 Acessível apenas por administradores.
 """
-import io
-import pandas as pd
 from datetime import datetime
-from flask import (Blueprint, render_template, request, url_for, flash, send_file, redirect)
+from flask import (Blueprint, render_template, request, url_for, flash, redirect)
 from flask_login import login_required
-from sqlalchemy import desc, extract
+from sqlalchemy import desc, func, select
 from sqlalchemy.orm import joinedload
 
 # Importações do projeto
 from models import (Client, Equipment, MaintenanceHistory, User, Expense, TimeClock,
                     StockItem, MaintenancePartUsed)
 from extensions import db
-from .utils import admin_required, FUSO_HORARIO_SP, format_datetime_local
+from .utils import admin_required
+from services.exports import export_response, parse_export_format
+from services.report_exports import (financial_export, expenses_export, time_clock_export,
+                                     stock_movement_export, stock_movements_stmt, STOCK_MOVEMENT_COLUMNS)
+from services.periods import parse_month, period_from_args
+from services.rollups import monthly_costs
+from services.worked_hours import worked_seconds, worked_seconds_expr
 
 # --- Configurações do Blueprint ---
 reports_bp = Blueprint('reports', __name__, template_folder='templates')
@@ -24,6 +28,8 @@ reports_bp = Blueprint('reports', __name__, template_folder='templates')
 # --- Constantes do Módulo ---
 STOCK_CATEGORIES = sorted(['Peças de Reposição', 'Ferramentas', 'Consumíveis', 'EPIs', 'Material de Limpeza', 'Geral'])
 EXPENSE_CATEGORIES = ['Alimentação', 'Gasolina', 'Pedágio', 'Lanche', 'Gastos Diversos']
+FINANCIAL_PAGE_SIZE = 25
+STOCK_MOVEMENT_PAGE_SIZE = 50
 
 
 # --- RELATÓRIOS FINANCEIROS ---
@@ -32,60 +38,50 @@ EXPENSE_CATEGORIES = ['Alimentação', 'Gasolina', 'Pedágio', 'Lanche', 'Gastos
 @login_required
 @admin_required
 def financial_report():
-    """Página do relatório financeiro de manutenções."""
+    """
+    Página do relatório financeiro de manutenções. Totais e custos por mês vêm
+    dos agregados mensais; a lista detalhada é paginada.
+    """
     clients = Client.query.filter_by(is_archived=False).order_by(Client.name).all()
     equipments = Equipment.query.filter_by(is_archived=False).order_by(Equipment.code).all()
     client_id = request.args.get('client_id', type=int)
     equipment_id = request.args.get('equipment_id', type=int)
-    start_date_str = request.args.get('start_date')
-    end_date_str = request.args.get('end_date')
+    period = period_from_args(request.args)
+    page = request.args.get('page', 1, type=int)
 
-    query = db.session.query(MaintenanceHistory).join(Equipment)
+    monthly = monthly_costs(client_id, equipment_id, period)
+    total_cost = sum(m['total_cost'] for m in monthly)
+    total_count = sum(m['maintenance_count'] for m in monthly)
+    max_month_cost = max((m['total_cost'] for m in monthly), default=0)
+
+    query = MaintenanceHistory.query.join(Equipment).options(
+        joinedload(MaintenanceHistory.equipment).joinedload(Equipment.client)
+    )
     if client_id: query = query.filter(Equipment.client_id == client_id)
     if equipment_id: query = query.filter(MaintenanceHistory.equipment_id == equipment_id)
-    if start_date_str: query = query.filter(MaintenanceHistory.maintenance_date >= datetime.strptime(start_date_str, '%Y-%m-%d').date())
-    if end_date_str: query = query.filter(MaintenanceHistory.maintenance_date <= datetime.strptime(end_date_str, '%Y-%m-%d').date())
+    query = period.apply(query, MaintenanceHistory.maintenance_date)
 
-    records = query.order_by(desc(MaintenanceHistory.maintenance_date)).all()
-    total_cost = sum(r.cost for r in records if r.cost is not None)
+    # O total já é conhecido pelos agregados: dispensa o COUNT da paginação
+    records = query.order_by(desc(MaintenanceHistory.maintenance_date), desc(MaintenanceHistory.id)).paginate(
+        page=page, per_page=FINANCIAL_PAGE_SIZE, error_out=False, count=False
+    )
+    records.total = total_count
 
     return render_template('financial_report.html', clients=clients, equipments=equipments,
-                           records=records, total_cost=total_cost, filters=request.args)
+                           records=records, total_cost=total_cost, total_count=total_count,
+                           monthly=monthly, max_month_cost=max_month_cost, filters=request.args)
 
 @reports_bp.route('/export/financial')
 @login_required
 @admin_required
 def export_financial():
-    """Gera um arquivo Excel com o relatório financeiro filtrado."""
+    """Gera o relatório financeiro filtrado (XLSX, CSV ou Parquet via ?format=)."""
     try:
-        client_id = request.args.get('client_id', type=int)
-        equipment_id = request.args.get('equipment_id', type=int)
-        start_date_str = request.args.get('start_date')
-        end_date_str = request.args.get('end_date')
-
-        query = db.session.query(MaintenanceHistory).join(Equipment).options(
-            joinedload(MaintenanceHistory.equipment).joinedload(Equipment.client))
-        if client_id: query = query.filter(Equipment.client_id == client_id)
-        if equipment_id: query = query.filter(MaintenanceHistory.equipment_id == equipment_id)
-        if start_date_str: query = query.filter(MaintenanceHistory.maintenance_date >= datetime.strptime(start_date_str, '%Y-%m-%d').date())
-        if end_date_str: query = query.filter(MaintenanceHistory.maintenance_date <= datetime.strptime(end_date_str, '%Y-%m-%d').date())
-
-        records = query.order_by(desc(MaintenanceHistory.maintenance_date)).all()
-        data_for_df = [{'Data': r.maintenance_date.strftime('%d/%m/%Y'), 'Equipamento (Código)': r.equipment.code,
-                        'Equipamento (Modelo)': r.equipment.model, 'Cliente': r.equipment.client.name,
-                        'Custo (R$)': float(r.cost) if r.cost else 0.0} for r in records]
-
-        df = pd.DataFrame(data_for_df)
-        output = io.BytesIO()
-        with pd.ExcelWriter(output, engine='openpyxl') as writer:
-            df.to_excel(writer, index=False, sheet_name='Financeiro')
-        output.seek(0)
-
-        timestamp = datetime.now(FUSO_HORARIO_SP).strftime("%Y-%m-%d")
-        return send_file(output, as_attachment=True, download_name=f'relatorio_financeiro_{timestamp}.xlsx',
-                         mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
+        fmt = parse_export_format(request.args.get('format'))
+        sheets, basename = financial_export(request.args)
+        return export_response(sheets, basename, fmt)
     except Exception as e:
-        flash(f"Erro ao gerar o relatório Excel: {e}", "danger")
+        flash(f"Erro ao gerar o relatório: {e}", "danger")
         return redirect(url_for('reports.financial_report'))
 
 
@@ -100,14 +96,12 @@ def expense_report():
 
     tech_id = request.args.get('technician_id', type=int)
     category = request.args.get('category')
-    start_date_str = request.args.get('start_date')
-    end_date_str = request.args.get('end_date')
+    period = period_from_args(request.args)
 
     query = Expense.query
     if tech_id: query = query.filter(Expense.user_id == tech_id)
     if category: query = query.filter(Expense.category == category)
-    if start_date_str: query = query.filter(Expense.date >= datetime.strptime(start_date_str, '%Y-%m-%d').date())
-    if end_date_str: query = query.filter(Expense.date <= datetime.strptime(end_date_str, '%Y-%m-%d').date())
+    query = period.apply(query, Expense.date)
 
     records = query.order_by(desc(Expense.date), Expense.user_id).all()
     total_value = sum(r.value for r in records if r.value is not None)
@@ -119,36 +113,13 @@ def expense_report():
 @login_required
 @admin_required
 def export_expenses():
-    """Gera um arquivo Excel com o relatório de despesas filtrado."""
+    """Gera o relatório de despesas filtrado (XLSX, CSV ou Parquet via ?format=)."""
     try:
-        tech_id = request.args.get('technician_id', type=int)
-        category = request.args.get('category')
-        start_date_str = request.args.get('start_date')
-        end_date_str = request.args.get('end_date')
-
-        query = Expense.query.options(joinedload(Expense.technician))
-        if tech_id: query = query.filter(Expense.user_id == tech_id)
-        if category: query = query.filter(Expense.category == category)
-        if start_date_str: query = query.filter(Expense.date >= datetime.strptime(start_date_str, '%Y-%m-%d').date())
-        if end_date_str: query = query.filter(Expense.date <= datetime.strptime(end_date_str, '%Y-%m-%d').date())
-
-        records = query.order_by(desc(Expense.date), Expense.user_id).all()
-
-        data_for_df = [{'Data': r.date.strftime('%d/%m/%Y'), 'Técnico': r.technician.username,
-                        'Categoria': r.category, 'Descrição': r.description,
-                        'Valor (R$)': float(r.value)} for r in records]
-
-        df = pd.DataFrame(data_for_df)
-        output = io.BytesIO()
-        with pd.ExcelWriter(output, engine='openpyxl') as writer:
-            df.to_excel(writer, index=False, sheet_name='Despesas')
-        output.seek(0)
-
-        timestamp = datetime.now(FUSO_HORARIO_SP).strftime("%Y-%m-%d")
-        return send_file(output, as_attachment=True, download_name=f'relatorio_despesas_{timestamp}.xlsx',
-                         mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
+        fmt = parse_export_format(request.args.get('format'))
+        sheets, basename = expenses_export(request.args)
+        return export_response(sheets, basename, fmt)
     except Exception as e:
-        flash(f"Erro ao gerar o relatório Excel: {e}", "danger")
+        flash(f"Erro ao gerar o relatório: {e}", "danger")
         return redirect(url_for('reports.expense_report'))
 
 
@@ -164,68 +135,41 @@ def time_clock_report():
     month_str = request.args.get('month', datetime.now().strftime('%Y-%m'))
 
     try:
-        year, month = map(int, month_str.split('-'))
+        period = parse_month(month_str)
     except ValueError:
-        year, month = datetime.now().year, datetime.now().month
-        month_str = f"{year}-{month:02d}"
+        month_str = datetime.now().strftime('%Y-%m')
+        period = parse_month(month_str)
 
-    query = TimeClock.query
+    # Horas de cada registro calculadas no banco, junto com a listagem
+    query = db.session.query(TimeClock, worked_seconds_expr()).options(joinedload(TimeClock.technician))
     if tech_id:
         query = query.filter(TimeClock.user_id == tech_id)
-
-    query = query.filter(extract('year', TimeClock.date) == year, extract('month', TimeClock.date) == month)
-    
+    query = period.apply(query, TimeClock.date)
     records = query.order_by(desc(TimeClock.date), TimeClock.user_id).all()
 
-    # Início da correção
-    total_seconds = 0
-    for record in records:
-        if record.morning_check_in and record.morning_check_out:
-            total_seconds += (record.morning_check_out - record.morning_check_in).total_seconds()
-        if record.afternoon_check_in and record.afternoon_check_out:
-            total_seconds += (record.afternoon_check_out - record.afternoon_check_in).total_seconds()
-    # Fim da correção
-    
-    total_hours = f"{(total_seconds / 3600):.2f}".replace('.', ',')
+    # Totais por técnico em uma consulta agrupada
+    technician_names = {t.id: t.username for t in technicians}
+    totals_by_technician = [
+        (technician_names.get(user_id, f'#{user_id}'), seconds)
+        for user_id, seconds in worked_seconds(period, user_id=tech_id)
+    ]
+    total_seconds = sum(seconds for _, seconds in totals_by_technician)
 
     return render_template('time_clock_report.html', technicians=technicians, records=records,
-                           total_hours=total_hours, filters=request.args, month_filter=month_str)
+                           total_seconds=total_seconds, totals_by_technician=totals_by_technician,
+                           filters=request.args, month_filter=month_str)
 
 @reports_bp.route('/export/time-clock')
 @login_required
 @admin_required
 def export_time_clock():
-    """Gera um arquivo Excel com o relatório de ponto filtrado."""
+    """Gera o relatório de ponto filtrado (XLSX, CSV ou Parquet via ?format=)."""
     try:
-        tech_id = request.args.get('technician_id', type=int)
-        month_str = request.args.get('month', datetime.now().strftime('%Y-%m'))
-        year, month = map(int, month_str.split('-'))
-
-        query = TimeClock.query.options(joinedload(TimeClock.technician))
-        if tech_id: query = query.filter(TimeClock.user_id == tech_id)
-        query = query.filter(extract('year', TimeClock.date) == year, extract('month', TimeClock.date) == month)
-        records = query.order_by(desc(TimeClock.date), TimeClock.user_id).all()
-
-        data_for_df = [{
-            'Data': r.date.strftime('%d/%m/%Y'), 'Técnico': r.technician.username,
-            'Entrada Manhã': format_datetime_local(r.morning_check_in, '%H:%M') if r.morning_check_in else '-',
-            'Saída Manhã': format_datetime_local(r.morning_check_out, '%H:%M') if r.morning_check_out else '-',
-            'Entrada Tarde': format_datetime_local(r.afternoon_check_in, '%H:%M') if r.afternoon_check_in else '-',
-            'Saída Tarde': format_datetime_local(r.afternoon_check_out, '%H:%M') if r.afternoon_check_out else '-',
-            'Total Horas': r.total_hours
-        } for r in records]
-
-        df = pd.DataFrame(data_for_df)
-        output = io.BytesIO()
-        with pd.ExcelWriter(output, engine='openpyxl') as writer:
-            df.to_excel(writer, index=False, sheet_name=f'Ponto_{month_str}')
-        output.seek(0)
-
-        timestamp = datetime.now(FUSO_HORARIO_SP).strftime("%Y-%m-%d")
-        return send_file(output, as_attachment=True, download_name=f'relatorio_ponto_{month_str}_{timestamp}.xlsx',
-                         mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
+        fmt = parse_export_format(request.args.get('format'))
+        sheets, basename = time_clock_export(request.args)
+        return export_response(sheets, basename, fmt)
     except Exception as e:
-        flash(f"Erro ao gerar o relatório Excel: {e}", "danger")
+        flash(f"Erro ao gerar o relatório: {e}", "danger")
         return redirect(url_for('reports.time_clock_report'))
 
 
@@ -238,48 +182,31 @@ def stock_movement_report():
     """Relatório de movimentação de estoque."""
     item_id = request.args.get('item_id', type=int)
     category_filter = request.args.get('category')
-    start_date_str = request.args.get('start_date')
-    end_date_str = request.args.get('end_date')
+    period = period_from_args(request.args)
+    page = request.args.get('page', 1, type=int)
 
     items_query = StockItem.query
     if category_filter:
         items_query = items_query.filter(StockItem.category == category_filter)
     items = items_query.order_by(StockItem.name).all()
 
-    outgoing_query = db.session.query(
-        MaintenancePartUsed, MaintenanceHistory, Equipment, Client
-    ).select_from(MaintenancePartUsed).join(
-        MaintenanceHistory, MaintenancePartUsed.maintenance_history_id == MaintenanceHistory.id
-    ).join(
-        Equipment, MaintenanceHistory.equipment_id == Equipment.id
-    ).join(
-        Client, Equipment.client_id == Client.id
-    ).join(
-        StockItem, MaintenancePartUsed.stock_item_id == StockItem.id
-    )
+    # Totais do filtro inteiro em uma consulta; a lista de saídas é paginada
+    total_movements, total_withdrawals = db.session.execute(stock_movements_stmt(
+        select(func.count(MaintenancePartUsed.id), func.coalesce(func.sum(MaintenancePartUsed.quantity_used), 0)),
+        item_id, category_filter, period
+    )).one()
 
-    if item_id: outgoing_query = outgoing_query.filter(MaintenancePartUsed.stock_item_id == item_id)
-    if category_filter: outgoing_query = outgoing_query.filter(StockItem.category == category_filter)
-    if start_date_str: outgoing_query = outgoing_query.filter(MaintenanceHistory.maintenance_date >= datetime.strptime(start_date_str, '%Y-%m-%d').date())
-    if end_date_str: outgoing_query = outgoing_query.filter(MaintenanceHistory.maintenance_date <= datetime.strptime(end_date_str, '%Y-%m-%d').date())
-
-    all_movements = outgoing_query.order_by(desc(MaintenanceHistory.maintenance_date)).all()
-
-    outgoing_movements_data = []
-    for mov in all_movements:
-        outgoing_movements_data.append({
-            'maintenance_date': mov.MaintenanceHistory.maintenance_date,
-            'item_name': mov.MaintenancePartUsed.item.name, # Acesso direto ao nome do item
-            'quantity_used': mov.MaintenancePartUsed.quantity_used,
-            'equipment_code': mov.Equipment.code,
-            'client_name': mov.Client.name
-        })
-
-    total_withdrawals = sum(mov['quantity_used'] for mov in outgoing_movements_data)
+    movements = stock_movements_stmt(
+        db.session.query(*STOCK_MOVEMENT_COLUMNS), item_id, category_filter, period
+    ).order_by(desc(MaintenanceHistory.maintenance_date), desc(MaintenancePartUsed.id)).paginate(
+        page=page, per_page=STOCK_MOVEMENT_PAGE_SIZE, error_out=False, count=False
+    )
+    movements.total = total_movements
 
     return render_template('stock_movement_report.html',
                          items=items,
-                         outgoing_movements=outgoing_movements_data,
+                         movements=movements,
+                         total_movements=total_movements,
                          total_withdrawals=total_withdrawals,
                          categories=STOCK_CATEGORIES,
                          filters=request.args)
@@ -288,67 +215,11 @@ def stock_movement_report():
 @login_required
 @admin_required
 def export_stock_movement():
-    """Gera um arquivo Excel com a movimentação e o status atual do estoque."""
+    """Gera a movimentação e o status atual do estoque (XLSX, CSV ou Parquet via ?format=)."""
     try:
-        item_id = request.args.get('item_id', type=int)
-        category_filter = request.args.get('category')
-        start_date_str = request.args.get('start_date')
-        end_date_str = request.args.get('end_date')
-
-        # --- ABA DE MOVIMENTAÇÕES ---
-        outgoing_query = db.session.query(
-            MaintenancePartUsed
-        ).join(MaintenanceHistory).join(StockItem)
-        
-        if item_id: outgoing_query = outgoing_query.filter(MaintenancePartUsed.stock_item_id == item_id)
-        if category_filter: outgoing_query = outgoing_query.filter(StockItem.category == category_filter)
-        if start_date_str: outgoing_query = outgoing_query.filter(MaintenanceHistory.maintenance_date >= datetime.strptime(start_date_str, '%Y-%m-%d').date())
-        if end_date_str: outgoing_query = outgoing_query.filter(MaintenanceHistory.maintenance_date <= datetime.strptime(end_date_str, '%Y-%m-%d').date())
-        
-        movements = outgoing_query.order_by(desc(MaintenanceHistory.maintenance_date)).all()
-
-        movements_data = [{
-            'Data': mov.maintenance_record.maintenance_date.strftime('%d/%m/%Y'),
-            'Item': mov.item.name,
-            'Categoria': mov.item.category,
-            'Quantidade Retirada': mov.quantity_used,
-            'Equipamento': mov.maintenance_record.equipment.code,
-            'Cliente': mov.maintenance_record.equipment.client.name
-        } for mov in movements]
-        df_movements = pd.DataFrame(movements_data)
-
-        # --- ABA DE ESTOQUE ATUAL ---
-        stock_query = StockItem.query
-        if category_filter: stock_query = stock_query.filter(StockItem.category == category_filter)
-        all_items = stock_query.order_by(StockItem.name).all()
-        
-        stock_status_data = []
-        for item in all_items:
-            status = 'Normal'
-            if item.quantity <= item.low_stock_threshold:
-                status = 'Crítico'
-            elif item.quantity <= item.low_stock_threshold * 2:
-                status = 'Atenção'
-            
-            stock_status_data.append({
-                'Item': item.name, 'Categoria': item.category, 'SKU': item.sku,
-                'Estoque Atual': item.quantity, 'Nível de Alerta': item.low_stock_threshold,
-                'Custo Unitário (R$)': float(item.unit_cost) if item.unit_cost else 0.0,
-                'Status': status
-            })
-        df_stock_status = pd.DataFrame(stock_status_data)
-
-        # --- GERAR O ARQUIVO EXCEL ---
-        output = io.BytesIO()
-        with pd.ExcelWriter(output, engine='openpyxl') as writer:
-            df_stock_status.to_excel(writer, index=False, sheet_name='Estoque Atual')
-            df_movements.to_excel(writer, index=False, sheet_name='Movimentações')
-        output.seek(0)
-
-        timestamp = datetime.now(FUSO_HORARIO_SP).strftime("%Y-%m-%d")
-        return send_file(output, as_attachment=True,
-                         download_name=f'relatorio_estoque_{timestamp}.xlsx',
-                         mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
+        fmt = parse_export_format(request.args.get('format'))
+        sheets, basename = stock_movement_export(request.args)
+        return export_response(sheets, basename, fmt)
     except Exception as e:
-        flash(f"Erro ao gerar o relatório Excel: {e}", "danger")
-        return redirect(url_for('reports.stock_movement_report'))
\ No newline at end of file
+        flash(f"Erro ao gerar o relatório: {e}", "danger")
+        return redirect(url_for('reports.stock_movement_report'))
@@ -3,9 +3,12 @@ routes/schedule.py
 
 Módulo para gerenciar a agenda/calendário de eventos, como manutenções e reservas.
 """
-from flask import Blueprint, render_template, jsonify, request
+from flask import Blueprint, render_template, jsonify, request, current_app
 from models import Appointment, User, Client, db, SchedulingLink
-from datetime import datetime, timezone
+from services.schedule import (PUBLIC_BUSY_MAX_AGE, SchedulingConflict, appointments_in_window, event_color,
+                              parse_datetime, parse_window, public_busy_slots, reserve_technician, window_etag)
+from datetime import datetime
+from .utils import FUSO_HORARIO_SP
 from flask_login import login_required
 import traceback
 
@@ -14,6 +17,19 @@ import traceback
 schedule_bp = Blueprint('schedule', __name__, template_folder='templates')
 
 
+# --- Funções Auxiliares ---
+
+def _conflict_response(error):
+    """Resposta 409 de um SchedulingConflict, com o próximo horário livre quando houver."""
+    message = str(error)
+    if error.suggestion:
+        message += f" Próximo horário livre: {error.suggestion:%d/%m/%Y %H:%M}."
+    return jsonify({
+        'status': 'error', 'message': message,
+        'suggestion': error.suggestion.isoformat() if error.suggestion else None
+    }), 409
+
+
 # --- Rotas ---
 
 @schedule_bp.route('/schedule/')
@@ -41,48 +57,39 @@ def calendar_view():
 @login_required
 def api_get_appointments():
     """
-    Endpoint de API que retorna todos os agendamentos em formato JSON.
-    O calendário (FullCalendar.js) usará esta rota para buscar os eventos.
+    Endpoint de API que retorna, em formato JSON, os agendamentos da janela
+    visível do calendário (parâmetros start/end enviados pelo FullCalendar).
+    Responde 304 quando a janela não mudou desde a última busca (ETag).
     """
     try:
-        appointments = Appointment.query.all()
-        
-        events_list = []
-        for appointment in appointments:
-            try:
-                # Definição da cor de acordo com status/tipo
-                color = '#3788d8'  # Azul padrão
-                if appointment.status == 'PENDING_APPROVAL':
-                    color = '#FBBF24'  # Amarelo (aguardando aprovação)
-                elif appointment.status == 'CANCELLED':
-                    color = '#EF4444'  # Vermelho (cancelado)
-                elif appointment.event_type == 'RESERVATION':
-                    color = '#10B981'  # Verde (reserva)
-
-                technician_name = appointment.technician.name if appointment.technician else 'Não definido'
-                client_name = appointment.client.name if appointment.client else None
-
-                event_data = {
-                    'id': appointment.id,
-                    'title': appointment.title,
-                    'start': appointment.start_datetime.isoformat(),
-                    'end': appointment.end_datetime.isoformat(),
-                    'color': color,
-                    'eventType': appointment.event_type,
-                    'status': appointment.status,
-                    'technicianName': technician_name,
-                    'technicianId': appointment.user_id,
-                    'clientName': client_name,
-                    'clientId': appointment.client_id
-                }
-                
-                events_list.append(event_data)
-                
-            except Exception as e:
-                print(f"Erro ao processar appointment {appointment.id}: {str(e)}")
-                continue
-            
-        return jsonify(events_list)
+        window = parse_window(request.args.get('start'), request.args.get('end'))
+    except ValueError as e:
+        return jsonify({"error": "Janela inválida", "message": str(e)}), 400
+
+    try:
+        etag = window_etag(window)
+        if etag in request.if_none_match:
+            response = current_app.response_class(status=304)
+        else:
+            response = jsonify([{
+                'id': row.id,
+                'title': row.title,
+                'start': row.start_datetime.isoformat(),
+                'end': row.end_datetime.isoformat(),
+                'color': event_color(row.status, row.event_type),
+                'eventType': row.event_type,
+                'status': row.status,
+                'technicianName': row.technician_name or 'Não definido',
+                'technicianId': row.user_id,
+                'clientName': row.client_name,
+                'clientId': row.client_id
+            } for row in appointments_in_window(window)])
+
+        # O navegador guarda a resposta e revalida com If-None-Match a cada busca
+        response.set_etag(etag)
+        response.cache_control.private = True
+        response.cache_control.no_cache = True
+        return response
 
     except Exception as e:
         print(f"Erro ao buscar appointments: {str(e)}")
@@ -94,7 +101,8 @@ def api_get_appointments():
 @login_required
 def api_create_appointment():
     """
-    Endpoint para criar um novo agendamento.
+    Endpoint para criar um novo agendamento. Recusa (409) o horário se o
+    técnico já estiver ocupado; sem técnico informado, atribui um livre.
     """
     try:
         if not request.is_json:
@@ -104,14 +112,16 @@ def api_create_appointment():
         if not data:
             return jsonify({'status': 'error', 'message': 'Nenhum dado recebido.'}), 400
 
-        required_fields = ['title', 'start', 'user_id']
+        required_fields = ['title', 'start']
         missing_fields = [f for f in required_fields if f not in data or not str(data[f]).strip()]
         if missing_fields:
             return jsonify({'status': 'error', 'message': f"Campos obrigatórios faltando: {', '.join(missing_fields)}"}), 400
 
-        technician = User.query.get(data['user_id'])
-        if not technician:
-            return jsonify({'status': 'error', 'message': 'Técnico não encontrado.'}), 400
+        technician = None
+        if data.get('user_id'):
+            technician = User.query.get(data['user_id'])
+            if not technician:
+                return jsonify({'status': 'error', 'message': 'Técnico não encontrado.'}), 400
 
         client = None
         if data.get('client_id'):
@@ -119,17 +129,18 @@ def api_create_appointment():
             if not client:
                 return jsonify({'status': 'error', 'message': 'Cliente não encontrado.'}), 400
 
-        start_dt = datetime.fromisoformat(data['start'].replace('Z', '+00:00'))
-        end_dt = datetime.fromisoformat(data.get('end', data['start']).replace('Z', '+00:00'))
+        start_dt = parse_datetime(data['start'])
+        end_dt = parse_datetime(data.get('end', data['start']))
         if end_dt <= start_dt:
             return jsonify({'status': 'error', 'message': 'A data/hora de fim deve ser posterior à de início.'}), 400
 
+        user_id = reserve_technician(start_dt, end_dt, technician.id if technician else None)
         new_appointment = Appointment(
             title=data['title'].strip(),
             start_datetime=start_dt,
             end_datetime=end_dt,
             client_id=client.id if client else None,
-            user_id=technician.id,
+            user_id=user_id,
             event_type=data.get('event_type', 'MAINTENANCE'),
             status='SCHEDULED',
             notes=data.get('notes', '')
@@ -141,9 +152,13 @@ def api_create_appointment():
         return jsonify({
             'status': 'success', 
             'message': 'Agendamento criado com sucesso!',
-            'appointment_id': new_appointment.id
+            'appointment_id': new_appointment.id,
+            'user_id': user_id
         }), 201
 
+    except SchedulingConflict as e:
+        db.session.rollback()
+        return _conflict_response(e)
     except Exception as e:
         db.session.rollback()
         print(traceback.format_exc())
@@ -182,8 +197,8 @@ def api_update_appointment(appointment_id):
             return jsonify({'status': 'error', 'message': 'Nenhum dado recebido.'}), 400
         
         if 'title' in data: appointment.title = data['title'].strip()
-        if 'start' in data: appointment.start_datetime = datetime.fromisoformat(data['start'].replace('Z', '+00:00'))
-        if 'end' in data: appointment.end_datetime = datetime.fromisoformat(data['end'].replace('Z', '+00:00'))
+        if 'start' in data: appointment.start_datetime = parse_datetime(data['start'])
+        if 'end' in data: appointment.end_datetime = parse_datetime(data['end'])
         if 'user_id' in data:
             technician = User.query.get(data['user_id'])
             if not technician:
@@ -193,9 +208,19 @@ def api_update_appointment(appointment_id):
             appointment.client_id = data['client_id'] or None
         if 'status' in data: appointment.status = data['status']
         if 'notes' in data: appointment.notes = data['notes']
-        
+
+        # Horário, técnico ou status (ex: aprovação) mudou: o técnico precisa estar livre
+        if {'start', 'end', 'user_id', 'status'} & data.keys() and appointment.status != 'CANCELLED':
+            if appointment.end_datetime <= appointment.start_datetime:
+                return jsonify({'status': 'error', 'message': 'A data/hora de fim deve ser posterior à de início.'}), 400
+            reserve_technician(appointment.start_datetime, appointment.end_datetime,
+                               appointment.user_id, exclude_id=appointment.id)
+
         db.session.commit()
         return jsonify({'status': 'success', 'message': 'Agendamento atualizado com sucesso!'})
+    except SchedulingConflict as e:
+        db.session.rollback()
+        return _conflict_response(e)
     except Exception as e:
         db.session.rollback()
         return jsonify({'status': 'error', 'message': str(e)}), 500
@@ -231,17 +256,20 @@ def api_public_create_appointment():
     if not link or link.is_used or datetime.utcnow() > link.expires_at:
         return jsonify({'status': 'error', 'message': 'Link inválido ou expirado.'}), 403
     try:
-        start_dt = datetime.fromisoformat(data['start']).replace(tzinfo=timezone.utc)
-        end_dt = datetime.fromisoformat(data['end']).replace(tzinfo=timezone.utc)
-        if start_dt < datetime.now(timezone.utc):
+        # Horários da agenda são locais (São Paulo), sem fuso
+        start_dt = parse_datetime(data['start'])
+        end_dt = parse_datetime(data['end'])
+        if start_dt < datetime.now(FUSO_HORARIO_SP).replace(tzinfo=None):
             return jsonify({'status': 'error', 'message': 'Não é possível agendar no passado.'}), 400
+        if end_dt <= start_dt:
+            return jsonify({'status': 'error', 'message': 'A hora de fim deve ser posterior à de início.'}), 400
 
         new_appointment = Appointment(
             title=data.get('title', link.purpose),
             start_datetime=start_dt,
             end_datetime=end_dt,
             client_id=link.client_id,
-            user_id=1,  # placeholder até aprovação
+            user_id=reserve_technician(start_dt, end_dt),  # técnico livre; o admin pode trocar na aprovação
             status='PENDING_APPROVAL',
             notes=data.get('notes', '')
         )
@@ -252,6 +280,9 @@ def api_public_create_appointment():
         db.session.commit()
         
         return jsonify({'status': 'success', 'message': 'Seu horário foi solicitado com sucesso!'}), 201
+    except SchedulingConflict as e:
+        db.session.rollback()
+        return _conflict_response(e)
     except Exception as e:
         db.session.rollback()
         return jsonify({'status': 'error', 'message': str(e)}), 500
@@ -259,16 +290,23 @@ def api_public_create_appointment():
 
 @schedule_bp.route('/api/public/appointments')
 def api_public_get_appointments():
+    """
+    Horários ocupados da janela do calendário público, já mesclados e sem
+    nenhum dado dos agendamentos, só nos próximos dias (services/schedule.py).
+    """
+    try:
+        window = parse_window(request.args.get('start'), request.args.get('end'))
+    except ValueError:
+        return jsonify({"error": "Janela inválida"}), 400
     try:
-        appointments = Appointment.query.filter(Appointment.status != 'CANCELLED').all()
-        busy_slots = []
-        for appointment in appointments:
-            busy_slots.append({
-                'start': appointment.start_datetime.isoformat(),
-                'end': appointment.end_datetime.isoformat(),
-                'display': 'background',
-                'color': '#d1d5db'
-            })
-        return jsonify(busy_slots)
+        response = jsonify([{
+            'start': start.isoformat(),
+            'end': end.isoformat(),
+            'display': 'background',
+            'color': '#d1d5db'
+        } for start, end in public_busy_slots(window)])
+        response.cache_control.public = True
+        response.cache_control.max_age = PUBLIC_BUSY_MAX_AGE
+        return response
     except Exception as e:
         return jsonify({"error": "Falha ao buscar horários"}), 500
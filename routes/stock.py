@@ -3,29 +3,66 @@ routes/stock.py
 
 Módulo para administradores gerenciarem o estoque de peças e materiais.
 """
+from datetime import datetime, timedelta
 from flask import (Blueprint, render_template, request, redirect, url_for, flash, abort)
-from flask_login import login_required
+from flask_login import login_required, current_user
+from sqlalchemy import delete, desc
 
-from models import StockItem, MaintenancePartUsed
+from models import StockItem, MaintenancePartUsed, StockLedgerEntry, StockSnapshot
 from extensions import db
 from .utils import admin_required
+from services.periods import period_from_args
+from services.stock_ledger import (LEDGER_REASONS, LEDGER_COLUMNS, InsufficientStock, move_stock,
+                                   inventory_on, quantity_on, ledger_entries_stmt)
 
 stock_bp = Blueprint('stock', __name__, template_folder='templates')
 
 STOCK_CATEGORIES = sorted(['Peças de Reposição', 'Ferramentas', 'Consumíveis', 'EPIs', 'Material de Limpeza', 'Geral'])
+LEDGER_PAGE_SIZE = 50
 
 
 @stock_bp.route('/stock')
 @login_required
 @admin_required
 def stock_list():
-    """Exibe a lista de itens em estoque com filtros."""
+    """Exibe a lista de itens em estoque com filtros e, opcionalmente, o saldo em uma data."""
     category_filter = request.args.get('category')
     query = StockItem.query
     if category_filter:
         query = query.filter(StockItem.category == category_filter)
     items = query.order_by(StockItem.name).all()
-    return render_template('stock_list.html', items=items, categories=STOCK_CATEGORIES, filters=request.args)
+
+    as_of, quantities_as_of = None, None
+    if request.args.get('as_of'):
+        try:
+            as_of = datetime.strptime(request.args['as_of'], '%Y-%m-%d').date()
+            quantities_as_of = inventory_on(as_of, [item.id for item in items])
+        except ValueError:
+            flash('Data inválida para a posição do estoque.', 'warning')
+            as_of = None
+
+    return render_template('stock_list.html', items=items, categories=STOCK_CATEGORIES, filters=request.args,
+                           as_of=as_of, quantities_as_of=quantities_as_of)
+
+
+@stock_bp.route('/stock/item/<int:item_id>/ledger')
+@login_required
+@admin_required
+def stock_item_ledger(item_id):
+    """Livro de estoque de um item: entradas e saídas com o saldo após cada uma."""
+    item = db.session.get(StockItem, item_id)
+    if not item:
+        abort(404)
+    period = period_from_args(request.args)
+    page = request.args.get('page', 1, type=int)
+
+    opening_balance = quantity_on(item_id, period.start - timedelta(days=1)) if period.start else 0
+    entries = ledger_entries_stmt(db.session.query(*LEDGER_COLUMNS), item_id=item_id, period=period).order_by(
+        desc(StockLedgerEntry.created_at), desc(StockLedgerEntry.id)
+    ).paginate(page=page, per_page=LEDGER_PAGE_SIZE, error_out=False)
+
+    return render_template('stock_ledger.html', item=item, entries=entries, opening_balance=opening_balance,
+                           reasons=LEDGER_REASONS, filters=request.args)
 
 
 @stock_bp.route('/stock/item/new', methods=['GET', 'POST'])
@@ -49,12 +86,13 @@ def add_stock_item():
             new_item = StockItem(
                 name=name, category=category, sku=request.form.get('sku'),
                 description=request.form.get('description'),
-                quantity=int(request.form.get('quantity', 0)),
+                quantity=0,
                 low_stock_threshold=int(request.form.get('low_stock_threshold', 5)),
                 unit_cost=float(request.form.get('unit_cost').replace(',', '.')) if request.form.get('unit_cost') else None,
                 requires_tracking=request.form.get('requires_tracking', 'true').lower() == 'true'
             )
             db.session.add(new_item)
+            move_stock(new_item, int(request.form.get('quantity', 0)), 'initial', user_id=current_user.id)
             db.session.commit()
             flash(f'Item "{name}" adicionado ao estoque com sucesso!', 'success')
             return redirect(url_for('stock.stock_list'))
@@ -92,7 +130,7 @@ def edit_stock_item(item_id):
 
             item.name, item.category, item.sku = name, category, request.form.get('sku')
             item.description = request.form.get('description')
-            item.quantity = int(request.form.get('quantity', 0))
+            move_stock(item, int(request.form.get('quantity', 0)) - item.quantity, 'edit', user_id=current_user.id)
             item.low_stock_threshold = int(request.form.get('low_stock_threshold', 5))
             item.unit_cost = float(request.form.get('unit_cost').replace(',', '.')) if request.form.get('unit_cost') else None
             item.requires_tracking = request.form.get('requires_tracking', 'true').lower() == 'true'
@@ -121,6 +159,9 @@ def delete_stock_item(item_id):
         flash(f'Não é possível excluir o item "{item.name}", pois ele já foi utilizado em manutenções.', 'danger')
     else:
         try:
+            # Item nunca usado em manutenção: o livro e as fotografias dele saem junto
+            db.session.execute(delete(StockLedgerEntry).where(StockLedgerEntry.stock_item_id == item_id))
+            db.session.execute(delete(StockSnapshot).where(StockSnapshot.stock_item_id == item_id))
             db.session.delete(item)
             db.session.commit()
             flash(f'Item "{item.name}" excluído com sucesso.', 'success')
@@ -144,19 +185,22 @@ def manual_stock_adjust(item_id):
             adjustment_type = request.form.get('adjustment_type')
             quantity = int(request.form.get('quantity'))
 
+            if quantity <= 0:
+                raise ValueError(quantity)
             if adjustment_type == 'add':
-                item.quantity += quantity
+                move_stock(item, quantity, 'adjust_in', user_id=current_user.id)
+                db.session.commit()
                 flash(f'✅ Adicionadas {quantity} unidades ao estoque de "{item.name}".', 'success')
             elif adjustment_type == 'remove':
-                if item.quantity < quantity:
-                    flash('❌ Quantidade insuficiente em estoque.', 'danger')
-                    return redirect(url_for('stock.manual_stock_adjust', item_id=item_id))
-                item.quantity -= quantity
+                move_stock(item, -quantity, 'adjust_out', user_id=current_user.id)
+                db.session.commit()
                 flash(f'✅ Removidas {quantity} unidades do estoque de "{item.name}".', 'success')
-
-            db.session.commit()
             return redirect(url_for('stock.stock_list'))
 
+        except InsufficientStock:
+            db.session.rollback()
+            flash('❌ Quantidade insuficiente em estoque.', 'danger')
+            return redirect(url_for('stock.manual_stock_adjust', item_id=item_id))
         except (ValueError, TypeError):
             flash('❌ Quantidade inválida.', 'danger')
         except Exception as e:
@@ -180,18 +224,21 @@ def quick_stock_adjust(item_id):
         adjustment_type = request.form.get('adjustment_type')
         quantity = int(request.form.get('quantity'))
 
+        if quantity <= 0:
+            raise ValueError(quantity)
+        # Mesmo caminho atômico da baixa de peças das manutenções
         if adjustment_type == 'add':
-            item.quantity += quantity
+            move_stock(item, quantity, 'adjust_in', user_id=current_user.id)
+            db.session.commit()
             flash(f'Adicionadas {quantity} unidades ao estoque de "{item.name}".', 'success')
         elif adjustment_type == 'remove':
-            if item.quantity < quantity:
-                flash('Quantidade insuficiente em estoque.', 'danger')
-                return redirect(url_for('stock.stock_list'))
-            item.quantity -= quantity
+            move_stock(item, -quantity, 'adjust_out', user_id=current_user.id)
+            db.session.commit()
             flash(f'Removidas {quantity} unidades do estoque de "{item.name}".', 'success')
 
-        db.session.commit()
-
+    except InsufficientStock:
+        db.session.rollback()
+        flash('Quantidade insuficiente em estoque.', 'danger')
     except (ValueError, TypeError):
         flash('Quantidade inválida.', 'danger')
     except Exception as e:
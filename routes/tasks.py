@@ -7,9 +7,10 @@ from flask import (Blueprint, render_template, request, redirect, url_for, flash
 from flask_login import login_required, current_user
 from sqlalchemy import desc
 
-from models import Task, TaskAssignment, User, Notification
+from models import Task, TaskAssignment, User
 from extensions import db
 from .utils import admin_required, notify_admins
+from services.notifications import notify_users
 
 tasks_bp = Blueprint('tasks', __name__, template_folder='templates')
 
@@ -53,10 +54,9 @@ def create_task():
             for tech_id in technician_ids:
                 assignment = TaskAssignment(task_id=new_task.id, user_id=int(tech_id))
                 db.session.add(assignment)
-                # Notificar técnico sobre nova tarefa
-                notif_msg = f"Uma nova tarefa '{title}' foi atribuída a você."
-                notif = Notification(user_id=int(tech_id), message=notif_msg, url=url_for('tasks.technician_tasks'))
-                db.session.add(notif)
+            # Notificar técnicos sobre nova tarefa
+            notif_msg = f"Uma nova tarefa '{title}' foi atribuída a você."
+            notify_users(technician_ids, notif_msg, url_for('tasks.technician_tasks'))
 
             db.session.commit()
             flash('Tarefa criada e atribuída com sucesso!', 'success')
@@ -101,10 +101,8 @@ def edit_task(task_id):
             admin_msg = f"Tarefa '{task.title}' foi atualizada por {current_user.username}."
             notify_admins(admin_msg, url_for('tasks.admin_tasks'), excluded_user_id=current_user.id)
             
-            for tech_id in new_technician_ids:
-                tech_msg = f"A tarefa '{task.title}' atribuída a você foi atualizada."
-                notif = Notification(user_id=tech_id, message=tech_msg, url=url_for('tasks.technician_tasks'))
-                db.session.add(notif)
+            tech_msg = f"A tarefa '{task.title}' atribuída a você foi atualizada."
+            notify_users(new_technician_ids, tech_msg, url_for('tasks.technician_tasks'))
 
             db.session.commit()
             flash('Tarefa atualizada com sucesso!', 'success')
@@ -129,10 +127,8 @@ def delete_task(task_id):
         admin_msg = f"A tarefa '{task.title}' foi deletada por {current_user.username}."
         notify_admins(admin_msg, url_for('tasks.admin_tasks'), excluded_user_id=current_user.id)
         
-        for assignment in task.assignments:
-            tech_msg = f"A tarefa '{task.title}' que estava atribuída a você foi deletada."
-            notif = Notification(user_id=assignment.user_id, message=tech_msg, url=url_for('tasks.technician_tasks'))
-            db.session.add(notif)
+        tech_msg = f"A tarefa '{task.title}' que estava atribuída a você foi deletada."
+        notify_users([a.user_id for a in task.assignments], tech_msg, url_for('tasks.technician_tasks'))
 
         db.session.delete(task)
         db.session.commit()
@@ -162,8 +158,7 @@ def update_task_status(assignment_id):
         creator_id = assignment.task.creator_id
         if creator_id != current_user.id:
             admin_msg = f"O técnico {current_user.username} atualizou a tarefa '{assignment.task.title}' para '{new_status}'."
-            admin_notif = Notification(user_id=creator_id, message=admin_msg, url=url_for('tasks.admin_tasks'))
-            db.session.add(admin_notif)
+            notify_users([creator_id], admin_msg, url_for('tasks.admin_tasks'))
             db.session.commit()
 
         flash('Status da tarefa atualizado.', 'success')
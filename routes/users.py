@@ -7,9 +7,10 @@ from flask import (Blueprint, render_template, request, redirect, url_for, flash
 from flask_login import login_required, current_user
 from sqlalchemy import or_
 
-from models import User, Notification
+from models import User
 from extensions import db
 from .utils import admin_required
+from services.notifications import notify_users
 
 users_bp = Blueprint('users', __name__, template_folder='templates')
 
@@ -126,8 +127,7 @@ def approve_user(user_id):
         user_to_approve.is_active = True
         
         msg = "Sua conta foi aprovada! Agora você já pode fazer o login no sistema."
-        user_notif = Notification(user_id=user_to_approve.id, message=msg, url=url_for('auth.login'))
-        db.session.add(user_notif)
+        notify_users([user_to_approve.id], msg, url_for('auth.login'))
         
         db.session.commit()
         flash(f'Usuário "{user_to_approve.username}" aprovado com sucesso.', 'success')
@@ -1,32 +1,12 @@
-import pytz
-from datetime import datetime
 from functools import wraps
 from flask import flash, redirect, url_for
 from flask_login import current_user
 
-# Importe os modelos e o db para a função notify_admins
-from models import User, Notification
-from extensions import db
+# Serviço de notificações usado pela função notify_admins
+from services.notifications import notify_all_admins
 
-# Fuso horário padrão
-FUSO_HORARIO_SP = pytz.timezone('America/Sao_Paulo')
-
-def format_datetime_local(utc_datetime, fmt=None):
-    """
-    Filtro Jinja para converter uma data UTC (ciente ou ingênua) para o fuso de SP.
-    """
-    if not utc_datetime:
-        return ""
-
-    if utc_datetime.tzinfo is None:
-        utc_datetime = pytz.utc.localize(utc_datetime)
-
-    local_datetime = utc_datetime.astimezone(FUSO_HORARIO_SP)
-    
-    if fmt:
-        return local_datetime.strftime(fmt)
-    
-    return local_datetime.strftime('%d/%m/%Y às %H:%M')
+# Fuso horário e formatação de datas, compartilhados com os serviços
+from services.localtime import FUSO_HORARIO_SP, format_datetime_local  # noqa: F401
 
 
 def admin_required(f):
@@ -43,9 +23,5 @@ def admin_required(f):
     return decorated_function
 
 def notify_admins(message, url, excluded_user_id=None):
-    """Cria uma notificação para todos os administradores."""
-    admins = User.query.filter_by(role='admin').all()
-    for admin in admins:
-        if admin.id != excluded_user_id:
-            notif = Notification(user_id=admin.id, message=message, url=url)
-            db.session.add(notif)
\ No newline at end of file
+    """Enfileira uma notificação para todos os administradores (um evento no outbox)."""
+    notify_all_admins(message, url, excluded_user_id=excluded_user_id)
\ No newline at end of file
@@ -0,0 +1,51 @@
+"""
+services/cache.py
+
+Cache simples em memória, local a cada processo (worker do gunicorn),
+com expiração por tempo (TTL). Usado para valores caros de calcular e
+que podem ficar alguns segundos desatualizados entre workers.
+"""
+import threading
+import time
+
+_MISSING = object()
+
+
+class TTLCache:
+    """Dicionário thread-safe cujas entradas expiram após `ttl` segundos."""
+
+    def __init__(self, ttl):
+        self.ttl = ttl
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is _MISSING:
+                return default
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return default
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+
+    def get_or_set(self, key, factory):
+        """Retorna o valor em cache ou calcula com `factory()` e armazena."""
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            value = factory()
+            self.set(key, value)
+        return value
+
+    def invalidate(self, key=_MISSING):
+        """Remove uma chave específica ou, sem argumentos, todo o cache."""
+        with self._lock:
+            if key is _MISSING:
+                self._data.clear()
+            else:
+                self._data.pop(key, None)
@@ -0,0 +1,231 @@
+"""
+services/export_jobs.py
+
+Exportações de relatórios em segundo plano. A rota apenas grava um ExportJob
+no banco da aplicação, que serve de fila persistente (sem broker externo), e
+o comando 'flask process-exports' distribui os pedidos para um pool de
+processos separado dos workers do gunicorn. O arquivo gerado fica em
+EXPORT_FOLDER até expirar (JOB_RETENTION_DAYS).
+"""
+import multiprocessing
+import os
+import shutil
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import select, update
+from werkzeug.datastructures import MultiDict
+
+from models import ExportJob
+from extensions import db
+from .exports import build_export, parse_export_format
+from .report_exports import REPORT_EXPORTS
+
+# --- Constantes do Módulo ---
+JOB_PENDING = 'pending'
+JOB_RUNNING = 'running'
+JOB_DONE = 'done'
+JOB_FAILED = 'failed'
+EXPORT_WORKERS = 2
+PROGRESS_INTERVAL = 2.0  # segundos entre gravações do andamento
+JOB_RETENTION_DAYS = 7
+
+
+def export_folder():
+    folder = current_app.config['EXPORT_FOLDER']
+    os.makedirs(folder, exist_ok=True)
+    return folder
+
+
+def job_file_path(job):
+    """Caminho absoluto do arquivo gerado (o banco guarda apenas o nome dentro de EXPORT_FOLDER)."""
+    return os.path.join(export_folder(), job.file_path) if job.file_path else None
+
+
+def enqueue_export(kind, params, fmt, user_id):
+    """Registra um pedido de exportação na fila e o retorna."""
+    if kind not in REPORT_EXPORTS:
+        raise ValueError(f"Relatório desconhecido: '{kind}'.")
+    job = ExportJob(kind=kind, params=params, format=parse_export_format(fmt),
+                    status=JOB_PENDING, user_id=user_id)
+    db.session.add(job)
+    db.session.commit()
+    return job
+
+
+# --- FILA ---
+
+def claim_next_job():
+    """
+    Marca o pedido pendente mais antigo como em execução e retorna seu id.
+    O UPDATE é condicional ao status, então dois workers nunca pegam o mesmo pedido.
+    """
+    while True:
+        job_id = db.session.execute(
+            select(ExportJob.id).where(ExportJob.status == JOB_PENDING)
+            .order_by(ExportJob.created_at, ExportJob.id).limit(1)
+        ).scalar()
+        if job_id is None:
+            db.session.commit()
+            return None
+        claimed = db.session.execute(
+            update(ExportJob)
+            .where(ExportJob.id == job_id, ExportJob.status == JOB_PENDING)
+            .values(status=JOB_RUNNING, started_at=datetime.utcnow())
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        db.session.commit()
+        if claimed:
+            return job_id
+
+
+def requeue_interrupted_jobs():
+    """
+    Devolve à fila os pedidos que estavam em execução quando o worker parou.
+    Chamado na inicialização do worker (pressupõe um único 'process-exports').
+    """
+    count = db.session.execute(
+        update(ExportJob).where(ExportJob.status == JOB_RUNNING)
+        .values(status=JOB_PENDING, started_at=None, rows_exported=0)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    db.session.commit()
+    return count
+
+
+def _finish_job(job_id, status, **values):
+    db.session.execute(
+        update(ExportJob).where(ExportJob.id == job_id)
+        .values(status=status, finished_at=datetime.utcnow(), **values)
+        .execution_options(synchronize_session=False)
+    )
+    db.session.commit()
+
+
+def purge_expired_jobs(retention_days=JOB_RETENTION_DAYS):
+    """Remove os pedidos concluídos mais antigos que o prazo de retenção e seus arquivos."""
+    limit = datetime.utcnow() - timedelta(days=retention_days)
+    expired = ExportJob.query.filter(
+        ExportJob.status.in_([JOB_DONE, JOB_FAILED]), ExportJob.finished_at < limit
+    ).all()
+    for job in expired:
+        path = job_file_path(job)
+        if path and os.path.exists(path):
+            os.remove(path)
+        db.session.delete(job)
+    db.session.commit()
+    return len(expired)
+
+
+# --- EXECUÇÃO ---
+
+class _ProgressReporter:
+    """
+    Soma as linhas lidas e grava o andamento a cada PROGRESS_INTERVAL segundos,
+    em uma conexão própria: a sessão principal está com o cursor da exportação aberto.
+    No SQLite esse cursor bloqueia escritas de outras conexões, então lá o total
+    só é gravado ao final.
+    """
+
+    def __init__(self, job_id):
+        self.job_id = job_id
+        self.rows = 0
+        self._last_write = time.monotonic()
+        self._enabled = db.engine.dialect.name != 'sqlite'
+
+    def __call__(self, count):
+        self.rows += count
+        now = time.monotonic()
+        if self._enabled and now - self._last_write >= PROGRESS_INTERVAL:
+            self._last_write = now
+            with db.engine.begin() as conn:
+                conn.execute(update(ExportJob.__table__)
+                             .where(ExportJob.__table__.c.id == self.job_id)
+                             .values(rows_exported=self.rows))
+
+
+def run_export_job(job_id):
+    """Gera o arquivo de um pedido já marcado como em execução. Retorna o status final."""
+    job = db.session.get(ExportJob, job_id)
+    progress = _ProgressReporter(job_id)
+    try:
+        _, builder = REPORT_EXPORTS[job.kind]
+        sheets, basename = builder(MultiDict(job.params or {}))
+        for sheet in sheets:
+            sheet.on_progress = progress
+
+        spool, download_name, mimetype = build_export(sheets, basename, job.format)
+        file_name = f'{job.id}_{download_name}'
+        target = os.path.join(export_folder(), file_name)
+        with spool, open(target + '.part', 'wb') as output:
+            shutil.copyfileobj(spool, output)
+        os.replace(target + '.part', target)
+    except Exception as e:
+        db.session.rollback()
+        _finish_job(job_id, JOB_FAILED, error=str(e), rows_exported=progress.rows)
+        return JOB_FAILED
+
+    _finish_job(job_id, JOB_DONE, file_path=file_name, download_name=download_name,
+                mimetype=mimetype, rows_exported=progress.rows)
+    return JOB_DONE
+
+
+# --- POOL DE PROCESSOS ---
+
+_worker_app = None
+
+
+def _init_worker_process():
+    """Cada processo do pool cria sua própria aplicação (e suas conexões com o banco)."""
+    global _worker_app
+    from app import create_app
+    _worker_app = create_app()
+
+
+def _run_in_worker(job_id):
+    with _worker_app.app_context():
+        return run_export_job(job_id)
+
+
+def serve_export_jobs(workers=EXPORT_WORKERS, interval=2.0, once=False, log=print):
+    """
+    Laço do worker: pega pedidos pendentes enquanto houver processos livres no
+    pool e registra o resultado de cada um. Com `once`, encerra quando a fila esvazia.
+    """
+    requeued = requeue_interrupted_jobs()
+    if requeued:
+        log(f"{requeued} exportação(ões) interrompida(s) devolvida(s) à fila.")
+
+    running = {}
+    # 'spawn' evita herdar as conexões abertas do processo principal
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context,
+                             initializer=_init_worker_process) as pool:
+        while True:
+            while len(running) < workers:
+                job_id = claim_next_job()
+                if job_id is None:
+                    break
+                running[pool.submit(_run_in_worker, job_id)] = job_id
+
+            if not running:
+                purge_expired_jobs()
+                if once:
+                    break
+                time.sleep(interval)
+                continue
+
+            done, _ = wait(running, timeout=interval, return_when=FIRST_COMPLETED)
+            for future in done:
+                job_id = running.pop(future)
+                error = future.exception()
+                if error is None:
+                    log(f"Exportação {job_id}: {future.result()}.")
+                    continue
+                # O processo morreu antes de registrar o resultado
+                _finish_job(job_id, JOB_FAILED, error=str(error) or error.__class__.__name__)
+                log(f"Exportação {job_id}: falhou ({error!r}).")
+                if isinstance(error, BrokenProcessPool):
+                    raise error
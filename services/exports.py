@@ -0,0 +1,242 @@
+"""
+services/exports.py
+
+Motor de exportação de relatórios. As linhas são lidas do banco em lotes
+(yield_per / cursor no servidor) e gravadas no formato pedido:
+
+- xlsx: planilha do openpyxl no modo somente-escrita, com valores formatados;
+- csv: gerado com o módulo `csv` e enviado enquanto as linhas são lidas;
+- parquet: colunar (pyarrow), um row group por lote, com os tipos do SQL.
+
+CSV e Parquet usam os valores crus das tuplas do SQL, sem formatação nem
+objetos do ORM. Os arquivos intermediários ficam em arquivos temporários,
+enviados em partes (chunked): o uso de memória fica constante, independente
+do número de linhas exportadas.
+"""
+import csv
+import io
+import tempfile
+import unicodedata
+import zipfile
+from flask import Response, stream_with_context
+from openpyxl import Workbook
+from sqlalchemy import types as sqltypes
+
+from extensions import db
+
+# --- Constantes do Módulo ---
+XLSX_MIMETYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+CSV_MIMETYPE = 'text/csv'  # o Werkzeug acrescenta '; charset=utf-8' aos tipos text/*
+PARQUET_MIMETYPE = 'application/vnd.apache.parquet'
+ZIP_MIMETYPE = 'application/zip'
+EXPORT_FORMATS = ('xlsx', 'csv', 'parquet')
+EXPORT_BATCH_SIZE = 1000
+STREAM_CHUNK_SIZE = 64 * 1024
+
+
+class ExportSheet:
+    """
+    Uma aba do relatório: título, cabeçalhos e a consulta que gera as linhas.
+    `row_formatter` formata cada tupla para a planilha XLSX; nos formatos
+    crus (CSV/Parquet) as colunas levam os nomes (labels) da consulta.
+    """
+
+    def __init__(self, title, headers, stmt, row_formatter=None):
+        self.title = title
+        self.headers = headers
+        self.stmt = stmt
+        self.row_formatter = row_formatter or tuple
+        # Chamado com o número de linhas do lote lido (usado pelas exportações em segundo plano)
+        self.on_progress = None
+
+    @property
+    def column_names(self):
+        return [column.name for column in self.stmt.selected_columns]
+
+    def rows(self):
+        for batch in self.raw_batches():
+            for row in batch:
+                yield self.row_formatter(row)
+
+    def raw_batches(self, batch_size=EXPORT_BATCH_SIZE):
+        result = db.session.execute(self.stmt.execution_options(yield_per=batch_size))
+        for partition in result.partitions():
+            yield partition
+            if self.on_progress:
+                self.on_progress(len(partition))
+
+
+def parse_export_format(value):
+    """Valida o parâmetro `format=` da URL (padrão: xlsx)."""
+    fmt = (value or 'xlsx').lower()
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Formato de exportação inválido: '{value}'. Use xlsx, csv ou parquet.")
+    return fmt
+
+
+# --- XLSX ---
+
+def build_xlsx(sheets):
+    """Gera a planilha em um arquivo temporário e o retorna posicionado no início."""
+    spool = tempfile.TemporaryFile()
+    try:
+        workbook = Workbook(write_only=True)
+        for sheet in sheets:
+            worksheet = workbook.create_sheet(title=sheet.title)
+            worksheet.append(sheet.headers)
+            for row in sheet.rows():
+                worksheet.append(row)
+        workbook.save(spool)
+    except Exception:
+        spool.close()
+        raise
+    spool.seek(0)
+    return spool
+
+
+# --- CSV ---
+
+def iter_csv(sheet):
+    """Gera o CSV da aba em blocos de bytes, um bloco por lote de linhas."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(sheet.column_names)
+    for batch in sheet.raw_batches():
+        writer.writerows(batch)
+        yield buffer.getvalue().encode('utf-8')
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode('utf-8')
+
+
+def write_csv(sheet, fileobj):
+    for chunk in iter_csv(sheet):
+        fileobj.write(chunk)
+
+
+# --- PARQUET ---
+
+def _arrow_type(column):
+    """
+    Tipo Arrow de uma coluna do SELECT. Colunas sem tipo conhecido (ex.: uma
+    função sem type_) são um erro de programação: o valor não seria convertido.
+    """
+    import pyarrow as pa
+
+    sql_type = column.type
+    if isinstance(sql_type, sqltypes.DateTime):
+        return pa.timestamp('us')
+    if isinstance(sql_type, sqltypes.Date):
+        return pa.date32()
+    if isinstance(sql_type, sqltypes.Boolean):
+        return pa.bool_()
+    if isinstance(sql_type, sqltypes.Integer):
+        return pa.int64()
+    if isinstance(sql_type, sqltypes.Float):
+        return pa.float64()
+    if isinstance(sql_type, sqltypes.Numeric):
+        return pa.decimal128(sql_type.precision or 18, sql_type.scale or 2)
+    if isinstance(sql_type, sqltypes.String):
+        return pa.string()
+    raise TypeError(f"Coluna '{column.name}' sem tipo conhecido para Parquet ({sql_type!r}).")
+
+
+def write_parquet(sheet, fileobj):
+    """Grava a aba em Parquet, montando as colunas diretamente das tuplas do SQL."""
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise RuntimeError("A exportação em Parquet requer o pacote 'pyarrow'.")
+
+    schema = pa.schema([
+        (column.name, _arrow_type(column)) for column in sheet.stmt.selected_columns
+    ])
+    with pq.ParquetWriter(fileobj, schema) as writer:
+        for batch in sheet.raw_batches():
+            columns = list(zip(*batch))
+            writer.write_table(pa.Table.from_arrays(
+                [pa.array(values, type=field.type) for values, field in zip(columns, schema)],
+                schema=schema
+            ))
+
+
+# --- RESPOSTAS ---
+
+def stream_file_response(spool, download_name, mimetype):
+    """Envia um arquivo temporário em partes (Transfer-Encoding: chunked) e o fecha ao final."""
+    def generate():
+        try:
+            while True:
+                chunk = spool.read(STREAM_CHUNK_SIZE)
+                if not chunk:
+                    break
+                yield chunk
+        finally:
+            spool.close()
+
+    return Response(generate(), mimetype=mimetype,
+                    headers={'Content-Disposition': f'attachment; filename="{download_name}"'})
+
+
+def _spool(writer, sheet):
+    spool = tempfile.TemporaryFile()
+    try:
+        writer(sheet, spool)
+    except Exception:
+        spool.close()
+        raise
+    spool.seek(0)
+    return spool
+
+
+def _slug(title):
+    ascii_title = unicodedata.normalize('NFKD', title).encode('ascii', 'ignore').decode()
+    return ''.join(c if c.isalnum() else '_' for c in ascii_title).strip('_').lower()
+
+
+def build_zip(sheets, fmt):
+    """Empacota uma aba por arquivo (CSV ou Parquet) em um ZIP temporário."""
+    writer = write_csv if fmt == 'csv' else write_parquet
+    spool = tempfile.TemporaryFile()
+    try:
+        with zipfile.ZipFile(spool, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+            for sheet in sheets:
+                with archive.open(f'{_slug(sheet.title)}.{fmt}', 'w') as entry:
+                    member = _spool(writer, sheet)
+                    try:
+                        while chunk := member.read(STREAM_CHUNK_SIZE):
+                            entry.write(chunk)
+                    finally:
+                        member.close()
+    except Exception:
+        spool.close()
+        raise
+    spool.seek(0)
+    return spool
+
+
+def build_export(sheets, basename, fmt='xlsx'):
+    """
+    Gera o arquivo do relatório no formato pedido em um arquivo temporário.
+    Relatórios com mais de uma aba em CSV/Parquet viram um ZIP (um arquivo por aba).
+    Retorna (arquivo, nome para download, mimetype).
+    """
+    if fmt == 'xlsx':
+        return build_xlsx(sheets), f'{basename}.xlsx', XLSX_MIMETYPE
+    if len(sheets) > 1:
+        return build_zip(sheets, fmt), f'{basename}_{fmt}.zip', ZIP_MIMETYPE
+    if fmt == 'csv':
+        return _spool(write_csv, sheets[0]), f'{basename}.csv', CSV_MIMETYPE
+    return _spool(write_parquet, sheets[0]), f'{basename}.parquet', PARQUET_MIMETYPE
+
+
+def export_response(sheets, basename, fmt='xlsx'):
+    """Gera a resposta de download do relatório no formato pedido."""
+    if fmt == 'csv' and len(sheets) == 1:
+        # O CSV vai para o cliente à medida que as linhas chegam do banco
+        return Response(stream_with_context(iter_csv(sheets[0])), mimetype=CSV_MIMETYPE,
+                        headers={'Content-Disposition': f'attachment; filename="{basename}.csv"'})
+    return stream_file_response(*build_export(sheets, basename, fmt))
+
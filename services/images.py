@@ -0,0 +1,224 @@
+"""
+services/images.py
+
+Processamento das fotos das manutenções com Pillow. O upload só grava o
+arquivo original e um MaintenanceImage pendente; o comando
+'flask process-images' distribui as fotos pendentes para um pool de
+processos, que:
+
+- gira a imagem conforme a orientação EXIF e descarta os metadados (inclusive
+  a localização GPS das fotos de celular);
+- recomprime o original (JPEG/PNG), limitado a ORIGINAL_MAX_SIZE pixels;
+- gera as variantes de IMAGE_VARIANTS em WebP e JPEG, na pasta 'variants'.
+
+Os arquivos são endereçados pelo conteúdo (services/uploads.py): o original
+recomprimido é gravado com o hash dos novos bytes, sem sobrescrever o
+enviado, e todas as fotos que apontavam para o arquivo enviado passam a
+apontar para ele. O arquivo enviado é apagado quando ninguém mais o usa.
+
+As páginas usam as variantes quando a foto está pronta e o original enquanto
+ela ainda está na fila.
+"""
+import multiprocessing
+import os
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from flask import current_app, url_for
+from sqlalchemy import func, select, update
+
+from models import MaintenanceImage
+from extensions import db
+from .uploads import remove_file, store_path
+
+# --- Constantes do Módulo ---
+IMAGE_PENDING = 'pending'
+IMAGE_READY = 'ready'
+IMAGE_FAILED = 'failed'
+IMAGE_WORKERS = 2
+IMAGE_VARIANTS = {'thumb': 320, 'medium': 1280}  # nome -> largura máxima em pixels
+VARIANT_FORMATS = ('webp', 'jpg')
+ORIGINAL_MAX_SIZE = 2560
+JPEG_QUALITY = 82
+WEBP_QUALITY = 78
+BATCH_PER_WORKER = 4
+
+
+def variants_folder(upload_folder=None):
+    return os.path.join(upload_folder or current_app.config['UPLOAD_FOLDER'], 'variants')
+
+
+def variant_filename(filename, variant, fmt):
+    """Nome do arquivo de uma variante: 'ab/cd/abcd.jpg' -> 'ab/cd/abcd_thumb.webp'."""
+    stem = os.path.splitext(filename)[0]
+    return f'{stem}_{variant}.{fmt}'
+
+
+def remove_image_files(filename, upload_folder=None):
+    """
+    Remove o original e todas as variantes de uma foto, se nenhuma
+    MaintenanceImage usar o mesmo arquivo (o armazenamento é deduplicado).
+    Chame depois do commit que excluiu ou trocou as linhas: antes dele, um
+    rollback deixaria linhas apontando para arquivos apagados. A conferência
+    é feita aqui, no momento da remoção, para enxergar as fotos com o mesmo
+    conteúdo gravadas por outras requisições nesse meio-tempo.
+    """
+    still_used = db.session.execute(
+        select(MaintenanceImage.id).where(MaintenanceImage.filename == filename).limit(1)
+    ).first()
+    if still_used:
+        return
+    upload_folder = upload_folder or current_app.config['UPLOAD_FOLDER']
+    remove_file(os.path.join(upload_folder, filename), upload_folder)
+    for variant in IMAGE_VARIANTS:
+        for fmt in VARIANT_FORMATS:
+            remove_file(os.path.join(variants_folder(upload_folder), variant_filename(filename, variant, fmt)),
+                        upload_folder)
+
+
+def photo_url(image, variant=None, fmt='jpg', public_code=None):
+    """
+    URL de uma foto para os templates. Sem `variant`, ou com a foto ainda na
+    fila, aponta para o original. Com `public_code`, usa a rota pública do
+    resumo do equipamento (que só serve variantes já processadas).
+    """
+    if public_code:
+        return url_for('qrcode.public_photo', code=public_code, image_id=image.id, variant=variant, fmt=fmt)
+    if variant and image.status == IMAGE_READY:
+        return url_for('equipment.uploaded_variant', filename=variant_filename(image.filename, variant, fmt))
+    return url_for('equipment.uploaded_file', filename=image.filename)
+
+
+# --- PROCESSAMENTO (executado nos processos do pool) ---
+
+def _save_atomic(image, path, **params):
+    tmp_path = path + '.part'
+    image.save(tmp_path, **params)
+    os.replace(tmp_path, path)
+
+
+def _store_image(image, upload_folder, ext, **params):
+    """Grava a imagem no armazenamento endereçado pelo conteúdo. Retorna o nome relativo."""
+    fd, tmp_path = tempfile.mkstemp(dir=upload_folder, suffix='.part')
+    os.close(fd)
+    try:
+        image.save(tmp_path, **params)
+        return store_path(tmp_path, ext, upload_folder)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def _to_rgb(image):
+    """Achata transparência sobre fundo branco (JPEG não tem canal alfa)."""
+    from PIL import Image
+
+    if image.mode in ('RGBA', 'LA', 'P'):
+        image = image.convert('RGBA')
+        background = Image.new('RGB', image.size, (255, 255, 255))
+        background.paste(image, mask=image.getchannel('A'))
+        return background
+    return image.convert('RGB') if image.mode != 'RGB' else image
+
+
+def process_image_file(upload_folder, filename):
+    """
+    Recomprime o original sem metadados e gera as variantes de uma foto.
+    Não depende da aplicação nem do banco, para rodar em um processo do pool.
+    O arquivo enviado não é alterado. Retorna (nome_processado, bytes_antes,
+    bytes_depois); o nome é o mesmo quando o original é mantido (GIF).
+    """
+    from PIL import Image, ImageOps
+
+    path = os.path.join(upload_folder, filename)
+    size_before = os.path.getsize(path)
+    with Image.open(path) as source:
+        image_format = source.format
+        animated = getattr(source, 'is_animated', False)
+        image = ImageOps.exif_transpose(source)
+        image.load()
+
+    # Original: GIFs animados ficam como estão; o resto é recomprimido sem EXIF
+    ext = filename.rsplit('.', 1)[-1].lower()
+    processed = filename
+    if image_format == 'JPEG':
+        original = _to_rgb(image)
+        original.thumbnail((ORIGINAL_MAX_SIZE, ORIGINAL_MAX_SIZE))
+        processed = _store_image(original, upload_folder, ext, format='JPEG', quality=JPEG_QUALITY,
+                                 optimize=True, progressive=True)
+    elif image_format == 'PNG':
+        original = image.copy()
+        original.thumbnail((ORIGINAL_MAX_SIZE, ORIGINAL_MAX_SIZE))
+        processed = _store_image(original, upload_folder, ext, format='PNG', optimize=True)
+    elif not animated and image_format != 'GIF':
+        raise ValueError(f'Formato de imagem não suportado: {image_format}')
+
+    folder = variants_folder(upload_folder)
+    variant_paths = {(variant, fmt): os.path.join(folder, variant_filename(processed, variant, fmt))
+                     for variant in IMAGE_VARIANTS for fmt in VARIANT_FORMATS}
+    # Mesmo conteúdo já processado antes (foto repetida): as variantes já existem
+    if not all(os.path.exists(path) for path in variant_paths.values()):
+        os.makedirs(os.path.dirname(variant_paths['thumb', 'jpg']), exist_ok=True)
+        rgb = _to_rgb(image)
+        for variant, width in IMAGE_VARIANTS.items():
+            resized = rgb
+            if rgb.width > width:
+                resized = rgb.resize((width, round(rgb.height * width / rgb.width)), Image.LANCZOS)
+            _save_atomic(resized, variant_paths[variant, 'webp'], format='WEBP', quality=WEBP_QUALITY, method=4)
+            _save_atomic(resized, variant_paths[variant, 'jpg'], format='JPEG', quality=JPEG_QUALITY,
+                         optimize=True, progressive=True)
+    return processed, size_before, os.path.getsize(os.path.join(upload_folder, processed))
+
+
+# --- WORKER ---
+
+def serve_image_jobs(workers=IMAGE_WORKERS, interval=2.0, once=False, log=print):
+    """
+    Laço do worker: envia as fotos pendentes ao pool em lotes e grava o
+    resultado de cada uma. Com `once`, encerra quando não houver pendências
+    (útil para processar as fotos antigas depois da implantação).
+    Deve haver uma única instância do comando rodando.
+    """
+    upload_folder = current_app.config['UPLOAD_FOLDER']
+    # 'spawn' evita herdar as conexões abertas do processo principal
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+        while True:
+            # Um arquivo por vez, mesmo que várias fotos apontem para ele
+            pending = db.session.execute(
+                select(MaintenanceImage.filename)
+                .where(MaintenanceImage.status == IMAGE_PENDING)
+                .group_by(MaintenanceImage.filename)
+                .order_by(func.min(MaintenanceImage.id)).limit(workers * BATCH_PER_WORKER)
+            ).scalars().all()
+            db.session.rollback()  # não segura a transação de leitura enquanto o pool trabalha
+            if not pending:
+                if once:
+                    break
+                time.sleep(interval)
+                continue
+
+            futures = {pool.submit(process_image_file, upload_folder, filename): filename
+                       for filename in pending}
+            for future in as_completed(futures):
+                filename = futures[future]
+                error = future.exception()
+                rows = update(MaintenanceImage).where(
+                    MaintenanceImage.filename == filename, MaintenanceImage.status == IMAGE_PENDING
+                )
+                if error is None:
+                    processed, before, after = future.result()
+                    db.session.execute(rows.values(filename=processed, status=IMAGE_READY))
+                    db.session.commit()
+                    if processed != filename:
+                        remove_image_files(filename, upload_folder)
+                        db.session.rollback()  # encerra a leitura antes de esperar o próximo resultado
+                    log(f"Foto {filename}: pronta ({before // 1024} KB -> {after // 1024} KB).")
+                else:
+                    db.session.execute(rows.values(status=IMAGE_FAILED))
+                    db.session.commit()
+                    log(f"Foto {filename}: falhou ({error!r}).")
+                    if isinstance(error, BrokenProcessPool):
+                        raise error
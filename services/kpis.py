@@ -0,0 +1,64 @@
+"""
+services/kpis.py
+
+Indicadores mensais (KPIs) exibidos no dashboard do administrador.
+Todos os valores são calculados em uma única consulta e guardados em um
+cache de curta duração, invalidado quando manutenções ou despesas mudam.
+"""
+from sqlalchemy import case, event, func, select
+
+from models import MaintenanceHistory, Expense
+from extensions import db
+from .cache import TTLCache
+from .periods import month_period
+
+# --- Constantes do Módulo ---
+KPI_CACHE_TTL = 60  # segundos
+PREVENTIVE_CATEGORY = 'Manutenção Preventiva'
+CORRECTIVE_CATEGORY = 'Manutenção Corretiva'
+
+_kpi_cache = TTLCache(KPI_CACHE_TTL)
+
+
+def _compute_monthly_kpis(year, month):
+    period = month_period(year, month)
+
+    expenses_total = period.apply(
+        select(func.coalesce(func.sum(Expense.value), 0)), Expense.date
+    ).scalar_subquery()
+
+    def _count_category(category):
+        return func.coalesce(func.sum(case((MaintenanceHistory.category == category, 1), else_=0)), 0)
+
+    stmt = period.apply(select(
+        func.count(MaintenanceHistory.id),
+        func.coalesce(func.sum(MaintenanceHistory.cost), 0),
+        expenses_total,
+        _count_category(PREVENTIVE_CATEGORY),
+        _count_category(CORRECTIVE_CATEGORY),
+    ), MaintenanceHistory.maintenance_date)
+    row = db.session.execute(stmt).one()
+
+    return {
+        'maintenances_count': row[0],
+        'revenue': row[1] or 0,
+        'expenses': row[2] or 0,
+        'preventive_count': int(row[3]),
+        'corrective_count': int(row[4]),
+    }
+
+
+def get_monthly_kpis(year, month):
+    """Retorna os KPIs do mês, reaproveitando o cache quando disponível."""
+    return _kpi_cache.get_or_set((year, month), lambda: _compute_monthly_kpis(year, month))
+
+
+def invalidate_kpis(*args):
+    """Descarta os KPIs em cache (usado como listener de eventos do ORM)."""
+    _kpi_cache.invalidate()
+
+
+# Qualquer escrita em manutenções ou despesas invalida o cache deste processo.
+for _model in (MaintenanceHistory, Expense):
+    for _event_name in ('after_insert', 'after_update', 'after_delete'):
+        event.listen(_model, _event_name, invalidate_kpis)
@@ -0,0 +1,41 @@
+"""
+services/localtime.py
+
+Fuso horário da aplicação (São Paulo), a data de hoje nesse fuso e a
+conversão das datas UTC gravadas no banco para exibição. Fica em services
+para que rotas, serviços e o filtro Jinja 'localdatetime' usem a mesma
+definição.
+"""
+from datetime import datetime
+
+import pytz
+
+# Fuso horário padrão
+FUSO_HORARIO_SP = pytz.timezone('America/Sao_Paulo')
+
+
+def today_local():
+    """
+    Data de hoje no fuso de SP. Use no lugar de date.today() ao comparar com
+    datas e horários gravados nesse fuso (como os da agenda): o servidor
+    costuma rodar em UTC, que vira o dia três horas antes.
+    """
+    return datetime.now(FUSO_HORARIO_SP).date()
+
+
+def format_datetime_local(utc_datetime, fmt=None):
+    """
+    Converte uma data UTC (ciente ou ingênua) para o fuso de SP e a formata.
+    """
+    if not utc_datetime:
+        return ""
+
+    if utc_datetime.tzinfo is None:
+        utc_datetime = pytz.utc.localize(utc_datetime)
+
+    local_datetime = utc_datetime.astimezone(FUSO_HORARIO_SP)
+
+    if fmt:
+        return local_datetime.strftime(fmt)
+
+    return local_datetime.strftime('%d/%m/%Y às %H:%M')
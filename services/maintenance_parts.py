@@ -0,0 +1,91 @@
+"""
+services/maintenance_parts.py
+
+Peças usadas nas manutenções. O formulário de criação/edição vira um dict
+{stock_item_id: quantidade}; os itens citados são carregados em uma única
+consulta IN, e a edição compara a lista nova com a gravada e aplica só a
+diferença líquida: uma baixa (ou estorno) em lote no estoque e um DELETE e um
+INSERT em lote nas linhas de MaintenancePartUsed dos itens que mudaram.
+O número de consultas não depende da quantidade de peças.
+"""
+from collections import defaultdict
+from sqlalchemy import delete, func, insert, select
+
+from models import MaintenancePartUsed, StockItem
+from extensions import db
+from .stock_ledger import move_stock_batch
+
+
+def parse_parts(form):
+    """
+    Lê os campos part_ids/part_quantities do formulário e soma as quantidades por
+    item. Lança ValueError se houver peça ou quantidade inválida.
+    """
+    parts = defaultdict(int)
+    for part_id, qty_str in zip(form.getlist('part_ids'), form.getlist('part_quantities')):
+        if part_id and qty_str:
+            quantity = int(qty_str)
+            if quantity <= 0:
+                raise ValueError('Peça ou quantidade inválida.')
+            parts[int(part_id)] += quantity
+    return dict(parts)
+
+
+def load_items(item_ids):
+    """Carrega os itens de estoque em uma única consulta. Retorna {id: StockItem}."""
+    if not item_ids:
+        return {}
+    items = {item.id: item for item in StockItem.query.filter(StockItem.id.in_(item_ids))}
+    if len(items) != len(set(item_ids)):
+        raise ValueError('Peça ou quantidade inválida.')
+    return items
+
+
+def parts_cost(parts, items):
+    """Custo das peças pelo custo unitário atual de cada item."""
+    return sum(float(items[item_id].unit_cost) * quantity
+               for item_id, quantity in parts.items() if items[item_id].unit_cost)
+
+
+def recorded_parts(history_id):
+    """Peças gravadas de uma manutenção, somadas por item, em uma consulta."""
+    return dict(db.session.execute(
+        select(MaintenancePartUsed.stock_item_id, func.sum(MaintenancePartUsed.quantity_used))
+        .where(MaintenancePartUsed.maintenance_history_id == history_id)
+        .group_by(MaintenancePartUsed.stock_item_id)
+    ).all())
+
+
+def sync_parts(history_id, new_parts, user_id=None, old_parts=None):
+    """
+    Faz as peças gravadas da manutenção passarem a ser `new_parts`, movimentando
+    o estoque só pela diferença líquida: uma saída em lote para os itens que
+    aumentaram e um estorno em lote para os que diminuíram ou saíram. Use
+    old_parts={} para uma manutenção nova (dispensa a consulta às peças gravadas).
+    Lança InsufficientStock se faltar estoque; o chamador deve desfazer a transação.
+    """
+    if old_parts is None:
+        old_parts = recorded_parts(history_id)
+
+    deltas = {}
+    for item_id in old_parts.keys() | new_parts.keys():
+        delta = old_parts.get(item_id, 0) - new_parts.get(item_id, 0)
+        if delta:
+            deltas[item_id] = delta
+    if not deltas:
+        return
+
+    move_stock_batch({i: d for i, d in deltas.items() if d < 0}, 'maintenance',
+                     user_id=user_id, maintenance_history_id=history_id)
+    move_stock_batch({i: d for i, d in deltas.items() if d > 0}, 'maintenance_return',
+                     user_id=user_id, maintenance_history_id=history_id)
+
+    if old_parts:
+        db.session.execute(delete(MaintenancePartUsed).where(
+            MaintenancePartUsed.maintenance_history_id == history_id,
+            MaintenancePartUsed.stock_item_id.in_(list(deltas))
+        ))
+    rows = [{'maintenance_history_id': history_id, 'stock_item_id': item_id, 'quantity_used': new_parts[item_id]}
+            for item_id in sorted(deltas) if new_parts.get(item_id)]
+    if rows:
+        db.session.execute(insert(MaintenancePartUsed), rows)
@@ -0,0 +1,196 @@
+"""
+services/notifications.py
+
+Serviços de notificação: fila (outbox) de eventos expandida em lote por um
+worker, contador de não lidas e carregamento preguiçoso das notificações
+recentes exibidas no cabeçalho (base.html).
+
+O contador de não lidas é a coluna User.unread_notifications, ajustada com
+um UPDATE relativo (unread_notifications + n) na mesma transação que grava,
+lê ou exclui notificações: pelos eventos do ORM em Notification e, no
+INSERT em lote do outbox, explicitamente. Assim todos os workers enxergam o
+mesmo valor, e o cabeçalho o lê do usuário já carregado pelo login.
+
+Os administradores de um evento 'admins' são consultados pelo worker a
+cada lote, fora do ciclo da requisição: uma promoção ou rebaixamento vale
+já para o próximo lote, em qualquer processo.
+"""
+from collections import Counter
+from sqlalchemy import case, delete, desc, event, inspect, insert, select, update
+
+from models import Notification, NotificationOutbox, User
+from extensions import db
+
+# --- Constantes do Módulo ---
+RECENT_NOTIFICATIONS_LIMIT = 5
+OUTBOX_BATCH_SIZE = 500
+
+
+def get_admin_ids():
+    """Retorna o conjunto de ids dos administradores, consultado na transação atual."""
+    return frozenset(db.session.execute(select(User.id).where(User.role == 'admin')).scalars())
+
+
+def notify_users(user_ids, message, url=None):
+    """
+    Enfileira a mesma notificação para vários usuários gravando um único
+    evento no outbox. Não faz commit: o evento entra na transação atual.
+    """
+    recipients = list(dict.fromkeys(int(user_id) for user_id in user_ids))
+    if not recipients:
+        return
+    db.session.add(NotificationOutbox(target='users', recipient_ids=recipients, message=message, url=url))
+
+
+def notify_all_admins(message, url=None, excluded_user_id=None):
+    """Enfileira uma notificação para todos os administradores (resolvidos pelo worker)."""
+    db.session.add(NotificationOutbox(
+        target='admins', excluded_user_id=excluded_user_id, message=message, url=url
+    ))
+
+
+def _event_recipients(outbox_event, admin_ids):
+    if outbox_event.target == 'admins':
+        return admin_ids - {outbox_event.excluded_user_id}
+    return outbox_event.recipient_ids or []
+
+
+def process_outbox(batch_size=OUTBOX_BATCH_SIZE):
+    """
+    Expande um lote de eventos pendentes do outbox em notificações, com um
+    único INSERT em lote, soma os contadores de não lidas dos destinatários e
+    remove os eventos processados, tudo na mesma transação.
+    Retorna a quantidade de eventos processados.
+    """
+    events = db.session.execute(
+        select(NotificationOutbox).order_by(NotificationOutbox.id)
+        .limit(batch_size).with_for_update(skip_locked=True)
+    ).scalars().all()
+    if not events:
+        db.session.rollback()  # não fica 'idle in transaction' enquanto o worker espera
+        return 0
+
+    # Uma consulta por lote, só se algum evento for para os administradores
+    admin_ids = get_admin_ids() if any(e.target == 'admins' for e in events) else frozenset()
+    rows = []
+    unread = Counter()
+    for outbox_event in events:
+        for user_id in dict.fromkeys(_event_recipients(outbox_event, admin_ids)):
+            rows.append({
+                'user_id': user_id, 'message': outbox_event.message, 'url': outbox_event.url,
+                'is_read': False, 'timestamp': outbox_event.created_at
+            })
+            unread[user_id] += 1
+
+    if rows:
+        db.session.execute(insert(Notification), rows)
+        # O INSERT em lote não dispara os eventos do ORM: os contadores sobem aqui, na mesma transação
+        adjust_unread_counts(db.session.connection(), unread)
+    db.session.execute(
+        delete(NotificationOutbox).where(NotificationOutbox.id.in_([e.id for e in events]))
+    )
+    db.session.commit()
+    return len(events)
+
+
+def adjust_unread_counts(connection, deltas):
+    """
+    Soma as variações {user_id: delta} ao contador de não lidas dos usuários,
+    com um único UPDATE na conexão (transação) informada.
+    """
+    deltas = {user_id: delta for user_id, delta in deltas.items() if delta}
+    if not deltas:
+        return
+    users = User.__table__
+    connection.execute(
+        update(users).where(users.c.id.in_(list(deltas)))
+        .values(unread_notifications=users.c.unread_notifications + case(deltas, value=users.c.id))
+    )
+
+
+def get_unread_count(user_id):
+    """
+    Retorna o número de notificações não lidas do usuário. Para o usuário logado
+    o objeto já está na sessão, e a leitura não faz consulta.
+    """
+    user = db.session.get(User, user_id)
+    return user.unread_notifications if user else 0
+
+
+def mark_read(notification):
+    """
+    Marca a notificação como lida e desconta do contador, na transação atual.
+    O UPDATE só vale se ela ainda não estava lida, para que duas requisições
+    simultâneas não descontem duas vezes. Não faz commit.
+    """
+    marked = db.session.execute(
+        update(Notification.__table__)
+        .where(Notification.__table__.c.id == notification.id, Notification.__table__.c.is_read == False)  # noqa: E712
+        .values(is_read=True)
+    ).rowcount
+    if marked:
+        adjust_unread_counts(db.session.connection(), {notification.user_id: -1})
+    db.session.expire(notification, ['is_read'])
+
+
+class RecentNotifications:
+    """
+    Lista das notificações mais recentes de um usuário que só consulta o
+    banco quando o template de fato percorre a lista.
+    """
+
+    def __init__(self, user_id, limit=RECENT_NOTIFICATIONS_LIMIT):
+        self.user_id = user_id
+        self.limit = limit
+        self._items = None
+
+    def _load(self):
+        if self._items is None:
+            self._items = Notification.query.filter_by(user_id=self.user_id).order_by(
+                desc(Notification.timestamp)
+            ).limit(self.limit).all()
+        return self._items
+
+    def __iter__(self):
+        return iter(self._load())
+
+    def __len__(self):
+        return len(self._load())
+
+    def __bool__(self):
+        return bool(self._load())
+
+
+def _count_inserted(mapper, connection, target):
+    if not target.is_read:
+        adjust_unread_counts(connection, {target.user_id: 1})
+
+
+def _count_updated(mapper, connection, target):
+    state = inspect(target)
+    read_history, user_history = state.attrs.is_read.history, state.attrs.user_id.history
+    if not (read_history.has_changes() or user_history.has_changes()):
+        return
+    was_read = read_history.deleted[0] if read_history.deleted else target.is_read
+    old_user_id = user_history.deleted[0] if user_history.deleted else target.user_id
+    deltas = {old_user_id: 0 if was_read else -1}
+    deltas[target.user_id] = deltas.get(target.user_id, 0) + (0 if target.is_read else 1)
+    adjust_unread_counts(connection, deltas)
+
+
+def _count_deleted(mapper, connection, target):
+    if not target.is_read:
+        adjust_unread_counts(connection, {target.user_id: -1})
+
+
+def _load_previous_value(target, value, oldvalue, initiator):
+    pass
+
+
+# Inserções, leituras (is_read) e exclusões de notificações pelo ORM ajustam o
+# contador. active_history carrega o valor antigo ao atribuir um novo.
+for _attr in (Notification.is_read, Notification.user_id):
+    event.listen(_attr, 'set', _load_previous_value, active_history=True)
+event.listen(Notification, 'after_insert', _count_inserted)
+event.listen(Notification, 'after_update', _count_updated)
+event.listen(Notification, 'after_delete', _count_deleted)
@@ -0,0 +1,84 @@
+"""
+services/periods.py
+
+Filtros por período (mês, semana ou intervalo de datas) convertidos em
+intervalos semiabertos [início, fim). Comparar a coluna diretamente com as
+pontas do intervalo permite usar os índices de data; já
+extract('year'/'month', coluna) obriga o banco a avaliar cada linha.
+"""
+from datetime import date, datetime, timedelta
+from typing import NamedTuple, Optional
+
+
+class Period(NamedTuple):
+    """Intervalo semiaberto [start, end). Qualquer uma das pontas pode ser None (sem limite)."""
+    start: Optional[date] = None
+    end: Optional[date] = None
+
+    @property
+    def last_day(self):
+        """Último dia incluído no período (para exibição)."""
+        return self.end - timedelta(days=1) if self.end else None
+
+    def apply(self, query, column):
+        """Aplica o período como filtro em uma Query ou em um select()."""
+        if self.start:
+            query = query.filter(column >= self.start)
+        if self.end:
+            query = query.filter(column < self.end)
+        return query
+
+    def apply_overlap(self, query, start_column, end_column):
+        """
+        Filtra registros com início e fim que se sobrepõem ao período
+        (começam antes do fim dele e terminam depois do início).
+        """
+        if self.start:
+            query = query.filter(end_column > self.start)
+        if self.end:
+            query = query.filter(start_column < self.end)
+        return query
+
+
+def _parse_date(value):
+    return datetime.strptime(value, '%Y-%m-%d').date()
+
+
+def month_period(year, month):
+    """Período do mês informado."""
+    start = date(year, month, 1)
+    end = date(year + 1, 1, 1) if month == 12 else date(year, month + 1, 1)
+    return Period(start, end)
+
+
+def week_period(day):
+    """Período da semana (domingo a sábado) que contém o dia informado."""
+    start = day - timedelta(days=(day.weekday() + 1) % 7)
+    return Period(start, start + timedelta(days=7))
+
+
+def date_range_period(start_date=None, end_date=None):
+    """Período entre duas datas inclusivas (como nos filtros 'Data Inicial'/'Data Final')."""
+    return Period(start_date, end_date + timedelta(days=1) if end_date else None)
+
+
+def parse_month(value):
+    """Converte 'AAAA-MM' em período. Lança ValueError se o valor for inválido."""
+    year, month = map(int, value.split('-'))
+    return month_period(year, month)
+
+
+def period_from_args(args):
+    """
+    Lê o período dos parâmetros da URL: `month=AAAA-MM`, `week=AAAA-MM-DD`
+    (qualquer dia da semana) ou `start_date`/`end_date`. Sem nenhum deles,
+    o período fica sem limites. Lança ValueError para datas inválidas.
+    """
+    if args.get('month'):
+        return parse_month(args.get('month'))
+    if args.get('week'):
+        return week_period(_parse_date(args.get('week')))
+    start_date = args.get('start_date')
+    end_date = args.get('end_date')
+    return date_range_period(_parse_date(start_date) if start_date else None,
+                             _parse_date(end_date) if end_date else None)
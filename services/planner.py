@@ -0,0 +1,163 @@
+"""
+services/planner.py
+
+Planejamento automático das manutenções preventivas. O comando
+'flask plan-preventive' (agendado no cron, toda noite) transforma o
+next_maintenance_date dos equipamentos em agendamentos:
+
+- busca, pelo índice (is_archived, next_maintenance_date), os equipamentos
+  ativos que vencem nos próximos dias e ainda não têm agendamento;
+- agrupa os equipamentos do mesmo cliente e local em visitas que cabem em um
+  expediente (WORKDAY_START a WORKDAY_END);
+- coloca cada visita, da mais urgente para a menos, no técnico que pode
+  atendê-la mais cedo a partir do vencimento e, entre os livres no mesmo dia,
+  no que recebeu menos horas neste planejamento;
+- grava todos os agendamentos com um único INSERT em lote, na transação que
+  travou os técnicos (services/schedule.py), para que uma marcação feita pela
+  agenda ao mesmo tempo não pegue os mesmos horários.
+
+São três consultas, qualquer que seja o tamanho da frota, e cada visita custa
+uma busca binária por técnico no TechnicianCalendar. O tempo cresce com o
+número de equipamentos vencendo, não com o histórico da agenda.
+"""
+from collections import defaultdict
+from datetime import date, datetime, time, timedelta
+from typing import NamedTuple
+from sqlalchemy import insert, select
+
+from models import Appointment, Client, Equipment
+from extensions import db
+from .localtime import today_local
+from .periods import Period
+from .schedule import (WORKDAY_END, WORKDAY_START, invalidate_busy_days, lock_technicians,
+                       schedulable_technician_ids, technician_calendars)
+
+# --- Constantes do Módulo ---
+DEFAULT_HORIZON_DAYS = 14
+DEFAULT_VISIT_MINUTES = 60  # por equipamento
+PLANNING_SLACK = timedelta(days=14)  # quanto a visita pode passar do horizonte quando a agenda está cheia
+WORKDAY_LENGTH = datetime.combine(date.min, WORKDAY_END) - datetime.combine(date.min, WORKDAY_START)
+
+
+class PreventivePlan(NamedTuple):
+    """Resultado do planejamento."""
+    appointments: list  # linhas de Appointment (dicts), na ordem em que foram planejadas
+    visits: int
+    unscheduled: list  # códigos dos equipamentos sem horário livre
+
+
+def due_equipment(until):
+    """
+    Equipamentos ativos, de clientes ativos, com manutenção prevista até
+    `until` e sem agendamento (não cancelado) de hoje em diante. Retorna
+    linhas com id, code, location, client_id e next_maintenance_date.
+    """
+    scheduled = set(db.session.execute(
+        select(Appointment.equipment_id).where(
+            Appointment.equipment_id.isnot(None), Appointment.status != 'CANCELLED',
+            Appointment.end_datetime > datetime.combine(today_local(), time.min)
+        )
+    ).scalars())
+    rows = db.session.execute(
+        select(Equipment.id, Equipment.code, Equipment.location, Equipment.client_id,
+               Equipment.next_maintenance_date)
+        .join(Client, Equipment.client_id == Client.id)
+        .where(Equipment.is_archived == False, Client.is_archived == False,  # noqa: E712
+               Equipment.next_maintenance_date <= until)
+    ).all()
+    return [row for row in rows if row.id not in scheduled]
+
+
+def group_visits(equipment, duration):
+    """
+    Agrupa os equipamentos por cliente e local (sem diferenciar maiúsculas nem
+    espaços) e divide cada grupo em visitas que cabem em um expediente, com
+    `duration` por equipamento. Retorna as visitas (listas de equipamentos)
+    da mais urgente para a menos urgente.
+    """
+    per_visit = max(1, WORKDAY_LENGTH // duration)
+    groups = defaultdict(list)
+    for row in equipment:
+        groups[row.client_id, ' '.join(row.location.split()).casefold()].append(row)
+
+    visits = []
+    for rows in groups.values():
+        rows.sort(key=lambda row: (row.next_maintenance_date, row.code))
+        visits.extend(rows[i:i + per_visit] for i in range(0, len(rows), per_visit))
+    visits.sort(key=lambda visit: (visit[0].next_maintenance_date, visit[0].client_id, visit[0].code))
+    return visits
+
+
+def plan_preventive(days=DEFAULT_HORIZON_DAYS, minutes=DEFAULT_VISIT_MINUTES, dry_run=False):
+    """
+    Planeja as manutenções que vencem nos próximos `days` dias, reservando
+    `minutes` por equipamento, e grava os agendamentos em lote (com `dry_run`,
+    só calcula). Uma visita vai para o dia do vencimento ou o primeiro horário
+    livre depois dele; as vencidas, a partir de amanhã. Retorna um PreventivePlan.
+    """
+    today = today_local()  # a agenda é gravada no fuso de SP
+    first_start = datetime.combine(today + timedelta(days=1), time.min)  # hoje já começou
+    duration = timedelta(minutes=minutes)
+    visits = group_visits(due_equipment(today + timedelta(days=days)), duration)
+    technicians = schedulable_technician_ids()
+    if not visits or not technicians:
+        db.session.rollback()
+        return PreventivePlan([], 0, [row.code for visit in visits for row in visit])
+
+    lock_technicians(technicians)
+    span = Period(first_start, datetime.combine(today + timedelta(days=days + 1), time.min) + PLANNING_SLACK)
+    calendars = technician_calendars(technicians, span)
+    planned = dict.fromkeys(technicians, timedelta())
+    # Buscas anteriores de cada técnico: {duração: (a partir de, horário achado ou None)}.
+    # A agenda só enche, então uma visita igual ou mais longa, a partir do mesmo
+    # instante ou depois, não cabe antes do horário achado: a busca recomeça dele
+    searches = defaultdict(dict)
+
+    appointments, unscheduled, placed = [], [], 0
+    for visit in visits:
+        length = duration * len(visit)
+        after = max(first_start, datetime.combine(visit[0].next_maintenance_date, time.min))
+        best = None
+        for technician in technicians:
+            start = after
+            for searched, (since, found) in searches[technician].items():
+                if searched <= length and since <= after and start is not None:
+                    start = None if found is None else max(start, found)
+            slot = start and calendars[technician].first_free(start, length, span.end)
+            searches[technician][length] = (after, slot)
+            if slot is None:
+                continue
+            key = (slot.date(), planned[technician], slot, technician)
+            if best is None or key < best:
+                best = key
+        if best is None:
+            unscheduled.extend(row.code for row in visit)
+            continue
+
+        _, _, start, technician = best
+        calendars[technician].add(start, start + length)
+        planned[technician] += length
+        placed += 1
+        for row in visit:
+            appointments.append({
+                'title': f'Manutenção preventiva - {row.code}',
+                'event_type': 'MAINTENANCE',
+                'status': 'SCHEDULED',
+                'start_datetime': start,
+                'end_datetime': start + duration,
+                'user_id': technician,
+                'client_id': row.client_id,
+                'equipment_id': row.id,
+                'notes': f'Gerado automaticamente. Vencimento: {row.next_maintenance_date:%d/%m/%Y}. '
+                         f'Local: {row.location}.',
+            })
+            start += duration
+
+    if appointments and not dry_run:
+        db.session.execute(insert(Appointment), appointments)
+        db.session.commit()
+        # O INSERT em lote não dispara os eventos do ORM que limpam o cache da página pública
+        invalidate_busy_days(*((row['start_datetime'], row['end_datetime']) for row in appointments))
+    else:
+        db.session.rollback()
+    return PreventivePlan(appointments, placed, unscheduled)
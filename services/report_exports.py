@@ -0,0 +1,215 @@
+"""
+services/report_exports.py
+
+Definição das exportações de relatórios (consultas, abas e nome do arquivo).
+As mesmas definições são usadas pelo download direto nas rotas e pelas
+exportações em segundo plano (services/export_jobs.py), que recebem os
+filtros gravados no banco em vez de `request.args`.
+
+Cada função recebe os filtros como um MultiDict e retorna (abas, nome_base).
+"""
+from datetime import datetime
+from sqlalchemy import desc, select
+
+from models import (Client, Equipment, MaintenanceHistory, User, Expense, TimeClock,
+                    StockItem, MaintenancePartUsed, StockLedgerEntry)
+from .localtime import FUSO_HORARIO_SP, format_datetime_local
+from .exports import ExportSheet
+from .periods import Period, parse_month, period_from_args
+from .worked_hours import format_hours, worked_seconds_expr
+from .stock_ledger import LEDGER_COLUMNS, LEDGER_REASONS, ledger_entries_stmt
+
+
+def _timestamp():
+    return datetime.now(FUSO_HORARIO_SP).strftime("%Y-%m-%d")
+
+
+def financial_export(args):
+    """Relatório financeiro de manutenções."""
+    client_id = args.get('client_id', type=int)
+    equipment_id = args.get('equipment_id', type=int)
+    period = period_from_args(args)
+
+    stmt = select(
+        MaintenanceHistory.maintenance_date.label('data'), Equipment.code.label('equipamento_codigo'),
+        Equipment.model.label('equipamento_modelo'), Client.name.label('cliente'),
+        MaintenanceHistory.cost.label('custo')
+    ).join(Equipment, MaintenanceHistory.equipment_id == Equipment.id).join(Client, Equipment.client_id == Client.id)
+    if client_id: stmt = stmt.filter(Equipment.client_id == client_id)
+    if equipment_id: stmt = stmt.filter(MaintenanceHistory.equipment_id == equipment_id)
+    stmt = period.apply(stmt, MaintenanceHistory.maintenance_date).order_by(desc(MaintenanceHistory.maintenance_date))
+
+    sheet = ExportSheet(
+        'Financeiro', ['Data', 'Equipamento (Código)', 'Equipamento (Modelo)', 'Cliente', 'Custo (R$)'], stmt,
+        lambda r: (r[0].strftime('%d/%m/%Y'), r[1], r[2], r[3], float(r[4]) if r[4] else 0.0)
+    )
+    return [sheet], f'relatorio_financeiro_{_timestamp()}'
+
+
+def expenses_export(args):
+    """Relatório de despesas dos técnicos."""
+    tech_id = args.get('technician_id', type=int)
+    category = args.get('category')
+    period = period_from_args(args)
+
+    stmt = select(
+        Expense.date.label('data'), User.username.label('tecnico'), Expense.category.label('categoria'),
+        Expense.description.label('descricao'), Expense.value.label('valor')
+    ).join(User, Expense.user_id == User.id)
+    if tech_id: stmt = stmt.filter(Expense.user_id == tech_id)
+    if category: stmt = stmt.filter(Expense.category == category)
+    stmt = period.apply(stmt, Expense.date).order_by(desc(Expense.date), Expense.user_id)
+
+    sheet = ExportSheet(
+        'Despesas', ['Data', 'Técnico', 'Categoria', 'Descrição', 'Valor (R$)'], stmt,
+        lambda r: (r[0].strftime('%d/%m/%Y'), r[1], r[2], r[3], float(r[4]))
+    )
+    return [sheet], f'relatorio_despesas_{_timestamp()}'
+
+
+def time_clock_export(args):
+    """Relatório de ponto eletrônico de um mês."""
+    tech_id = args.get('technician_id', type=int)
+    month_str = args.get('month', datetime.now().strftime('%Y-%m'))
+    period = parse_month(month_str)
+
+    stmt = select(
+        TimeClock.date.label('data'), User.username.label('tecnico'),
+        TimeClock.morning_check_in.label('entrada_manha'), TimeClock.morning_check_out.label('saida_manha'),
+        TimeClock.afternoon_check_in.label('entrada_tarde'), TimeClock.afternoon_check_out.label('saida_tarde'),
+        worked_seconds_expr().label('segundos_trabalhados')
+    ).join(User, TimeClock.user_id == User.id)
+    if tech_id: stmt = stmt.filter(TimeClock.user_id == tech_id)
+    stmt = period.apply(stmt, TimeClock.date).order_by(desc(TimeClock.date), TimeClock.user_id)
+
+    def format_row(r):
+        return (
+            r.data.strftime('%d/%m/%Y'), r.tecnico,
+            format_datetime_local(r.entrada_manha, '%H:%M') if r.entrada_manha else '-',
+            format_datetime_local(r.saida_manha, '%H:%M') if r.saida_manha else '-',
+            format_datetime_local(r.entrada_tarde, '%H:%M') if r.entrada_tarde else '-',
+            format_datetime_local(r.saida_tarde, '%H:%M') if r.saida_tarde else '-',
+            format_hours(r.segundos_trabalhados)
+        )
+
+    sheet = ExportSheet(
+        f'Ponto_{month_str}',
+        ['Data', 'Técnico', 'Entrada Manhã', 'Saída Manhã', 'Entrada Tarde', 'Saída Tarde', 'Total Horas'],
+        stmt, format_row
+    )
+    return [sheet], f'relatorio_ponto_{month_str}_{_timestamp()}'
+
+
+# Colunas de cada saída de estoque, compartilhadas pela tela e pela exportação
+STOCK_MOVEMENT_COLUMNS = (
+    MaintenanceHistory.maintenance_date.label('data'), StockItem.name.label('item'),
+    StockItem.category.label('categoria'), MaintenancePartUsed.quantity_used.label('quantidade_retirada'),
+    Equipment.code.label('equipamento'), Client.name.label('cliente')
+)
+
+
+def stock_movements_stmt(stmt, item_id=None, category=None, period=Period()):
+    """
+    Aplica os joins e filtros das saídas de estoque (peças usadas em manutenções)
+    a uma consulta de colunas, seja um select() ou um db.session.query().
+    """
+    stmt = stmt.select_from(MaintenancePartUsed).join(
+        MaintenanceHistory, MaintenancePartUsed.maintenance_history_id == MaintenanceHistory.id
+    ).join(
+        StockItem, MaintenancePartUsed.stock_item_id == StockItem.id
+    ).join(
+        Equipment, MaintenanceHistory.equipment_id == Equipment.id
+    ).join(
+        Client, Equipment.client_id == Client.id
+    )
+    if item_id: stmt = stmt.filter(MaintenancePartUsed.stock_item_id == item_id)
+    if category: stmt = stmt.filter(StockItem.category == category)
+    return period.apply(stmt, MaintenanceHistory.maintenance_date)
+
+
+def stock_movement_export(args):
+    """Status atual do estoque, saídas em manutenções e o livro de estoque (entradas e saídas)."""
+    item_id = args.get('item_id', type=int)
+    category_filter = args.get('category')
+    period = period_from_args(args)
+
+    # --- ABA DE ESTOQUE ATUAL ---
+    stock_stmt = select(
+        StockItem.name.label('item'), StockItem.category.label('categoria'), StockItem.sku.label('sku'),
+        StockItem.quantity.label('estoque_atual'), StockItem.low_stock_threshold.label('nivel_alerta'),
+        StockItem.unit_cost.label('custo_unitario')
+    )
+    if category_filter: stock_stmt = stock_stmt.filter(StockItem.category == category_filter)
+    stock_stmt = stock_stmt.order_by(StockItem.name)
+
+    def format_stock_row(r):
+        status = 'Normal'
+        if r.estoque_atual <= r.nivel_alerta:
+            status = 'Crítico'
+        elif r.estoque_atual <= r.nivel_alerta * 2:
+            status = 'Atenção'
+        return (r.item, r.categoria, r.sku, r.estoque_atual, r.nivel_alerta,
+                float(r.custo_unitario) if r.custo_unitario else 0.0, status)
+
+    # --- ABA DE MOVIMENTAÇÕES ---
+    movements_stmt = stock_movements_stmt(select(*STOCK_MOVEMENT_COLUMNS), item_id, category_filter, period)
+    movements_stmt = movements_stmt.order_by(desc(MaintenanceHistory.maintenance_date), desc(MaintenancePartUsed.id))
+
+    # --- ABA DO LIVRO DE ESTOQUE ---
+    ledger_stmt = ledger_entries_stmt(select(*LEDGER_COLUMNS), item_id, category_filter, period)
+    ledger_stmt = ledger_stmt.order_by(StockLedgerEntry.created_at, StockLedgerEntry.id)
+
+    def format_ledger_row(r):
+        return (format_datetime_local(r.data, '%d/%m/%Y %H:%M'), r.item, LEDGER_REASONS.get(r.motivo, r.motivo),
+                r.variacao, r.saldo, r.usuario or '-', r.manutencao or '', r.observacao or '')
+
+    sheets = [
+        ExportSheet('Estoque Atual',
+                    ['Item', 'Categoria', 'SKU', 'Estoque Atual', 'Nível de Alerta', 'Custo Unitário (R$)', 'Status'],
+                    stock_stmt, format_stock_row),
+        ExportSheet('Movimentações',
+                    ['Data', 'Item', 'Categoria', 'Quantidade Retirada', 'Equipamento', 'Cliente'],
+                    movements_stmt, lambda r: (r[0].strftime('%d/%m/%Y'), r[1], r[2], r[3], r[4], r[5])),
+        ExportSheet('Livro de Estoque',
+                    ['Data', 'Item', 'Motivo', 'Variação', 'Saldo', 'Usuário', 'Manutenção', 'Observação'],
+                    ledger_stmt, format_ledger_row),
+    ]
+    return sheets, f'relatorio_estoque_{_timestamp()}'
+
+
+def maintenance_export(args):
+    """Relatório completo de manutenções, agrupado por equipamento."""
+    stmt = select(
+        MaintenanceHistory.maintenance_date.label('data'), Equipment.code.label('equipamento_codigo'),
+        Equipment.model.label('equipamento_modelo'), Client.name.label('cliente'),
+        Equipment.location.label('local'), MaintenanceHistory.category.label('categoria'),
+        User.username.label('tecnico'), MaintenanceHistory.cost.label('custo'),
+        MaintenanceHistory.description.label('descricao')
+    ).join(
+        Equipment, MaintenanceHistory.equipment_id == Equipment.id
+    ).join(
+        Client, Equipment.client_id == Client.id
+    ).join(
+        User, MaintenanceHistory.technician_id == User.id
+    ).order_by(Equipment.code, MaintenanceHistory.maintenance_date)
+
+    sheet = ExportSheet(
+        'Manutencoes',
+        ['Data', 'Equipamento (Código)', 'Equipamento (Modelo)', 'Cliente', 'Local',
+         'Categoria', 'Técnico', 'Custo (R$)', 'Descrição'],
+        stmt,
+        lambda r: (r[0].strftime('%d/%m/%Y'), r[1], r[2], r[3], r[4], r[5], r[6],
+                   float(r[7]) if r[7] else 0.0, r[8])
+    )
+    return [sheet], f'relatorio_manutencoes_{_timestamp()}'
+
+
+# --- Registro das Exportações ---
+# chave -> (título exibido, função que monta as abas)
+REPORT_EXPORTS = {
+    'financial': ('Relatório Financeiro', financial_export),
+    'expenses': ('Relatório de Despesas', expenses_export),
+    'time_clock': ('Relatório de Ponto', time_clock_export),
+    'stock_movement': ('Relatório de Estoque', stock_movement_export),
+    'maintenance': ('Relatório de Manutenções', maintenance_export),
+}
@@ -0,0 +1,184 @@
+"""
+services/rollups.py
+
+Agregados mensais de custo das manutenções (MaintenanceCostRollup), por
+cliente, equipamento e mês. Os agregados são atualizados de forma incremental
+pelos eventos de flush de MaintenanceHistory, na mesma transação da rota que
+cria, edita ou exclui a manutenção; 'flask rebuild-rollups' os recalcula do zero.
+
+O relatório financeiro lê os meses completos do agregado e só consulta a
+tabela de manutenções para as pontas parciais do período filtrado.
+"""
+from collections import defaultdict
+from datetime import date
+from sqlalchemy import delete, event, extract, func, inspect, insert, select, update
+
+from models import Equipment, MaintenanceCostRollup, MaintenanceHistory
+from extensions import db
+from .periods import Period, month_period
+
+_rollup = MaintenanceCostRollup.__table__
+
+
+def _month_start(day):
+    return day.replace(day=1)
+
+
+# --- ATUALIZAÇÃO INCREMENTAL ---
+
+def _dialect_insert(connection):
+    """INSERT com suporte a ON CONFLICT (PostgreSQL e SQLite, os bancos suportados)."""
+    if connection.dialect.name == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    return dialect_insert
+
+
+def _apply_delta(connection, equipment_id, maintenance_date, cost, count):
+    """Soma (ou subtrai) custo e quantidade no agregado do mês da manutenção."""
+    client_id = connection.execute(
+        select(Equipment.client_id).where(Equipment.id == equipment_id)
+    ).scalar()
+    if client_id is None:
+        return
+    month = _month_start(maintenance_date)
+    stmt = _dialect_insert(connection)(_rollup).values(
+        client_id=client_id, equipment_id=equipment_id, month=month,
+        total_cost=cost or 0.0, maintenance_count=count
+    )
+    connection.execute(stmt.on_conflict_do_update(
+        index_elements=['client_id', 'equipment_id', 'month'],
+        set_={
+            'total_cost': _rollup.c.total_cost + stmt.excluded.total_cost,
+            'maintenance_count': _rollup.c.maintenance_count + stmt.excluded.maintenance_count,
+        }
+    ))
+    if count < 0:
+        connection.execute(delete(_rollup).where(
+            _rollup.c.client_id == client_id, _rollup.c.equipment_id == equipment_id,
+            _rollup.c.month == month, _rollup.c.maintenance_count <= 0
+        ))
+
+
+def _load_previous_value(target, value, oldvalue, initiator):
+    pass
+
+
+# active_history faz o SQLAlchemy carregar o valor antigo ao atribuir um novo (mesmo
+# com o objeto expirado após um commit), para saber de qual agregado subtrair
+for _attr in (MaintenanceHistory.equipment_id, MaintenanceHistory.maintenance_date, MaintenanceHistory.cost):
+    event.listen(_attr, 'set', _load_previous_value, active_history=True)
+
+
+def _previous_value(target, attr):
+    history = inspect(target).attrs[attr].history
+    return history.deleted[0] if history.deleted else getattr(target, attr)
+
+
+@event.listens_for(MaintenanceHistory, 'after_insert')
+def _rollup_after_insert(mapper, connection, target):
+    _apply_delta(connection, target.equipment_id, target.maintenance_date, target.cost, 1)
+
+
+@event.listens_for(MaintenanceHistory, 'after_update')
+def _rollup_after_update(mapper, connection, target):
+    state = inspect(target)
+    if not any(state.attrs[attr].history.has_changes() for attr in ('equipment_id', 'maintenance_date', 'cost')):
+        return
+    _apply_delta(connection, _previous_value(target, 'equipment_id'),
+                 _previous_value(target, 'maintenance_date'), -(_previous_value(target, 'cost') or 0.0), -1)
+    _apply_delta(connection, target.equipment_id, target.maintenance_date, target.cost, 1)
+
+
+@event.listens_for(MaintenanceHistory, 'after_delete')
+def _rollup_after_delete(mapper, connection, target):
+    _apply_delta(connection, target.equipment_id, target.maintenance_date, -(target.cost or 0.0), -1)
+
+
+@event.listens_for(Equipment, 'after_update')
+def _rollup_after_equipment_update(mapper, connection, target):
+    """Equipamento transferido de cliente: o histórico dele passa a contar para o novo cliente."""
+    if inspect(target).attrs.client_id.history.has_changes():
+        connection.execute(update(_rollup).where(_rollup.c.equipment_id == target.id)
+                           .values(client_id=target.client_id))
+
+
+def rebuild_rollups():
+    """Recalcula todos os agregados a partir das manutenções. Retorna o número de linhas gravadas."""
+    year = extract('year', MaintenanceHistory.maintenance_date)
+    month = extract('month', MaintenanceHistory.maintenance_date)
+    stmt = select(
+        Equipment.client_id, MaintenanceHistory.equipment_id, year, month,
+        func.coalesce(func.sum(MaintenanceHistory.cost), 0.0), func.count(MaintenanceHistory.id)
+    ).join(Equipment, MaintenanceHistory.equipment_id == Equipment.id).group_by(
+        Equipment.client_id, MaintenanceHistory.equipment_id, year, month
+    )
+    rows = [
+        {'client_id': client_id, 'equipment_id': equipment_id, 'month': date(int(y), int(m), 1),
+         'total_cost': float(total_cost), 'maintenance_count': count}
+        for client_id, equipment_id, y, m, total_cost, count in db.session.execute(stmt)
+    ]
+    db.session.execute(delete(_rollup))
+    if rows:
+        db.session.execute(insert(_rollup), rows)
+    db.session.commit()
+    return len(rows)
+
+
+# --- CONSULTAS DO RELATÓRIO ---
+
+def _apply_filters(stmt, client_column, equipment_column, client_id, equipment_id):
+    if client_id: stmt = stmt.where(client_column == client_id)
+    if equipment_id: stmt = stmt.where(equipment_column == equipment_id)
+    return stmt
+
+
+def _raw_monthly(client_id, equipment_id, period):
+    """Custos por mês direto das manutenções, dentro do período."""
+    year = extract('year', MaintenanceHistory.maintenance_date)
+    month = extract('month', MaintenanceHistory.maintenance_date)
+    stmt = select(
+        year, month, func.coalesce(func.sum(MaintenanceHistory.cost), 0.0), func.count(MaintenanceHistory.id)
+    ).join(Equipment, MaintenanceHistory.equipment_id == Equipment.id).group_by(year, month)
+    stmt = _apply_filters(stmt, Equipment.client_id, MaintenanceHistory.equipment_id, client_id, equipment_id)
+    stmt = period.apply(stmt, MaintenanceHistory.maintenance_date)
+    return [(date(int(y), int(m), 1), float(total), count) for y, m, total, count in db.session.execute(stmt)]
+
+
+def monthly_costs(client_id=None, equipment_id=None, period=Period()):
+    """
+    Custo total e quantidade de manutenções por mês, com os filtros do relatório
+    financeiro. Os meses inteiramente dentro do período vêm do agregado; as
+    pontas parciais são somadas direto das manutenções.
+    Retorna uma lista de dicts ordenada por mês.
+    """
+    start, end = period
+    full_start = start if not start or start.day == 1 else month_period(start.year, start.month).end
+    full_end = _month_start(end) if end else None
+
+    parts = []
+    if full_start and full_end and full_start >= full_end:
+        # Período dentro de um único mês (ou de dois meses parciais): só dados brutos
+        parts.extend(_raw_monthly(client_id, equipment_id, period))
+    else:
+        stmt = select(
+            _rollup.c.month, func.sum(_rollup.c.total_cost), func.sum(_rollup.c.maintenance_count)
+        ).group_by(_rollup.c.month)
+        stmt = _apply_filters(stmt, _rollup.c.client_id, _rollup.c.equipment_id, client_id, equipment_id)
+        stmt = Period(full_start, full_end).apply(stmt, _rollup.c.month)
+        parts.extend((m, float(total), int(count)) for m, total, count in db.session.execute(stmt))
+
+        if start and start < full_start:
+            parts.extend(_raw_monthly(client_id, equipment_id, Period(start, full_start)))
+        if end and full_end < end:
+            parts.extend(_raw_monthly(client_id, equipment_id, Period(full_end, end)))
+
+    totals = defaultdict(lambda: [0.0, 0])
+    for month, total_cost, count in parts:
+        totals[month][0] += total_cost
+        totals[month][1] += count
+    return [
+        {'month': month, 'total_cost': total_cost, 'maintenance_count': count}
+        for month, (total_cost, count) in sorted(totals.items()) if count
+    ]
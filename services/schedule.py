@@ -0,0 +1,368 @@
+"""
+services/schedule.py
+
+Consultas da agenda. O calendário (FullCalendar) pede só a janela visível,
+nos parâmetros start/end; os agendamentos que a tocam são buscados por
+sobreposição de intervalos (início antes do fim da janela e fim depois do
+início). Há índice em start_datetime e em end_datetime, e o banco usa o mais
+seletivo: para semanas passadas, o do início; para as futuras, o do fim. Os
+nomes de técnico e cliente vêm no mesmo SELECT, sem carregar os objetos.
+
+A página pública de agendamento só vê os horários ocupados, já mesclados
+em intervalos, e só nos próximos PUBLIC_HORIZON_DAYS dias. Os intervalos de
+cada dia ficam em cache por processo; os dias ausentes são calculados juntos
+em uma consulta, e os eventos do ORM em Appointment descartam os dias tocados
+por um agendamento criado, alterado ou excluído. Escritas em lote, que não
+disparam esses eventos, devem chamar invalidate_busy_days().
+
+Na marcação, reserve_technician() confere se o técnico está livre ou escolhe
+um técnico livre. Os horários ocupados de cada técnico são montados em um
+TechnicianCalendar (intervalos mesclados em listas ordenadas, consultadas por
+busca binária) a partir de uma consulta feita na própria transação da
+marcação, depois de travar os técnicos no PostgreSQL. O índice não fica em
+memória entre requisições: os workers do gunicorn não o compartilhariam, e
+um índice desatualizado deixaria dois workers marcarem o mesmo horário.
+O planejamento das preventivas (services/planner.py) usa os mesmos
+calendários para muitas visitas de uma vez.
+
+As datas da agenda são gravadas como horário local, sem fuso; o fuso que o
+navegador envia nas pontas da janela é descartado.
+"""
+import hashlib
+from bisect import bisect_left, bisect_right
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+from sqlalchemy import event, func, inspect, select
+
+from models import Appointment, Client, User
+from extensions import db
+from .cache import TTLCache
+from .localtime import today_local
+from .periods import Period
+
+# --- Constantes do Módulo ---
+MAX_WINDOW = timedelta(days=93)
+PUBLIC_HORIZON_DAYS = 60
+BUSY_CACHE_TTL = 300  # segundos; limita o atraso entre workers, que não compartilham o cache
+PUBLIC_BUSY_MAX_AGE = 60  # segundos de cache no navegador
+WORKDAY_START = time(7)  # mesmo expediente exibido pelos calendários
+WORKDAY_END = time(19)
+SUGGESTION_HORIZON = timedelta(days=14)
+DEFAULT_EVENT_COLOR = '#3788d8'  # Azul padrão
+STATUS_COLORS = {
+    'PENDING_APPROVAL': '#FBBF24',  # Amarelo (aguardando aprovação)
+    'CANCELLED': '#EF4444',  # Vermelho (cancelado)
+}
+EVENT_TYPE_COLORS = {
+    'RESERVATION': '#10B981',  # Verde (reserva)
+}
+
+# Colunas de cada evento do calendário
+APPOINTMENT_EVENT_COLUMNS = (
+    Appointment.id, Appointment.title, Appointment.start_datetime, Appointment.end_datetime,
+    Appointment.event_type, Appointment.status, Appointment.user_id, Appointment.client_id,
+    User.name.label('technician_name'), Client.name.label('client_name')
+)
+
+
+def parse_datetime(value):
+    """Data/hora ISO enviada pelo navegador, como horário local sem fuso."""
+    # Um '+' do fuso não codificado na URL chega como espaço
+    return datetime.fromisoformat(value.strip().replace(' ', '+')).replace(tzinfo=None)
+
+
+def parse_window(start, end):
+    """
+    Converte os parâmetros start/end do FullCalendar em um Period de
+    data/hora. Lança ValueError se faltarem, forem inválidos ou a janela
+    passar de MAX_WINDOW.
+    """
+    if not start or not end:
+        raise ValueError('Informe os parâmetros start e end.')
+    window = Period(parse_datetime(start), parse_datetime(end))
+    if window.end <= window.start:
+        raise ValueError('O fim da janela deve ser posterior ao início.')
+    if window.end - window.start > MAX_WINDOW:
+        raise ValueError(f'A janela pode ter no máximo {MAX_WINDOW.days} dias.')
+    return window
+
+
+def event_color(status, event_type):
+    """Cor do evento no calendário, pelo status e, depois, pelo tipo."""
+    return STATUS_COLORS.get(status) or EVENT_TYPE_COLORS.get(event_type) or DEFAULT_EVENT_COLOR
+
+
+def appointments_in_window(window):
+    """Agendamentos que se sobrepõem à janela, com os nomes de técnico e cliente, em uma consulta."""
+    stmt = select(*APPOINTMENT_EVENT_COLUMNS).outerjoin(
+        User, Appointment.user_id == User.id
+    ).outerjoin(
+        Client, Appointment.client_id == Client.id
+    )
+    stmt = window.apply_overlap(stmt, Appointment.start_datetime, Appointment.end_datetime)
+    return db.session.execute(stmt.order_by(Appointment.start_datetime, Appointment.id)).all()
+
+
+def window_etag(window):
+    """
+    ETag da janela, calculado com uma consulta agregada, sem montar a resposta.
+    Muda quando um agendamento entra, sai ou é alterado na janela (quantidade,
+    maior id e última alteração). Renomear um técnico ou cliente não muda o
+    ETag; o nome novo aparece na próxima alteração da janela.
+    """
+    stmt = select(func.count(Appointment.id), func.max(Appointment.id), func.max(Appointment.updated_at))
+    count, last_id, last_update = db.session.execute(
+        window.apply_overlap(stmt, Appointment.start_datetime, Appointment.end_datetime)
+    ).one()
+    key = f'{window.start.isoformat()}|{window.end.isoformat()}|{count}|{last_id}|{last_update}'
+    return hashlib.sha1(key.encode()).hexdigest()
+
+
+# --- DISPONIBILIDADE PÚBLICA ---
+
+_busy_cache = TTLCache(BUSY_CACHE_TTL)
+_MISSING = object()
+
+
+def _day_start(day):
+    return datetime.combine(day, time.min)
+
+
+def _merge(intervals):
+    """Mescla intervalos (início, fim) ordenados pelo início que se sobrepõem ou se tocam."""
+    merged = []
+    for start, end in intervals:
+        if merged and start <= merged[-1][1]:
+            if end > merged[-1][1]:
+                merged[-1] = (merged[-1][0], end)
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def _load_busy_days(days):
+    """
+    Calcula os intervalos ocupados mesclados de cada dia, recortados ao dia,
+    com uma única consulta para todos. Retorna {dia: [(início, fim), ...]}.
+    """
+    span = Period(_day_start(min(days)), _day_start(max(days) + timedelta(days=1)))
+    stmt = select(Appointment.start_datetime, Appointment.end_datetime).where(Appointment.status != 'CANCELLED')
+    rows = db.session.execute(
+        span.apply_overlap(stmt, Appointment.start_datetime, Appointment.end_datetime)
+        .order_by(Appointment.start_datetime)
+    ).all()
+
+    busy = {}
+    for day in days:
+        day_start, day_end = _day_start(day), _day_start(day + timedelta(days=1))
+        busy[day] = _merge(
+            (max(start, day_start), min(end, day_end))
+            for start, end in rows if start < day_end and end > day_start
+        )
+    return busy
+
+
+def busy_intervals(start_day, end_day):
+    """
+    Intervalos ocupados mesclados dos dias em [start_day, end_day), usando o
+    cache por dia. Os dias fora do cache são calculados juntos.
+    """
+    days = [start_day + timedelta(days=i) for i in range((end_day - start_day).days)]
+    busy = {day: _busy_cache.get(day, _MISSING) for day in days}
+    missing = [day for day, intervals in busy.items() if intervals is _MISSING]
+    if missing:
+        for day, intervals in _load_busy_days(missing).items():
+            _busy_cache.set(day, intervals)
+            busy[day] = intervals
+    # Um agendamento que atravessa a meia-noite volta a ser um intervalo só
+    return _merge(interval for day in days for interval in busy[day])
+
+
+def public_busy_slots(window):
+    """
+    Horários ocupados da janela para a página pública, limitados a hoje e aos
+    próximos PUBLIC_HORIZON_DAYS dias (hoje no fuso de SP, o da agenda).
+    Retorna [(início, fim), ...].
+    """
+    today = today_local()
+    start_day = max(window.start.date(), today)
+    end_day = min((window.end - timedelta(microseconds=1)).date() + timedelta(days=1),
+                  today + timedelta(days=PUBLIC_HORIZON_DAYS))
+    if start_day >= end_day:
+        return []
+    return [(max(start, window.start), min(end, window.end))
+            for start, end in busy_intervals(start_day, end_day)
+            if start < window.end and end > window.start]
+
+
+# --- DISPONIBILIDADE DOS TÉCNICOS ---
+
+class SchedulingConflict(ValueError):
+    """O técnico pedido (ou nenhum técnico) está livre no horário; `suggestion` é o próximo início livre."""
+
+    def __init__(self, message, suggestion=None):
+        super().__init__(message)
+        self.suggestion = suggestion
+
+
+class TechnicianCalendar:
+    """
+    Horários ocupados de um técnico em um trecho da agenda. Os intervalos são
+    mesclados, então não se sobrepõem e as listas de inícios e de fins ficam
+    ambas ordenadas: achar o primeiro intervalo que termina depois de um
+    instante é uma busca binária.
+    """
+
+    def __init__(self, intervals):
+        merged = _merge(sorted(intervals))
+        self.starts = [start for start, _ in merged]
+        self.ends = [end for _, end in merged]
+
+    def _first_overlap(self, start, end):
+        """Índice do primeiro intervalo ocupado que se sobrepõe a [start, end), ou None."""
+        i = bisect_right(self.ends, start)
+        if i < len(self.starts) and self.starts[i] < end:
+            return i
+        return None
+
+    def is_free(self, start, end):
+        """O técnico está livre em [start, end)? O(log n)."""
+        return self._first_overlap(start, end) is None
+
+    def busy_time(self, start, end):
+        """Tempo ocupado dentro de [start, end) (para equilibrar a carga entre técnicos)."""
+        total = timedelta()
+        for i in range(bisect_right(self.ends, start), len(self.starts)):
+            if self.starts[i] >= end:
+                break
+            total += min(self.ends[i], end) - max(self.starts[i], start)
+        return total
+
+    def add(self, start, end):
+        """Marca [start, end) como ocupado, mesclando com os intervalos que ele toca."""
+        i = bisect_left(self.ends, start)
+        j = bisect_right(self.starts, end)
+        if i < j:
+            start, end = min(start, self.starts[i]), max(end, self.ends[j - 1])
+        self.starts[i:j] = [start]
+        self.ends[i:j] = [end]
+
+    def first_free(self, after, length, until):
+        """
+        Primeiro início livre a partir de `after` para um horário de duração
+        `length` dentro do expediente, sem passar de `until`. Cada tentativa é
+        uma busca binária; salta direto para o fim do intervalo que atrapalha.
+        """
+        start = after
+        while start + length <= until:
+            day_open = datetime.combine(start.date(), WORKDAY_START)
+            if start < day_open:
+                start = day_open
+            if start + length > datetime.combine(start.date(), WORKDAY_END):
+                start = datetime.combine(start.date() + timedelta(days=1), WORKDAY_START)
+                continue
+            conflict = self._first_overlap(start, start + length)
+            if conflict is None:
+                return start
+            start = self.ends[conflict]
+        return None
+
+
+def schedulable_technician_ids():
+    """Técnicos ativos; sem nenhum cadastrado, qualquer usuário ativo (instalações com um só usuário)."""
+    ids = db.session.execute(
+        select(User.id).where(User.role == 'technician', User.is_active.is_(True)).order_by(User.id)
+    ).scalars().all()
+    return ids or db.session.execute(select(User.id).where(User.is_active.is_(True)).order_by(User.id)).scalars().all()
+
+
+def lock_technicians(user_ids):
+    """
+    No PostgreSQL, trava os técnicos até o fim da transação (em ordem de id,
+    sem deadlock), para que duas marcações simultâneas não peguem o mesmo horário.
+    """
+    if db.session.get_bind().dialect.name == 'postgresql':
+        db.session.execute(select(User.id).where(User.id.in_(user_ids)).order_by(User.id).with_for_update())
+
+
+def technician_calendars(user_ids, span, exclude_id=None):
+    """Monta o TechnicianCalendar de cada técnico no período `span`, com uma consulta."""
+    stmt = select(Appointment.user_id, Appointment.start_datetime, Appointment.end_datetime).where(
+        Appointment.user_id.in_(user_ids), Appointment.status != 'CANCELLED'
+    )
+    if exclude_id:
+        stmt = stmt.where(Appointment.id != exclude_id)
+    intervals = defaultdict(list)
+    for user_id, start, end in db.session.execute(
+        span.apply_overlap(stmt, Appointment.start_datetime, Appointment.end_datetime)
+    ):
+        intervals[user_id].append((start, end))
+    return {user_id: TechnicianCalendar(intervals[user_id]) for user_id in user_ids}
+
+
+def reserve_technician(start, end, user_id=None, exclude_id=None):
+    """
+    Confere o técnico de um horário [start, end) na transação corrente. Com
+    `user_id`, lança SchedulingConflict se ele já tiver agendamento no horário;
+    sem, escolhe entre os técnicos livres o que tem menos horas marcadas no
+    dia. `exclude_id` ignora o próprio agendamento numa edição. Retorna o id
+    do técnico. No PostgreSQL os técnicos ficam travados até o fim da
+    transação, para que duas marcações simultâneas não peguem o mesmo horário.
+    """
+    candidates = [user_id] if user_id else schedulable_technician_ids()
+    if not candidates:
+        raise SchedulingConflict('Nenhum técnico disponível para agendamento.')
+    lock_technicians(candidates)
+
+    day = Period(_day_start(start.date()), _day_start(start.date() + timedelta(days=1)))
+    span = Period(day.start, max(end, start + SUGGESTION_HORIZON))
+    calendars = technician_calendars(candidates, span, exclude_id)
+    free = [candidate for candidate in candidates if calendars[candidate].is_free(start, end)]
+    if free:
+        return min(free, key=lambda candidate: (calendars[candidate].busy_time(*day), candidate))
+
+    slots = [calendars[candidate].first_free(start, end - start, span.end) for candidate in candidates]
+    suggestion = min((slot for slot in slots if slot), default=None)
+    if user_id:
+        raise SchedulingConflict('O técnico já tem um agendamento nesse horário.', suggestion)
+    raise SchedulingConflict('Nenhum técnico está livre nesse horário.', suggestion)
+
+
+# --- INVALIDAÇÃO DO CACHE DE HORÁRIOS OCUPADOS ---
+
+def _days_between(start, end):
+    """Dias tocados por um agendamento (o fim é exclusivo)."""
+    if start is None or end is None:
+        return []
+    last = max(start, end - timedelta(microseconds=1)).date()
+    return [start.date() + timedelta(days=i) for i in range((last - start.date()).days + 1)]
+
+
+def invalidate_busy_days(*ranges):
+    """Descarta do cache os dias tocados pelos intervalos (início, fim) informados."""
+    for start, end in ranges:
+        for day in _days_between(start, end):
+            _busy_cache.invalidate(day)
+
+
+def _invalidate_from_event(mapper, connection, target):
+    ranges = [(target.start_datetime, target.end_datetime)]
+    state = inspect(target)
+    start_history, end_history = state.attrs.start_datetime.history, state.attrs.end_datetime.history
+    if start_history.deleted or end_history.deleted:
+        # Agendamento movido: os dias antigos também mudam
+        ranges.append((start_history.deleted[0] if start_history.deleted else target.start_datetime,
+                       end_history.deleted[0] if end_history.deleted else target.end_datetime))
+    invalidate_busy_days(*ranges)
+
+
+def _load_previous_value(target, value, oldvalue, initiator):
+    pass
+
+
+# active_history carrega o horário antigo ao atribuir um novo, para descartar os dias de origem
+for _attr in (Appointment.start_datetime, Appointment.end_datetime):
+    event.listen(_attr, 'set', _load_previous_value, active_history=True)
+
+for _event_name in ('after_insert', 'after_update', 'after_delete'):
+    event.listen(Appointment, _event_name, _invalidate_from_event)
@@ -0,0 +1,86 @@
+"""
+services/status.py
+
+Motor de status de manutenção dos equipamentos.
+Calcula as faixas "Em dia / Próximo do vencimento / Vencido" diretamente no
+banco de dados, evitando carregar todos os equipamentos para a memória.
+"""
+from datetime import datetime, timedelta
+from flask import g
+from sqlalchemy import case, func
+
+from models import Equipment, Setting
+from extensions import db
+
+# --- Constantes do Módulo ---
+STATUS_EM_DIA = 'Em dia'
+STATUS_PROXIMO = 'Próximo do vencimento'
+STATUS_VENCIDO = 'Vencido'
+
+# Chaves usadas nos filtros da URL (ex: /dashboard?status=proximo)
+STATUS_KEYS = {
+    'em_dia': STATUS_EM_DIA,
+    'proximo': STATUS_PROXIMO,
+    'vencido': STATUS_VENCIDO,
+}
+
+DEFAULT_WARNING_DAYS = 15
+
+
+def get_warning_days():
+    """Retorna a antecedência (em dias) do alerta de vencimento, com cache por requisição."""
+    if 'warning_days' not in g:
+        setting = db.session.get(Setting, 'maintenance_warning_days')
+        g.warning_days = int(setting.value) if setting else DEFAULT_WARNING_DAYS
+    return g.warning_days
+
+
+def _status_limits(today=None, warning_days=None):
+    """Retorna a data de hoje e o limite da janela de 'Próximo do vencimento'."""
+    today = today or datetime.now().date()
+    if warning_days is None:
+        warning_days = get_warning_days()
+    return today, today + timedelta(days=warning_days)
+
+
+def status_condition(status_key, today=None, warning_days=None):
+    """
+    Converte uma chave de status ('em_dia', 'proximo', 'vencido') em um predicado
+    de intervalo sobre `next_maintenance_date`, que pode usar índice.
+    Retorna None para chaves desconhecidas.
+    """
+    today, limit = _status_limits(today, warning_days)
+    column = Equipment.next_maintenance_date
+    if status_key == 'vencido':
+        return column < today
+    if status_key == 'proximo':
+        return column.between(today, limit)
+    if status_key == 'em_dia':
+        return column > limit
+    return None
+
+
+def status_counts(query, today=None, warning_days=None):
+    """
+    Calcula os totais por status de uma query de Equipment em uma única consulta.
+    Retorna um dicionário com as chaves 'total', 'em_dia', 'proximo' e 'vencido'.
+    """
+    today, limit = _status_limits(today, warning_days)
+    column = Equipment.next_maintenance_date
+
+    def _bucket(condition):
+        return func.coalesce(func.sum(case((condition, 1), else_=0)), 0)
+
+    row = query.order_by(None).with_entities(
+        func.count(Equipment.id),
+        _bucket(column > limit),
+        _bucket(column.between(today, limit)),
+        _bucket(column < today),
+    ).one()
+
+    return {
+        'total': row[0],
+        'em_dia': int(row[1]),
+        'proximo': int(row[2]),
+        'vencido': int(row[3]),
+    }
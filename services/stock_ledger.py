@@ -0,0 +1,200 @@
+"""
+services/stock_ledger.py
+
+Livro de estoque. Toda alteração de StockItem.quantity passa por
+move_stock_batch() (ou move_stock(), para um item), que ajusta a quantidade
+com um UPDATE atômico e grava uma linha imutável (StockLedgerEntry) com a
+variação e o saldo resultante. O saldo de um item em uma data é a última linha
+do livro até aquela data (uma busca no índice item + data).
+
+Para o inventário completo em uma data, 'flask snapshot-stock' grava
+periodicamente o saldo de fechamento de todos os itens (StockSnapshot); a
+consulta parte da fotografia mais recente e soma só as linhas do livro
+posteriores a ela, sem reprocessar o histórico inteiro.
+
+As datas do livro são em UTC, como os demais carimbos de data/hora do banco.
+"""
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+from sqlalchemy import case, delete, desc, func, insert, select, update
+from sqlalchemy.orm.attributes import set_committed_value
+
+from models import StockItem, StockLedgerEntry, StockSnapshot, User
+from extensions import db
+from .periods import Period
+
+# --- Constantes do Módulo ---
+LEDGER_REASONS = {
+    'initial': 'Saldo inicial',
+    'adjust_in': 'Entrada manual',
+    'adjust_out': 'Saída manual',
+    'edit': 'Correção no cadastro',
+    'maintenance': 'Uso em manutenção',
+    'maintenance_return': 'Estorno de manutenção',
+}
+
+
+def _end_of_day(day):
+    """Início do dia seguinte: limite exclusivo para 'até o fim do dia'."""
+    return datetime.combine(day + timedelta(days=1), time.min)
+
+
+def _datetime_period(period):
+    """Converte um período de datas em limites de data/hora para colunas DateTime."""
+    start, end = period
+    return Period(datetime.combine(start, time.min) if start else None,
+                  datetime.combine(end, time.min) if end else None)
+
+
+# --- ESCRITA ---
+
+class InsufficientStock(ValueError):
+    """Uma ou mais saídas deixariam o estoque negativo; nada foi baixado."""
+
+
+def move_stock_batch(deltas, reason, user_id=None, maintenance_history_id=None, note=None):
+    """
+    Aplica de uma vez as variações {stock_item_id: delta} (negativo para saídas)
+    e registra cada uma no livro, na transação corrente. Retorna os saldos
+    resultantes ({stock_item_id: quantidade}).
+
+    A baixa é um único UPDATE condicional (quantity = quantity + delta WHERE
+    quantity + delta >= 0), então duas requisições concorrentes nunca vendem a
+    mesma unidade: a segunda não encontra a linha e recebe InsufficientStock.
+    No PostgreSQL as linhas são antes travadas com SELECT ... FOR UPDATE em
+    ordem de id, para que lotes com vários itens não entrem em deadlock. Em caso
+    de erro o chamador deve desfazer a transação (rollback).
+    """
+    deltas = {item_id: delta for item_id, delta in deltas.items() if delta}
+    if not deltas:
+        return {}
+    ids = sorted(deltas)
+    if db.session.get_bind().dialect.name == 'postgresql':
+        db.session.execute(select(StockItem.id).where(StockItem.id.in_(ids)).order_by(StockItem.id).with_for_update())
+
+    delta_expr = case(deltas, value=StockItem.id)
+    balances = dict(db.session.execute(
+        update(StockItem)
+        .where(StockItem.id.in_(ids), StockItem.quantity + delta_expr >= 0)
+        .values(quantity=StockItem.quantity + delta_expr)
+        .returning(StockItem.id, StockItem.quantity),
+        execution_options={'synchronize_session': False}
+    ).all())
+
+    missing = [item_id for item_id in ids if item_id not in balances]
+    if missing:
+        names = db.session.execute(select(StockItem.name).where(StockItem.id.in_(missing)).order_by(StockItem.name))
+        raise InsufficientStock('Estoque insuficiente para ' + ', '.join(f'"{name}"' for name, in names))
+
+    for item_id in ids:
+        # Mantém os objetos já carregados na sessão com o saldo gravado
+        item = db.session.identity_map.get(db.session.identity_key(StockItem, item_id))
+        if item is not None:
+            set_committed_value(item, 'quantity', balances[item_id])
+    db.session.execute(insert(StockLedgerEntry), [
+        {'stock_item_id': item_id, 'delta': deltas[item_id], 'balance_after': balances[item_id],
+         'reason': reason, 'user_id': user_id, 'maintenance_history_id': maintenance_history_id, 'note': note}
+        for item_id in ids
+    ])
+    return balances
+
+
+def move_stock(item, delta, reason, user_id=None, maintenance_history_id=None, note=None):
+    """Variação de um único item (veja move_stock_batch). Retorna o saldo resultante."""
+    if item.id is None:
+        db.session.flush()
+    balances = move_stock_batch({item.id: delta}, reason, user_id=user_id,
+                                maintenance_history_id=maintenance_history_id, note=note)
+    return balances.get(item.id, item.quantity)
+
+
+def take_snapshot(day=None):
+    """
+    Grava o saldo de fechamento de todos os itens no dia informado (ontem, em
+    UTC, por padrão), substituindo uma fotografia anterior da mesma data. Itens
+    com saldo zero são omitidos. Retorna o número de linhas gravadas.
+
+    Só aceita dias já encerrados: inventory_on() soma as linhas do livro a partir
+    do fim do dia da fotografia, e uma movimentação feita depois dela no mesmo
+    dia ficaria de fora. Lança ValueError para hoje ou uma data futura.
+    """
+    today = datetime.utcnow().date()
+    day = day or today - timedelta(days=1)
+    if day >= today:
+        raise ValueError(f'A fotografia precisa de um dia encerrado (anterior a {today:%d/%m/%Y}, em UTC).')
+    quantities = inventory_on(day)
+    db.session.execute(delete(StockSnapshot).where(StockSnapshot.snapshot_date == day))
+    rows = [{'snapshot_date': day, 'stock_item_id': item_id, 'quantity': quantity}
+            for item_id, quantity in sorted(quantities.items()) if quantity]
+    if rows:
+        db.session.execute(insert(StockSnapshot), rows)
+    db.session.commit()
+    return len(rows)
+
+
+# --- CONSULTAS ---
+
+def quantity_on(item_id, day):
+    """Saldo do item no fim do dia informado (0 se não houver movimentação até lá)."""
+    balance = db.session.execute(
+        select(StockLedgerEntry.balance_after)
+        .where(StockLedgerEntry.stock_item_id == item_id, StockLedgerEntry.created_at < _end_of_day(day))
+        .order_by(desc(StockLedgerEntry.created_at), desc(StockLedgerEntry.id))
+        .limit(1)
+    ).scalar()
+    return balance or 0
+
+
+def inventory_on(day, item_ids=None):
+    """
+    Saldo de fechamento de cada item no dia informado: a fotografia mais recente
+    até esse dia mais as movimentações do livro entre ela e o fim do dia.
+    Retorna {stock_item_id: quantidade}; itens ausentes têm saldo zero.
+    """
+    snapshot_date = db.session.execute(
+        select(func.max(StockSnapshot.snapshot_date)).where(StockSnapshot.snapshot_date <= day)
+    ).scalar()
+
+    quantities = defaultdict(int)
+    if snapshot_date:
+        stmt = select(StockSnapshot.stock_item_id, StockSnapshot.quantity).where(
+            StockSnapshot.snapshot_date == snapshot_date
+        )
+        if item_ids is not None: stmt = stmt.where(StockSnapshot.stock_item_id.in_(item_ids))
+        quantities.update(db.session.execute(stmt).all())
+
+    stmt = select(StockLedgerEntry.stock_item_id, func.sum(StockLedgerEntry.delta)).group_by(
+        StockLedgerEntry.stock_item_id
+    )
+    if item_ids is not None: stmt = stmt.where(StockLedgerEntry.stock_item_id.in_(item_ids))
+    stmt = Period(_end_of_day(snapshot_date) if snapshot_date else None, _end_of_day(day)).apply(
+        stmt, StockLedgerEntry.created_at
+    )
+    for item_id, delta in db.session.execute(stmt):
+        quantities[item_id] += int(delta)
+    return quantities
+
+
+# Colunas de cada linha do livro, para a tela do item e a exportação
+LEDGER_COLUMNS = (
+    StockLedgerEntry.created_at.label('data'), StockItem.name.label('item'),
+    StockItem.category.label('categoria'), StockLedgerEntry.reason.label('motivo'),
+    StockLedgerEntry.delta.label('variacao'), StockLedgerEntry.balance_after.label('saldo'),
+    User.username.label('usuario'), StockLedgerEntry.maintenance_history_id.label('manutencao'),
+    StockLedgerEntry.note.label('observacao')
+)
+
+
+def ledger_entries_stmt(stmt, item_id=None, category=None, period=Period()):
+    """
+    Aplica os joins e filtros do livro de estoque a uma consulta de colunas
+    (select() ou db.session.query()). O período é de datas, inclusive no início.
+    """
+    stmt = stmt.select_from(StockLedgerEntry).join(
+        StockItem, StockLedgerEntry.stock_item_id == StockItem.id
+    ).outerjoin(
+        User, StockLedgerEntry.user_id == User.id
+    )
+    if item_id: stmt = stmt.filter(StockLedgerEntry.stock_item_id == item_id)
+    if category: stmt = stmt.filter(StockItem.category == category)
+    return _datetime_period(period).apply(stmt, StockLedgerEntry.created_at)
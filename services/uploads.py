@@ -0,0 +1,264 @@
+"""
+services/uploads.py
+
+Recepção, armazenamento e entrega dos arquivos enviados (fotos das
+manutenções).
+
+Os arquivos do multipart não passam pelo buffer padrão do Werkzeug:
+UploadRequest entrega cada parte a um UploadStream, que grava direto na pasta
+de uploads enquanto o corpo é lido, calcula o hash, confere a assinatura
+(magic bytes) do formato nos primeiros bytes e interrompe a leitura assim que
+um limite é ultrapassado (UPLOAD_MAX_FILE_SIZE por arquivo, UPLOAD_MAX_FILES
+por requisição e MAX_CONTENT_LENGTH no total, este verificado pelo
+Content-Length antes de ler qualquer byte). Uma requisição recusada levanta
+RequestEntityTooLarge ou UnsupportedMediaType no primeiro acesso a
+request.form/request.files, sem ler o resto do corpo.
+
+Os arquivos são endereçados pelo conteúdo: o nome é o SHA-256 dos bytes,
+distribuído em subpastas pelos primeiros caracteres ('ab/cd/abcd....jpg'),
+para que nenhuma pasta acumule milhares de arquivos. O mesmo arquivo enviado
+duas vezes ocupa o disco uma vez só, e o conteúdo de um nome nunca muda: as
+respostas podem ser guardadas em cache como imutáveis, com o hash como ETag.
+
+A entrega aceita GET condicional (If-None-Match/If-Modified-Since) e Range.
+Com UPLOAD_SENDFILE = 'x-sendfile' (Apache/lighttpd) ou 'x-accel' (nginx), a
+aplicação só confere o acesso e devolve um cabeçalho; quem envia os bytes é o
+servidor web, sem ocupar um worker do gunicorn. No nginx, o prefixo
+UPLOAD_ACCEL_PREFIX deve ser uma location 'internal' com alias para a pasta
+de uploads.
+"""
+import hashlib
+import mimetypes
+import os
+import tempfile
+from io import BytesIO
+from flask import Request, abort, current_app, request
+from werkzeug.exceptions import RequestEntityTooLarge, UnsupportedMediaType
+from werkzeug.security import safe_join
+from werkzeug.utils import send_file
+
+# --- Constantes do Módulo ---
+CHUNK_SIZE = 64 * 1024
+SHARD_LEVELS = 2  # subpastas de 2 caracteres do hash
+UPLOAD_MAX_AGE = 365 * 24 * 3600  # um ano: o conteúdo de um nome nunca muda
+ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif'}
+IMAGE_SIGNATURES = (
+    (b'\xff\xd8\xff', 'jpg'),
+    (b'\x89PNG\r\n\x1a\n', 'png'),
+    (b'GIF87a', 'gif'),
+    (b'GIF89a', 'gif'),
+)
+SIGNATURE_SIZE = max(len(signature) for signature, _ in IMAGE_SIGNATURES)
+UPLOAD_ERRORS = (RequestEntityTooLarge, UnsupportedMediaType)
+
+
+def allowed_file(filename):
+    """Verifica se a extensão do arquivo é permitida."""
+    return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
+
+
+def content_name(digest, ext):
+    """Nome relativo de um arquivo a partir do hash: 'abcd...' -> 'ab/cd/abcd....jpg'."""
+    shards = [digest[i * 2:i * 2 + 2] for i in range(SHARD_LEVELS)]
+    return '/'.join(shards + [f'{digest}.{ext.lower()}'])
+
+
+def _commit_file(tmp_path, digest, ext, upload_folder):
+    """
+    Move um arquivo temporário já gravado para o seu endereço. Se o arquivo já
+    existir, é substituído pela cópia (o conteúdo é o mesmo): conferir a
+    existência e descartar a cópia perderia o arquivo se uma exclusão
+    concorrente (remove_image_files) o apagasse entre a conferência e o commit.
+    """
+    name = content_name(digest, ext)
+    path = os.path.join(upload_folder, name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    try:
+        os.replace(tmp_path, path)
+    except FileNotFoundError:
+        # A subpasta ficou vazia e foi removida por uma exclusão concorrente (remove_file)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        os.replace(tmp_path, path)
+    return name
+
+
+def store_path(tmp_path, ext, upload_folder):
+    """
+    Incorpora ao armazenamento um arquivo temporário já gravado na pasta de
+    uploads (usado pelo processamento das fotos). Retorna o nome relativo.
+    """
+    digest = hashlib.sha256()
+    with open(tmp_path, 'rb') as tmp:
+        for chunk in iter(lambda: tmp.read(CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return _commit_file(tmp_path, digest.hexdigest(), ext, upload_folder)
+
+
+def remove_file(path, root):
+    """
+    Remove um arquivo (ignora arquivos ausentes) e as subpastas que ficarem
+    vazias entre ele e `root`, que é preservada.
+    """
+    try:
+        os.remove(path)
+    except OSError:
+        return
+    root = os.path.abspath(root)
+    folder = os.path.dirname(os.path.abspath(path))
+    while folder != root and folder.startswith(root + os.sep):
+        try:
+            os.rmdir(folder)
+        except OSError:
+            break
+        folder = os.path.dirname(folder)
+
+
+# --- RECEPÇÃO ---
+
+class UploadStream:
+    """
+    Destino de um arquivo do multipart: um arquivo temporário na pasta de
+    uploads, gravado e conferido à medida que o Werkzeug lê o corpo. Se não for
+    incorporado ao armazenamento (commit), é apagado ao fim da requisição.
+    """
+
+    def __init__(self, upload_folder, max_size):
+        self.upload_folder = upload_folder
+        self.max_size = max_size
+        self.digest = hashlib.sha256()
+        self.size = 0
+        self.ext = None
+        self._head = b''
+        fd, self.tmp_path = tempfile.mkstemp(dir=upload_folder, suffix='.part')
+        self._file = os.fdopen(fd, 'w+b')
+
+    def write(self, data):
+        self.size += len(data)
+        if self.size > self.max_size:
+            raise RequestEntityTooLarge(f'Cada foto pode ter no máximo {self.max_size // (1024 * 1024)} MB.')
+        if self.ext is None:
+            self._check_signature(data)
+        self.digest.update(data)
+        return self._file.write(data)
+
+    def _check_signature(self, data):
+        """Identifica o formato pelos primeiros bytes; recusa o que não for imagem."""
+        self._head = (self._head + data)[:SIGNATURE_SIZE]
+        for signature, ext in IMAGE_SIGNATURES:
+            if self._head.startswith(signature):
+                self.ext = ext
+                return
+        if len(self._head) >= SIGNATURE_SIZE:
+            raise UnsupportedMediaType('Envie apenas fotos nos formatos JPEG, PNG ou GIF.')
+
+    def __getattr__(self, name):
+        # read/seek/tell/flush... do arquivo temporário (FileStorage e Pillow leem por aqui)
+        return getattr(self._file, name)
+
+    def commit(self):
+        """Incorpora o arquivo ao armazenamento, sem copiá-lo. Retorna o nome relativo."""
+        if self.ext is None:
+            raise UnsupportedMediaType('Envie apenas fotos nos formatos JPEG, PNG ou GIF.')
+        self._file.close()
+        name = _commit_file(self.tmp_path, self.digest.hexdigest(), self.ext, self.upload_folder)
+        self.tmp_path = None
+        return name
+
+    def close(self):
+        self._file.close()
+        if self.tmp_path and os.path.exists(self.tmp_path):
+            os.remove(self.tmp_path)
+            self.tmp_path = None
+
+
+class UploadRequest(Request):
+    """
+    Requisição do Flask que grava os arquivos do multipart com UploadStream.
+    Partes sem nome de arquivo (campo de arquivo vazio) ficam em memória e não
+    contam no limite de arquivos.
+    """
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        if not filename:
+            return BytesIO()
+        if not allowed_file(filename):
+            raise UnsupportedMediaType('Envie apenas fotos nos formatos JPEG, PNG ou GIF.')
+        streams = self.__dict__.setdefault('_upload_streams', [])
+        max_files = current_app.config['UPLOAD_MAX_FILES']
+        if len(streams) >= max_files:
+            raise RequestEntityTooLarge(f'Você pode enviar no máximo {max_files} fotos.')
+        stream = UploadStream(current_app.config['UPLOAD_FOLDER'], current_app.config['UPLOAD_MAX_FILE_SIZE'])
+        streams.append(stream)
+        return stream
+
+    def _load_form_data(self):
+        try:
+            super()._load_form_data()
+        except RequestEntityTooLarge as error:
+            if error.description != RequestEntityTooLarge.description:
+                raise
+            # Content-Length acima de MAX_CONTENT_LENGTH: recusado antes de ler o corpo
+            limit = current_app.config['MAX_CONTENT_LENGTH'] // (1024 * 1024)
+            raise RequestEntityTooLarge(f'O envio pode ter no máximo {limit} MB no total.') from error
+
+    def close(self):
+        super().close()
+        # Também os arquivos de um corpo cuja leitura foi interrompida
+        for stream in self.__dict__.get('_upload_streams', ()):
+            stream.close()
+
+
+def store_upload(file_storage):
+    """
+    Grava um arquivo recebido do formulário (FileStorage) no armazenamento e
+    retorna o nome relativo, com a extensão do formato identificado. Lança
+    UnsupportedMediaType se o conteúdo não for JPEG, PNG ou GIF.
+    """
+    stream = file_storage.stream
+    if not isinstance(stream, UploadStream):
+        # Fora de uma UploadRequest: copia para um UploadStream, com as mesmas verificações
+        stream = UploadStream(current_app.config['UPLOAD_FOLDER'], current_app.config['UPLOAD_MAX_FILE_SIZE'])
+        try:
+            for chunk in iter(lambda: file_storage.stream.read(CHUNK_SIZE), b''):
+                stream.write(chunk)
+            return stream.commit()
+        finally:
+            stream.close()
+    return stream.commit()
+
+
+# --- ENTREGA ---
+
+def send_upload(folder, filename, max_age=UPLOAD_MAX_AGE, public=False):
+    """
+    Resposta com um arquivo de `folder` (a pasta de uploads ou uma subpasta
+    dela). O ETag é o nome sem extensão, que para os arquivos endereçados pelo
+    conteúdo é o próprio hash. Sem `public`, o cache é 'private' (a rota exige
+    login e proxies compartilhados não devem guardar a resposta).
+    """
+    path = safe_join(folder, filename)
+    if path is None or not os.path.isfile(path):
+        abort(404)
+    etag = os.path.splitext(os.path.basename(filename))[0]
+    mode = current_app.config.get('UPLOAD_SENDFILE', '')
+
+    if mode == 'x-accel':
+        relative = os.path.relpath(path, current_app.config['UPLOAD_FOLDER']).replace(os.sep, '/')
+        response = current_app.response_class(mimetype=mimetypes.guess_type(filename)[0])
+        response.headers['X-Accel-Redirect'] = current_app.config['UPLOAD_ACCEL_PREFIX'].rstrip('/') + '/' + relative
+        response.set_etag(etag)
+        response.make_conditional(request)
+    else:
+        response = send_file(
+            path, request.environ, etag=etag, conditional=True, max_age=max_age,
+            use_x_sendfile=(mode == 'x-sendfile'), response_class=current_app.response_class
+        )
+
+    response.cache_control.max_age = max_age
+    response.cache_control.immutable = True
+    if public:
+        response.cache_control.public = True
+    else:
+        response.cache_control.public = False
+        response.cache_control.private = True
+    return response
@@ -0,0 +1,63 @@
+"""
+services/worked_hours.py
+
+Horas trabalhadas calculadas no banco a partir dos registros de ponto.
+A diferença entre entrada e saída vira segundos com aritmética de intervalos
+no PostgreSQL e com julianday() no SQLite; o SQLAlchemy escolhe a forma
+certa ao compilar a consulta para o banco em uso.
+"""
+from sqlalchemy import Float, func, select
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.functions import FunctionElement
+
+from models import TimeClock
+from extensions import db
+
+
+class _IntervalSeconds(FunctionElement):
+    """Segundos entre dois DateTime (NULL se uma das pontas for NULL)."""
+    type = Float()
+    name = 'interval_seconds'
+    inherit_cache = True
+
+
+@compiles(_IntervalSeconds)
+def _compile_interval_seconds(element, compiler, **kw):
+    start, end = list(element.clauses)
+    return '((julianday(%s) - julianday(%s)) * 86400.0)' % (compiler.process(end, **kw), compiler.process(start, **kw))
+
+
+@compiles(_IntervalSeconds, 'postgresql')
+def _compile_interval_seconds_postgresql(element, compiler, **kw):
+    start, end = list(element.clauses)
+    return 'EXTRACT(EPOCH FROM (%s - %s))' % (compiler.process(end, **kw), compiler.process(start, **kw))
+
+
+def worked_seconds_expr():
+    """
+    Expressão com os segundos trabalhados em um registro de ponto (manhã + tarde),
+    arredondada para segundos inteiros (julianday() tem resíduo de ponto flutuante).
+    """
+    return func.round(
+        func.coalesce(_IntervalSeconds(TimeClock.morning_check_in, TimeClock.morning_check_out), 0)
+        + func.coalesce(_IntervalSeconds(TimeClock.afternoon_check_in, TimeClock.afternoon_check_out), 0),
+        type_=Float(),
+    )
+
+
+def worked_seconds(period, user_id=None, per_day=False):
+    """
+    Segundos trabalhados no período, em uma única consulta agrupada.
+    Retorna tuplas (user_id, segundos) ou, com `per_day`, (user_id, data, segundos).
+    """
+    group = [TimeClock.user_id, TimeClock.date] if per_day else [TimeClock.user_id]
+    stmt = select(*group, func.sum(worked_seconds_expr())).group_by(*group).order_by(*group)
+    if user_id:
+        stmt = stmt.where(TimeClock.user_id == user_id)
+    stmt = period.apply(stmt, TimeClock.date)
+    return [(*row[:-1], float(row[-1] or 0)) for row in db.session.execute(stmt)]
+
+
+def format_hours(seconds):
+    """Formata segundos como horas decimais no padrão brasileiro (ex.: '7,50')."""
+    return f"{(seconds or 0) / 3600:.2f}".replace('.', ',')
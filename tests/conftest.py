@@ -0,0 +1,80 @@
+"""
+tests/conftest.py
+
+Fixtures compartilhadas: a aplicação sobre um SQLite em arquivo temporário
+(tabelas criadas pelos modelos), um cliente HTTP logado como administrador e
+um contador dos comandos SQL executados.
+
+A fixture `app` não deixa um contexto de aplicação ativo: cada requisição do
+cliente abre o seu, com sessão e identity map próprios, como em produção. Os
+testes preparam os dados dentro de `with app.app_context():`.
+"""
+from contextlib import contextmanager
+
+import pytest
+from sqlalchemy import event
+
+from app import create_app
+from extensions import db
+from models import User
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    monkeypatch.setenv('DATABASE_URL', 'sqlite:///' + str(tmp_path / 'test.db'))
+    monkeypatch.setenv('EXPORT_FOLDER', str(tmp_path / 'exports'))
+    monkeypatch.setenv('FEATURE_REPORTS_ENABLED', 'True')
+    monkeypatch.setenv('FEATURE_SCHEDULE_ENABLED', 'True')
+    app = create_app()
+    app.config.update(TESTING=True, UPLOAD_FOLDER=str(tmp_path / 'uploads'))
+    with app.app_context():
+        db.create_all()
+    yield app
+
+
+@pytest.fixture
+def admin(app):
+    """Id do administrador."""
+    user = User(username='admin', name='Administrador', email='admin@example.com', cpf='000.000.000-00',
+                role='admin', is_active=True)
+    user.set_password('senha')
+    with app.app_context():
+        db.session.add(user)
+        db.session.commit()
+        return user.id
+
+
+@pytest.fixture
+def client(app, admin):
+    """Cliente HTTP com a sessão do administrador."""
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['_user_id'] = str(admin)
+        session['_fresh'] = True
+    return client
+
+
+@pytest.fixture
+def count_queries(app):
+    """
+    Uso: `with count_queries() as queries: ...`; depois, `queries.count` é o
+    número de comandos SQL executados no bloco.
+    """
+    class QueryCount:
+        count = 0
+
+        def __call__(self, *args):
+            self.count += 1
+
+    @contextmanager
+    def counting():
+        queries = QueryCount()
+        with app.app_context():
+            engine = db.engine
+        event.listen(engine, 'before_cursor_execute', queries)
+        try:
+            yield queries
+        finally:
+            event.remove(engine, 'before_cursor_execute', queries)
+
+    return counting
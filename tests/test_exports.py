@@ -0,0 +1,68 @@
+"""
+tests/test_exports.py
+
+Downloads dos relatórios: cabeçalhos das respostas diretas e das
+exportações em segundo plano.
+"""
+import io
+from datetime import date, datetime, time
+
+import pyarrow.parquet as pq
+
+from extensions import db
+from models import ExportJob, TimeClock
+from services.export_jobs import enqueue_export, run_export_job
+
+CSV_CONTENT_TYPE = 'text/csv; charset=utf-8'
+
+
+def add_time_clock(user_id):
+    """Um dia de ponto de 8h (manhã e tarde) no mês corrente."""
+    today = date.today()
+    db.session.add(TimeClock(
+        date=today, user_id=user_id,
+        morning_check_in=datetime.combine(today, time(11)),
+        morning_check_out=datetime.combine(today, time(15)),
+        afternoon_check_in=datetime.combine(today, time(16)),
+        afternoon_check_out=datetime.combine(today, time(20)),
+    ))
+    db.session.commit()
+
+
+def test_direct_csv_download_has_a_single_charset(client):
+    response = client.get('/export/maintenance?format=csv')
+    response.get_data()
+    assert response.status_code == 200
+    assert response.headers['Content-Type'] == CSV_CONTENT_TYPE
+
+
+def test_export_job_csv_download_has_a_single_charset(app, client, admin):
+    with app.app_context():
+        job_id = enqueue_export('maintenance', {}, 'csv', admin).id
+        run_export_job(job_id)
+        assert db.session.get(ExportJob, job_id).status == 'done'
+
+    response = client.get(f'/export/jobs/{job_id}/download')
+    response.get_data()
+    assert response.status_code == 200
+    assert response.headers['Content-Type'] == CSV_CONTENT_TYPE
+
+
+def test_time_clock_parquet_has_numeric_worked_seconds(app, client, admin):
+    with app.app_context():
+        add_time_clock(admin)
+
+    response = client.get('/export/time-clock?format=parquet')
+    assert response.status_code == 200
+    table = pq.read_table(io.BytesIO(response.get_data()))
+    assert str(table.schema.field('segundos_trabalhados').type) == 'double'
+    assert table.column('segundos_trabalhados').to_pylist() == [8 * 3600.0]
+
+
+def test_time_clock_parquet_export_job(app, admin):
+    with app.app_context():
+        add_time_clock(admin)
+        job_id = enqueue_export('time_clock', {}, 'parquet', admin).id
+        run_export_job(job_id)
+        job = db.session.get(ExportJob, job_id)
+        assert job.status == 'done', job.error
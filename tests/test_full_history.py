@@ -0,0 +1,84 @@
+"""
+tests/test_full_history.py
+
+O relatório geral de manutenções (equipment.full_history) faz o mesmo número
+de consultas qualquer que seja a quantidade de equipamentos, registros,
+técnicos, fotos e peças.
+"""
+from datetime import date, timedelta
+
+import pytest
+from sqlalchemy import insert
+
+from extensions import db
+from models import (Client, Equipment, MaintenanceHistory, MaintenanceImage, MaintenancePartUsed,
+                    StockItem, User)
+
+
+def seed_history(equipments, records_per_equipment, technicians=3):
+    """Equipamentos com histórico; cada registro tem duas fotos e duas peças."""
+    db.session.execute(insert(User), [
+        {'id': 100 + i, 'username': f'tecnico{i}', 'password_hash': 'x', 'name': f'Técnico {i}',
+         'email': f'tecnico{i}@example.com', 'cpf': f'tec-{i}', 'role': 'technician', 'is_active': True}
+        for i in range(technicians)
+    ])
+    db.session.execute(insert(Client), [{'id': 1, 'name': 'Cliente', 'is_archived': False}])
+    db.session.execute(insert(StockItem), [
+        {'id': i, 'name': f'Peça {i}', 'category': 'Geral', 'quantity': 100} for i in (1, 2)
+    ])
+    db.session.execute(insert(Equipment), [
+        {'id': i, 'code': f'EQ-{i:04d}', 'model': 'Split', 'location': 'Sala', 'user_id': 100,
+         'client_id': 1, 'next_maintenance_date': date.today() + timedelta(days=30), 'is_archived': False}
+        for i in range(1, equipments + 1)
+    ])
+    records = [
+        {'id': (eq - 1) * records_per_equipment + n + 1, 'equipment_id': eq,
+         'technician_id': 100 + n % technicians, 'category': 'Preventiva', 'description': 'Limpeza',
+         'maintenance_date': date.today() - timedelta(days=n), 'cost': 50.0}
+        for eq in range(1, equipments + 1) for n in range(records_per_equipment)
+    ]
+    db.session.execute(insert(MaintenanceHistory), records)
+    db.session.execute(insert(MaintenanceImage), [
+        {'filename': f'ab/cd/{record["id"]}-{n}.jpg', 'maintenance_history_id': record['id'],
+         'status': 'ready' if n else 'pending'}
+        for record in records for n in range(2)
+    ])
+    db.session.execute(insert(MaintenancePartUsed), [
+        {'maintenance_history_id': record['id'], 'stock_item_id': item_id, 'quantity_used': 1}
+        for record in records for item_id in (1, 2)
+    ])
+    db.session.commit()
+
+
+def full_history_queries(client, count_queries, page=1):
+    with count_queries() as queries:
+        response = client.get(f'/history/all?page={page}')
+    assert response.status_code == 200
+    return queries.count, response
+
+
+@pytest.mark.parametrize('equipments, records', [(1, 1), (45, 6)])
+def test_full_history_query_count_is_constant(app, client, count_queries, equipments, records):
+    with app.app_context():
+        seed_history(equipments, records)
+    count, response = full_history_queries(client, count_queries)
+    assert b'EQ-0001' in response.data
+
+    # Referência: só um equipamento, com um registro sem fotos nem peças
+    with app.app_context():
+        db.session.execute(MaintenancePartUsed.__table__.delete())
+        db.session.execute(MaintenanceImage.__table__.delete())
+        db.session.execute(MaintenanceHistory.__table__.delete().where(MaintenanceHistory.id > 1))
+        db.session.execute(Equipment.__table__.delete().where(Equipment.id > 1))
+        db.session.commit()
+    baseline, _ = full_history_queries(client, count_queries)
+    assert count == baseline
+
+
+def test_full_history_last_page_query_count(app, client, count_queries):
+    with app.app_context():
+        seed_history(45, 6)
+    first, _ = full_history_queries(client, count_queries, page=1)
+    last, response = full_history_queries(client, count_queries, page=3)
+    assert b'EQ-0045' in response.data
+    assert last == first
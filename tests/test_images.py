@@ -0,0 +1,59 @@
+"""
+tests/test_images.py
+
+Exclusão das fotos das manutenções: os arquivos só saem do disco depois do
+commit e apenas quando nenhuma outra foto usa o mesmo conteúdo.
+"""
+import os
+from datetime import date
+
+from sqlalchemy import insert
+
+from extensions import db
+from models import Client, Equipment, MaintenanceHistory, MaintenanceImage
+
+FILENAME = 'ab/cd/abcd.jpg'
+
+
+def seed_photos(app, admin, photos):
+    """Uma manutenção com `photos` fotos apontando para o mesmo arquivo, gravado no disco."""
+    with app.app_context():
+        db.session.execute(insert(Client), [{'id': 1, 'name': 'Cliente', 'is_archived': False}])
+        db.session.execute(insert(Equipment), [{'id': 1, 'code': 'EQ-0001', 'model': 'Split', 'location': 'Sala',
+                                                'user_id': admin, 'client_id': 1, 'next_maintenance_date': date.today(),
+                                                'is_archived': False}])
+        db.session.execute(insert(MaintenanceHistory), [{'id': 1, 'equipment_id': 1, 'technician_id': admin,
+                                                         'category': 'Corretiva', 'description': 'Limpeza',
+                                                         'maintenance_date': date.today()}])
+        db.session.execute(insert(MaintenanceImage), [{'id': i, 'filename': FILENAME, 'maintenance_history_id': 1}
+                                                      for i in range(1, photos + 1)])
+        db.session.commit()
+    path = os.path.join(app.config['UPLOAD_FOLDER'], FILENAME)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(b'\xff\xd8\xff foto')
+    return path
+
+
+def test_shared_file_is_removed_with_the_last_photo(app, client, admin):
+    path = seed_photos(app, admin, photos=2)
+
+    client.post('/history/delete_photo/1')
+    assert os.path.exists(path)
+    client.post('/history/delete_photo/2')
+    assert not os.path.exists(path)
+
+
+def test_failed_commit_keeps_the_file(app, client, admin, monkeypatch):
+    path = seed_photos(app, admin, photos=1)
+
+    def failing_commit():
+        raise RuntimeError('falha no commit')
+
+    monkeypatch.setattr(db.session, 'commit', failing_commit)
+    client.post('/history/delete_photo/1')
+    monkeypatch.undo()
+
+    assert os.path.exists(path)
+    with app.app_context():
+        assert db.session.get(MaintenanceImage, 1) is not None
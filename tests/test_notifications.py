@@ -0,0 +1,49 @@
+"""
+tests/test_notifications.py
+
+Expansão do outbox de notificações: os administradores são resolvidos a
+cada lote e os contadores de não lidas sobem na mesma transação.
+"""
+from sqlalchemy import select
+
+from extensions import db
+from models import Notification, User
+from services.notifications import notify_all_admins, process_outbox
+
+
+def add_user(username, role):
+    user = User(username=username, name=username, email=f'{username}@example.com', cpf=username,
+                role=role, is_active=True, password_hash='x')
+    db.session.add(user)
+    db.session.commit()
+    return user.id
+
+
+def recipients():
+    return set(db.session.execute(select(Notification.user_id)).scalars())
+
+
+def test_outbox_sees_promoted_and_demoted_admins(app, admin):
+    with app.app_context():
+        technician = add_user('tecnico', 'technician')
+        notify_all_admins('Primeiro aviso')
+        db.session.commit()
+        assert process_outbox() == 1
+        assert recipients() == {admin}
+
+        # Troca de papéis feita em outro processo, sem eventos do ORM neste
+        db.session.execute(User.__table__.update().where(User.id == technician).values(role='admin'))
+        db.session.execute(User.__table__.update().where(User.id == admin).values(role='technician'))
+        db.session.commit()
+        db.session.execute(Notification.__table__.delete())
+        notify_all_admins('Segundo aviso')
+        db.session.commit()
+        assert process_outbox() == 1
+        assert recipients() == {technician}
+        assert db.session.get(User, technician).unread_notifications == 1
+
+
+def test_empty_outbox_ends_the_transaction(app):
+    with app.app_context():
+        assert process_outbox() == 0
+        assert not db.session().in_transaction()
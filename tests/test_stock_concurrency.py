@@ -0,0 +1,83 @@
+"""
+tests/test_stock_concurrency.py
+
+Vários processos baixando o mesmo item ao mesmo tempo, sobre um SQLite em
+arquivo, como workers diferentes do gunicorn fechando manutenções. A baixa
+de move_stock_batch() nunca vende a mesma unidade duas vezes: o saldo não
+fica negativo, bate com o livro de estoque e quem chega depois do fim do
+estoque recebe InsufficientStock.
+"""
+import multiprocessing
+import time
+
+from sqlalchemy import func, insert, select
+from sqlalchemy.exc import OperationalError
+
+from extensions import db
+from models import StockItem, StockLedgerEntry
+
+PROCESSES = 6
+ATTEMPTS_PER_PROCESS = 10
+INITIAL_QUANTITY = 40  # menos que PROCESSES * ATTEMPTS_PER_PROCESS
+ITEM_ID = 1
+
+
+def withdraw(start_event, results):
+    """Processo filho: tenta ATTEMPTS_PER_PROCESS baixas de uma unidade (DATABASE_URL herdado)."""
+    from app import create_app
+    from services.stock_ledger import InsufficientStock, move_stock_batch
+
+    app = create_app()
+    done = refused = 0
+    with app.app_context():
+        start_event.wait()
+        for _ in range(ATTEMPTS_PER_PROCESS):
+            while True:
+                try:
+                    move_stock_batch({ITEM_ID: -1}, 'maintenance')
+                    db.session.commit()
+                    done += 1
+                except InsufficientStock:
+                    db.session.rollback()
+                    refused += 1
+                except OperationalError:
+                    # SQLite: banco travado por outro escritor; tenta de novo
+                    db.session.rollback()
+                    time.sleep(0.005)
+                    continue
+                break
+    results.put((done, refused))
+
+
+def test_concurrent_withdrawals_never_oversell(app):
+    with app.app_context():
+        db.session.execute(insert(StockItem), [{'id': ITEM_ID, 'name': 'Filtro', 'category': 'Geral',
+                                                'quantity': INITIAL_QUANTITY}])
+        db.session.commit()
+
+    # 'spawn': cada processo sobe a própria aplicação e conexão, herdando o DATABASE_URL do teste
+    context = multiprocessing.get_context('spawn')
+    start_event, results = context.Event(), context.Queue()
+    processes = [context.Process(target=withdraw, args=(start_event, results)) for _ in range(PROCESSES)]
+    for process in processes:
+        process.start()
+    start_event.set()
+    outcomes = [results.get(timeout=120) for _ in processes]
+    for process in processes:
+        process.join(timeout=30)
+        assert process.exitcode == 0
+
+    with app.app_context():
+        quantity = db.session.get(StockItem, ITEM_ID).quantity
+        ledger_total = db.session.execute(
+            select(func.coalesce(func.sum(StockLedgerEntry.delta), 0))
+            .where(StockLedgerEntry.stock_item_id == ITEM_ID)
+        ).scalar()
+
+    done = sum(done for done, _ in outcomes)
+    refused = sum(refused for _, refused in outcomes)
+    assert quantity >= 0
+    assert quantity == INITIAL_QUANTITY + ledger_total
+    assert done == INITIAL_QUANTITY - quantity == -ledger_total
+    assert quantity == 0
+    assert refused == PROCESSES * ATTEMPTS_PER_PROCESS - INITIAL_QUANTITY
@@ -0,0 +1,53 @@
+"""
+tests/test_stock_ledger.py
+
+Fotografias do estoque: o inventário em uma data parte da fotografia e soma
+as movimentações posteriores, sem perder as feitas depois dela.
+"""
+from datetime import datetime, time, timedelta
+
+import pytest
+from sqlalchemy import insert
+
+from extensions import db
+from models import StockItem, StockLedgerEntry
+from services.stock_ledger import inventory_on, move_stock_batch, take_snapshot
+
+ITEM_ID = 1
+
+
+def seed_item(quantity, created_at):
+    """Item com uma entrada inicial no livro na data/hora informada (UTC)."""
+    db.session.execute(insert(StockItem), [{'id': ITEM_ID, 'name': 'Filtro', 'category': 'Geral',
+                                            'quantity': quantity}])
+    db.session.execute(insert(StockLedgerEntry), [{'stock_item_id': ITEM_ID, 'delta': quantity,
+                                                   'balance_after': quantity, 'reason': 'initial',
+                                                   'created_at': created_at}])
+    db.session.commit()
+
+
+def test_movements_after_the_snapshot_are_counted(app):
+    today = datetime.utcnow().date()
+    yesterday = today - timedelta(days=1)
+    with app.app_context():
+        seed_item(10, datetime.combine(yesterday, time(12)))
+        assert take_snapshot() == 1
+        move_stock_batch({ITEM_ID: -7}, 'adjust_out')
+        db.session.commit()
+
+        assert inventory_on(yesterday) == {ITEM_ID: 10}
+        assert inventory_on(today) == {ITEM_ID: 3}
+        assert inventory_on(today + timedelta(days=1)) == {ITEM_ID: 3}
+
+
+@pytest.mark.parametrize('days_ahead', [0, 1])
+def test_snapshot_of_an_open_day_is_refused(app, days_ahead):
+    today = datetime.utcnow().date()
+    with app.app_context():
+        seed_item(10, datetime.utcnow())
+        with pytest.raises(ValueError):
+            take_snapshot(today + timedelta(days=days_ahead))
+
+        result = app.test_cli_runner().invoke(args=['snapshot-stock', '--date', today.isoformat()])
+        assert result.exit_code != 0
+        assert 'encerrado' in result.output
@@ -0,0 +1,100 @@
+"""
+tests/test_stock_movement_report.py
+
+O relatório de movimentação de estoque e a sua exportação fazem um número
+fixo e pequeno de consultas, com uma ou com muitas peças usadas.
+"""
+from datetime import date, timedelta
+
+import pytest
+from sqlalchemy import insert
+
+from extensions import db
+from models import (Client, Equipment, MaintenanceHistory, MaintenancePartUsed, StockItem,
+                    StockLedgerEntry, User)
+
+# Consultas por requisição, incluindo a carga do usuário logado
+REPORT_MAX_QUERIES = 5
+EXPORT_MAX_QUERIES = 4
+
+
+def seed_stock(items=5, technicians=3, equipments=10):
+    """Técnicos, um cliente com equipamentos e itens de estoque."""
+    db.session.execute(insert(User), [
+        {'id': 100 + i, 'username': f'tecnico{i}', 'password_hash': 'x', 'name': f'Técnico {i}',
+         'email': f'tecnico{i}@example.com', 'cpf': f'tec-{i}', 'role': 'technician', 'is_active': True}
+        for i in range(technicians)
+    ])
+    db.session.execute(insert(Client), [{'id': 1, 'name': 'Cliente', 'is_archived': False}])
+    db.session.execute(insert(StockItem), [
+        {'id': i, 'name': f'Peça {i}', 'category': 'Geral', 'sku': f'SKU-{i}', 'quantity': 100,
+         'low_stock_threshold': 5, 'unit_cost': 10}
+        for i in range(1, items + 1)
+    ])
+    db.session.execute(insert(Equipment), [
+        {'id': i, 'code': f'EQ-{i:04d}', 'model': 'Split', 'location': 'Sala', 'user_id': 100,
+         'client_id': 1, 'next_maintenance_date': date.today() + timedelta(days=30), 'is_archived': False}
+        for i in range(1, equipments + 1)
+    ])
+    db.session.commit()
+
+
+def add_parts_used(first, count, items=5, technicians=3, equipments=10):
+    """
+    Manutenções `first` a `first + count - 1`, cada uma com uma peça usada e a
+    linha correspondente no livro, espalhadas por itens, técnicos, equipamentos e datas.
+    """
+    ids = range(first, first + count)
+    db.session.execute(insert(MaintenanceHistory), [
+        {'id': i, 'equipment_id': 1 + i % equipments, 'technician_id': 100 + i % technicians,
+         'category': 'Corretiva', 'description': 'Troca de peça',
+         'maintenance_date': date.today() - timedelta(days=i % 20)}
+        for i in ids
+    ])
+    db.session.execute(insert(MaintenancePartUsed), [
+        {'maintenance_history_id': i, 'stock_item_id': 1 + i % items, 'quantity_used': 1 + i % 3}
+        for i in ids
+    ])
+    db.session.execute(insert(StockLedgerEntry), [
+        {'stock_item_id': 1 + i % items, 'delta': -(1 + i % 3), 'balance_after': 100, 'reason': 'maintenance',
+         'user_id': 100 + i % technicians, 'maintenance_history_id': i}
+        for i in ids
+    ])
+    db.session.commit()
+
+
+def queries_for(client, count_queries, url):
+    with count_queries() as queries:
+        response = client.get(url)
+        response.get_data()  # a exportação é enviada em streaming
+    assert response.status_code == 200
+    return queries.count
+
+
+@pytest.mark.parametrize('parts_used', [1, 300])
+def test_stock_movement_report_query_cap(app, client, count_queries, parts_used):
+    with app.app_context():
+        seed_stock()
+        add_parts_used(1, parts_used)
+    assert queries_for(client, count_queries, '/reports/stock-movement') <= REPORT_MAX_QUERIES
+    assert queries_for(client, count_queries, '/reports/stock-movement?page=2&category=Geral') <= REPORT_MAX_QUERIES
+
+
+@pytest.mark.parametrize('parts_used', [1, 300])
+def test_stock_movement_export_query_cap(app, client, count_queries, parts_used):
+    with app.app_context():
+        seed_stock()
+        add_parts_used(1, parts_used)
+    assert queries_for(client, count_queries, '/export/stock-movement?format=csv') <= EXPORT_MAX_QUERIES
+
+
+def test_stock_movement_query_count_does_not_grow(app, client, count_queries):
+    urls = ('/reports/stock-movement', '/export/stock-movement?format=csv')
+    with app.app_context():
+        seed_stock()
+        add_parts_used(1, 1)
+    few = [queries_for(client, count_queries, url) for url in urls]
+    with app.app_context():
+        add_parts_used(2, 299)
+    many = [queries_for(client, count_queries, url) for url in urls]
+    assert many == few